@@ -0,0 +1,598 @@
+"""Offline benchmarks for the loot bot, no Discord connection needed.
+
+    python benchmark.py storage [--profiles safe wal] [--json results.json]
+    python benchmark.py commands [--members 500] [--items 300] [--storage memory] [--json results.json]
+    python benchmark.py stress [--members 100] [--items 20] [--moves 500] [--storage memory]
+    python benchmark.py loop [--calls 40] [--delay 0.02]
+    python benchmark.py ratelimit [--messages 200] [--limit 5] [--window 1.0] [--chaos 0.05]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from aiohttp import web
+
+# Guild databases go next to DATABASE_PATH, so keep them in a throwaway folder
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(prefix='lootbench-'), 'siralama.db'))
+
+import discordbot  # noqa: E402
+from sqlalchemy import event, text  # noqa: E402
+
+def _tohumla(motor, urun_sayisi, oyuncu_sayisi):
+    discordbot.Base.metadata.create_all(motor)
+    with motor.begin() as conn:
+        conn.execute(text("INSERT INTO urun (id, urun_adi) VALUES (:id, :ad)"), [
+            {"id": u, "ad": f"Item {u}"} for u in range(1, urun_sayisi + 1)
+        ])
+        conn.execute(text("INSERT INTO kullanici (id, kullanici_adi, discord_id) VALUES (:id, :ad, :d)"), [
+            {"id": k, "ad": f"Player {k}", "d": 10**17 + k} for k in range(1, oyuncu_sayisi + 1)
+        ])
+        conn.execute(text("INSERT INTO siralama (urun_id, kullanici_id, sira_no) VALUES (:u, :k, :s)"), [
+            {"u": u, "k": k, "s": k * discordbot.SIRA_ARALIGI}
+            for u in range(1, urun_sayisi + 1) for k in range(1, oyuncu_sayisi + 1)
+        ])
+        # The seeded queues are the starting point of the history log
+        discordbot._anlik_al_db(conn, 0)
+
+def depolama_olc(profil, urun_sayisi=100, oyuncu_sayisi=200, yazma_sayisi=1000, sure=3.0, okuyucu_sayisi=4):
+    """Committed single-row writes per second, then queue reads/s and writes/s while both run together"""
+    with tempfile.TemporaryDirectory(prefix='lootbench-') as klasor:
+        motor = discordbot.motor_olustur(os.path.join(klasor, 'bench.db'), discordbot.sqlite_profili(profil))
+        _tohumla(motor, urun_sayisi, oyuncu_sayisi)
+        guncelle = text("UPDATE siralama SET sira_no = sira_no + 1 WHERE urun_id = :u AND kullanici_id = :k")
+        oku = text("SELECT kullanici_id FROM siralama WHERE urun_id = :u ORDER BY sira_no")
+        rastgele = random.Random(42)
+
+        # One transaction per write, like a moveplayer or bind commit
+        baslangic = time.perf_counter()
+        for _ in range(yazma_sayisi):
+            with motor.begin() as conn:
+                conn.execute(guncelle, {"u": rastgele.randint(1, urun_sayisi), "k": rastgele.randint(1, oyuncu_sayisi)})
+        yazma_hizi = yazma_sayisi / (time.perf_counter() - baslangic)
+
+        # Mixed load: one writer keeps committing while readers pull whole queues
+        dur = threading.Event()
+        sayaclar = {"okuma": 0, "yazma": 0}
+        kilit = threading.Lock()
+
+        def yazan():
+            r = random.Random(1)
+            while not dur.is_set():
+                with motor.begin() as conn:
+                    conn.execute(guncelle, {"u": r.randint(1, urun_sayisi), "k": r.randint(1, oyuncu_sayisi)})
+                with kilit:
+                    sayaclar["yazma"] += 1
+
+        def okuyan(tohum):
+            r = random.Random(tohum)
+            while not dur.is_set():
+                with motor.connect() as conn:
+                    conn.execute(oku, {"u": r.randint(1, urun_sayisi)}).fetchall()
+                with kilit:
+                    sayaclar["okuma"] += 1
+
+        is_parcaciklari = [threading.Thread(target=yazan)]
+        is_parcaciklari += [threading.Thread(target=okuyan, args=(n,)) for n in range(okuyucu_sayisi)]
+        for t in is_parcaciklari:
+            t.start()
+        time.sleep(sure)
+        dur.set()
+        for t in is_parcaciklari:
+            t.join()
+        motor.dispose()
+
+    return {
+        "profile": profil,
+        "rows": urun_sayisi * oyuncu_sayisi,
+        "writes_per_s": round(yazma_hizi, 1),
+        "mixed_reads_per_s": round(sayaclar["okuma"] / sure, 1),
+        "mixed_writes_per_s": round(sayaclar["yazma"] / sure, 1),
+    }
+
+# Stand-ins for the parts of discord.Interaction/Member/Guild the command callbacks touch
+class SahteYanit:
+    def __init__(self, yanitlar):
+        self._bitti = False
+        self.yanitlar = yanitlar
+
+    def is_done(self):
+        return self._bitti
+
+    async def defer(self, **kwargs):
+        self._bitti = True
+
+    async def send_message(self, content=None, **kwargs):
+        self._bitti = True
+        self.yanitlar.append(content)
+
+    async def edit_message(self, **kwargs):
+        self._bitti = True
+        self.yanitlar.append(kwargs.get("content"))
+
+class SahteTakip:
+    def __init__(self, yanitlar):
+        self.yanitlar = yanitlar
+
+    async def send(self, content=None, **kwargs):
+        self.yanitlar.append(content)
+
+class SahteUye:
+    def __init__(self, uye_id, ad):
+        self.id = uye_id
+        self.display_name = ad
+        self.name = ad
+        self.mention = f"<@{uye_id}>"
+        self.bot = False
+
+class SahteSunucu:
+    def __init__(self, uyeler):
+        self.id = 1
+        self.owner_id = None
+        self.members = uyeler
+        self._uyeler = {uye.id: uye for uye in uyeler}
+
+    def get_member(self, uye_id):
+        return self._uyeler.get(uye_id)
+
+class SahteEtkilesim:
+    def __init__(self, kullanici, sunucu):
+        self.id = id(self)
+        self.application_id = 1
+        self.token = f"token{id(self)}"
+        self.user = kullanici
+        self.guild = sunucu
+        self.guild_id = sunucu.id
+        self.channel = None
+        self.yanitlar = []  # every message content the command sent
+        self.response = SahteYanit(self.yanitlar)
+        self.followup = SahteTakip(self.yanitlar)
+
+def _tohumla_bellek(depo, urun_sayisi, oyuncu_sayisi):
+    depo.urunler = {u: f"Item {u}" for u in range(1, urun_sayisi + 1)}
+    depo.kullanicilar = {k: (f"Player {k}", 10**17 + k) for k in range(1, oyuncu_sayisi + 1)}
+    depo.siralar = {u: {k: k * discordbot.SIRA_ARALIGI for k in depo.kullanicilar} for u in depo.urunler}
+    depo.son_urun_id, depo.son_kullanici_id = urun_sayisi, oyuncu_sayisi
+    depo.anliklar = [(0, {u: list(depo.kullanicilar) for u in depo.urunler})]
+
+async def _sentetik_sunucu(uye_sayisi, urun_sayisi, depo_turu='sqlite'):
+    """Fills a guild's storage with a synthetic guild and loads the cache, returns the fake guild"""
+    depo = discordbot.depo_olustur(discordbot.DATABASE_PATH, depo_turu)
+    lonca = discordbot.Lonca(None, discordbot.DATABASE_PATH, depo)
+    discordbot.aktif_lonca.set(lonca)
+    lonca.hazirla()
+    if isinstance(depo, discordbot.SqlDepo):
+        _tohumla(depo.engine, urun_sayisi, uye_sayisi)
+    else:
+        _tohumla_bellek(depo, urun_sayisi, uye_sayisi)
+    await lonca.onbellek.yukle()
+    uyeler = [SahteUye(10**17 + k, f"Player {k}") for k in range(1, uye_sayisi + 1)]
+    return SahteSunucu(uyeler)
+
+async def _cagir(komut, sunucu, **kwargs):
+    yonetici = SahteUye(discordbot.ADMIN_USER_IDS[0], "Benchmark")
+    etkilesim = SahteEtkilesim(yonetici, sunucu)
+    await komut.callback(etkilesim, **kwargs)
+    return etkilesim.yanitlar
+
+def _komut_senaryolari(sunucu, rastgele):
+    """(name, coroutine factory) pairs, each one call of a real command callback"""
+    uyeler = sunucu.members
+    urun_adlari = list(discordbot.onbellek.urunler.values())
+    yeni_uyeler = iter(SahteUye(2 * 10**17 + n, f"Recruit {n}") for n in range(10**6))
+    yeni_urunler = iter(f"Bench Item {n}" for n in range(10**6))
+
+    def itemlist_soguk():
+        discordbot.lonca().itemlist_cache = None
+        return _cagir(discordbot.itemlist, sunucu)
+
+    async def addplayer_kickplayer():
+        uye = next(yeni_uyeler)
+        await _cagir(discordbot.addplayer, sunucu, member=uye)
+        await _cagir(discordbot.kickplayer, sunucu, member=uye)
+
+    async def additem_deleteitem():
+        ad = next(yeni_urunler)
+        await _cagir(discordbot.additem, sunucu, item_name=ad)
+        await _cagir(discordbot.deleteitem, sunucu, item_name=ad)
+
+    async def autocomplete():
+        await discordbot.item_name_autocomplete(None, rastgele.choice(urun_adlari)[:3])
+
+    return [
+        ("itemlist (cold)", itemlist_soguk),
+        ("itemlist (cached)", lambda: _cagir(discordbot.itemlist, sunucu)),
+        ("itemqueue", lambda: _cagir(discordbot.itemqueue, sunucu, item_name=rastgele.choice(urun_adlari))),
+        ("autocomplete", autocomplete),
+        ("playerloot", lambda: _cagir(discordbot.playerloot, sunucu, member=rastgele.choice(uyeler))),
+        ("raffle", lambda: _cagir(discordbot.raffle, sunucu)),
+        ("raffle (5 winners, queue)", lambda: _cagir(
+            discordbot.raffle, sunucu, winners=5, weighting="queue", item_name=rastgele.choice(urun_adlari)
+        )),
+        ("moveplayer", lambda: _cagir(
+            discordbot.moveplayer, sunucu, item_name=rastgele.choice(urun_adlari),
+            member=rastgele.choice(uyeler), new_position=rastgele.randint(1, len(uyeler) // 2)
+        )),
+        ("bind", lambda: _cagir(
+            discordbot.bind, sunucu, item_name=rastgele.choice(urun_adlari), member=rastgele.choice(uyeler)
+        )),
+        ("addplayer+kickplayer", addplayer_kickplayer),
+        ("additem+deleteitem", additem_deleteitem),
+    ]
+
+async def komutlari_olc(uye_sayisi, urun_sayisi, tekrar, depo_turu='sqlite'):
+    """p50/p99 latency, SQL statements per call and peak traced memory for each command"""
+    sunucu = await _sentetik_sunucu(uye_sayisi, urun_sayisi, depo_turu)
+    depo = discordbot.lonca().depo
+    sql_sayisi = [0]
+
+    def say(*args):
+        sql_sayisi[0] += 1
+    if isinstance(depo, discordbot.SqlDepo):
+        event.listen(depo.engine, "before_cursor_execute", say)
+
+    sonuclar = []
+    for ad, senaryo in _komut_senaryolari(sunucu, random.Random(7)):
+        sql_sayisi[0] = 0
+        sureler = []
+        for _ in range(tekrar):
+            baslangic = time.perf_counter()
+            await senaryo()
+            sureler.append((time.perf_counter() - baslangic) * 1000)
+        sql_ortalama = sql_sayisi[0] / tekrar
+
+        # Memory is traced in a separate, shorter pass so tracing doesn't skew the latencies
+        tracemalloc.start()
+        for _ in range(min(tekrar, 5)):
+            await senaryo()
+        _, tepe = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        sureler.sort()
+        sonuclar.append({
+            "command": ad,
+            "calls": tekrar,
+            "p50_ms": round(statistics.median(sureler), 3),
+            "p99_ms": round(sureler[min(len(sureler) - 1, int(len(sureler) * 0.99))], 3),
+            "sql_per_call": round(sql_ortalama, 1),
+            "peak_kib": round(tepe / 1024, 1),
+        })
+
+    if isinstance(depo, discordbot.SqlDepo):
+        event.remove(depo.engine, "before_cursor_execute", say)
+    return sonuclar
+
+async def stres_testi(uye_sayisi, urun_sayisi, hamle_sayisi, depo_turu='sqlite'):
+    """Fires concurrent moveplayer/bind/pass calls, then checks the cache and the storage agree on every queue"""
+    sunucu = await _sentetik_sunucu(uye_sayisi, urun_sayisi, depo_turu)
+    depo = discordbot.lonca().depo
+    rastgele = random.Random(11)
+    urun_adlari = list(discordbot.onbellek.urunler.values())
+    hatalar, cakismalar = [], []
+
+    async def hamle():
+        komut = rastgele.choices([discordbot.moveplayer, discordbot.bind, discordbot.pass_loot], [7, 2, 1])[0]
+        kwargs = {"item_name": rastgele.choice(urun_adlari), "member": rastgele.choice(sunucu.members)}
+        if komut is discordbot.moveplayer:
+            kwargs["new_position"] = rastgele.randint(1, uye_sayisi // 2)
+        try:
+            yanitlar = await _cagir(komut, sunucu, **kwargs)
+        except Exception as e:
+            hatalar.append(e)
+            return
+        # The callbacks catch their own errors and reply with them instead
+        for yanit in yanitlar:
+            if yanit == discordbot.DEGISTI_MESAJI:
+                cakismalar.append(yanit)
+            elif yanit and yanit.startswith("❌"):
+                hatalar.append(yanit)
+
+    baslangic = time.perf_counter()
+    await asyncio.gather(*(hamle() for _ in range(hamle_sayisi)))
+    sure = time.perf_counter() - baslangic
+
+    _, _, satirlar = await depo.yukle()
+    veritabani = {}
+    for urun_id, kullanici_id, sira_no in satirlar:
+        veritabani.setdefault(urun_id, ([], []))
+        veritabani[urun_id][0].append(kullanici_id)
+        veritabani[urun_id][1].append(sira_no)
+    onbellek = {
+        urun_id: (discordbot.onbellek.siralar[urun_id], discordbot.onbellek.anahtarlar[urun_id])
+        for urun_id in discordbot.onbellek.urunler if discordbot.onbellek.siralar[urun_id]
+    }
+    tutarli = veritabani == onbellek and all(
+        len(set(sira)) == len(sira) and len(set(anahtarlar)) == len(anahtarlar)
+        for sira, anahtarlar in onbellek.values()
+    )
+
+    # Replaying the history log from the last snapshot has to land on the same queues
+    son_olay = await depo.gecmis(None, None, None, 0)
+    yeniden_kurulan = await depo.siralari_yeniden_kur(son_olay[0].id if son_olay else 0)
+    tutarli = tutarli and yeniden_kurulan == {urun_id: sira for urun_id, (sira, _) in onbellek.items()}
+
+    return {
+        "moves": hamle_sayisi,
+        "seconds": round(sure, 3),
+        "moves_per_s": round(hamle_sayisi / sure, 1),
+        "errors": len(hatalar),
+        "conflicts": len(cakismalar),
+        "consistent": tutarli,
+    }
+
+async def _nabiz(aralik, gecikmeler, dur):
+    """Sleeps aralik at a time and records how late each wake-up is"""
+    while not dur.is_set():
+        baslangic = time.perf_counter()
+        await asyncio.sleep(aralik)
+        gecikmeler.append(time.perf_counter() - baslangic - aralik)
+
+async def dongu_gecikmesi_olc(cagri_sayisi, yavaslik, aralik=0.005):
+    """Event-loop lag while concurrent commands wait on a slow database, against the same reads run inline.
+
+    Every SQL statement sleeps yavaslik seconds. Commands go through the database thread pool, so the
+    heartbeat should stay on time and the calls overlap; the inline run is how handlers used to block."""
+    sunucu = await _sentetik_sunucu(50, 5)
+    depo = discordbot.lonca().depo
+    rastgele = random.Random(3)
+
+    def yavaslat(*args):
+        time.sleep(yavaslik)
+    event.listen(depo.engine, "before_cursor_execute", yavaslat)
+
+    async def komut():
+        await _cagir(discordbot.loothistory, sunucu, member=rastgele.choice(sunucu.members))
+
+    async def satir_ici():
+        discordbot._session_scope(depo.Session, discordbot._gecmis_db, None, None, None, 10)
+
+    sonuclar = []
+    for ad, cagri in (("thread pool", komut), ("inline", satir_ici)):
+        gecikmeler, dur = [], asyncio.Event()
+        nabiz = asyncio.create_task(_nabiz(aralik, gecikmeler, dur))
+        await asyncio.sleep(aralik * 2)
+        baslangic = time.perf_counter()
+        await asyncio.gather(*(cagri() for _ in range(cagri_sayisi)))
+        sure = time.perf_counter() - baslangic
+        dur.set()
+        await nabiz
+        gecikmeler.sort()
+        sonuclar.append({
+            "mode": ad,
+            "calls": cagri_sayisi,
+            "seconds": round(sure, 3),
+            "lag_p50_ms": round(statistics.median(gecikmeler) * 1000, 1),
+            "lag_max_ms": round(gecikmeler[-1] * 1000, 1),
+            # The loop never stalls for a whole statement while the pool does the waiting
+            "responsive": gecikmeler[-1] < yavaslik,
+        })
+
+    event.remove(depo.engine, "before_cursor_execute", yavaslat)
+    return sonuclar
+
+async def _sahte_discord(limit, pencere, kaos, rastgele, sayaclar):
+    """Local stand-in for the Discord API: one message bucket per channel, 429 when it runs dry or at random"""
+    kovalar = {}  # channel id -> (sent in this window, window start)
+    rotalar = web.RouteTableDef()
+
+    def yanit(veri, status=200, headers=None):
+        # discord.py only decodes bodies whose content type is exactly application/json
+        return web.Response(body=json.dumps(veri).encode(), status=status,
+                            headers={"Content-Type": "application/json", **(headers or {})})
+
+    @rotalar.get('/api/v10/users/@me')
+    async def ben(request):
+        return yanit({"id": "1", "username": "bench", "discriminator": "0", "avatar": None})
+
+    @rotalar.post('/api/v10/channels/{kanal_id}/messages')
+    async def mesaj(request):
+        kanal_id = request.match_info['kanal_id']
+        govde = await request.json()
+        sayaclar["requests"] += 1
+        simdi = time.monotonic()
+        gonderilen, baslangic = kovalar.get(kanal_id, (0, simdi))
+        if simdi - baslangic >= pencere:
+            gonderilen, baslangic = 0, simdi
+        kalan_sure = max(pencere - (simdi - baslangic), 0.001)
+        # Discord's own headers; without Via, discord.py takes a 429 for a Cloudflare ban and gives up
+        basliklar = {
+            "Via": "1.1 google",
+            "X-RateLimit-Bucket": f"messages-{kanal_id}",
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Reset": f"{time.time() + kalan_sure:.3f}",
+            "X-RateLimit-Reset-After": f"{kalan_sure:.3f}",
+        }
+        if gonderilen >= limit or rastgele.random() < kaos:
+            sayaclar["429s"] += 1
+            basliklar["X-RateLimit-Remaining"] = "0"
+            basliklar["X-RateLimit-Scope"] = "user"
+            basliklar["Retry-After"] = str(math.ceil(kalan_sure))
+            return yanit({"message": "You are being rate limited.", "retry_after": round(kalan_sure, 3),
+                          "global": False}, status=429, headers=basliklar)
+        kovalar[kanal_id] = (gonderilen + 1, baslangic)
+        basliklar["X-RateLimit-Remaining"] = str(limit - gonderilen - 1)
+        sayaclar["delivered"] += govde["content"].count("\n") + 1
+        sayaclar["accepted"].append(govde["content"])
+        return yanit({
+            "id": str(10**17 + sayaclar["requests"]), "channel_id": kanal_id, "type": 0, "content": govde["content"],
+            "author": {"id": "1", "username": "bench", "discriminator": "0", "avatar": None},
+            "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False,
+            "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [], "embeds": [],
+            "pinned": False,
+        }, headers=basliklar)
+
+    uygulama = web.Application()
+    uygulama.add_routes(rotalar)
+    calistirici = web.AppRunner(uygulama, access_log=None)
+    await calistirici.setup()
+    site = web.TCPSite(calistirici, '127.0.0.1', 0)
+    await site.start()
+    return calistirici, calistirici.addresses[0][1]
+
+async def hiz_siniri_olc(mesaj_sayisi, limit, pencere, kaos, zaman_asimi=60.0):
+    """Pushes announcements, board edits and command replies through the outbound scheduler against a stub API.
+
+    Fails when a message is lost, when the stub answers any 429 although no chaos was asked for, or when
+    a board edit reaches the stub before a command reply queued ahead of it."""
+    sayaclar = {"requests": 0, "429s": 0, "delivered": 0, "accepted": []}
+    # discord.py logs every 429 it retries; the table already counts them
+    logging.getLogger("discord.http").setLevel(logging.ERROR)
+    calistirici, port = await _sahte_discord(limit, pencere, kaos, random.Random(5), sayaclar)
+    discordbot.discord.http.Route.BASE = f"http://127.0.0.1:{port}/api/v10"
+    await discordbot.bot.http.static_login("benchmark")
+    gonderici = discordbot.gonderici
+    gecikmeler = {discordbot.ONCELIK_YANIT: [], discordbot.ONCELIK_PANO: []}
+    kuyruk_sirasi = {}  # message -> order it was queued in
+    kayiplar = []
+
+    async def gonder(oncelik, kanal_id, metin):
+        baslangic = time.perf_counter()
+        kanal = discordbot.bot.get_partial_messageable(kanal_id)
+        kuyruk_sirasi[metin] = len(kuyruk_sirasi)
+        try:
+            await gonderici.gonder('POST', f"/channels/{kanal_id}/messages", oncelik, lambda: kanal.send(metin))
+        except Exception as e:
+            kayiplar.append(e)
+            return
+        gecikmeler[oncelik].append(time.perf_counter() - baslangic)
+
+    baslangic = time.perf_counter()
+    try:
+        # Announcements are fire-and-forget and merge while their channel's bucket is empty
+        for index in range(mesaj_sayisi):
+            gonderici.duyur(100, f"🎁 Player {index} received Item {index % 7}")
+        # Board edits and command replies share one channel, queued interleaved: every reply has to reach
+        # the API before the board edits queued after it, and replies should overtake the earlier ones
+        await asyncio.gather(*(
+            gonder(discordbot.ONCELIK_YANIT, 200, f"reply {index // 3}") if index % 3 == 2
+            else gonder(discordbot.ONCELIK_PANO, 200, f"board page {index - index // 3}")
+            for index in range(limit * 6)
+        ))
+        son_an = time.perf_counter() + zaman_asimi
+        while ((gonderici.bekleyenler or sayaclar["delivered"] < mesaj_sayisi + limit * 6)
+               and time.perf_counter() < son_an):
+            await asyncio.sleep(0.05)
+        sure = time.perf_counter() - baslangic
+    finally:
+        await discordbot.bot.http.close()
+        await calistirici.cleanup()
+
+    kabul_sirasi = {metin: index for index, metin in enumerate(sayaclar["accepted"])}
+    sira_disi = sum(
+        1 for yanit_metni in kuyruk_sirasi if yanit_metni.startswith("reply")
+        for pano_metni in kuyruk_sirasi if pano_metni.startswith("board")
+        if kuyruk_sirasi[yanit_metni] < kuyruk_sirasi[pano_metni]
+        and kabul_sirasi.get(pano_metni, -1) < kabul_sirasi.get(yanit_metni, len(kabul_sirasi))
+    )
+    # Discord may 429 a reply at random, letting later board edits through; only ask for order without chaos
+    sorunlar = []
+    if kayiplar or sayaclar["delivered"] < mesaj_sayisi + limit * 6:
+        sorunlar.append("lost")
+    if kaos == 0 and sayaclar["429s"]:
+        sorunlar.append("429")
+    if kaos == 0 and sira_disi:
+        sorunlar.append("order")
+
+    return {
+        "messages": mesaj_sayisi + limit * 6,
+        "lost": mesaj_sayisi + limit * 6 - sayaclar["delivered"],
+        "requests": sayaclar["requests"],
+        "429s": sayaclar["429s"],
+        "retries": sum(discordbot.metrikler.gonderim_tekrari.degerler.values()),
+        "merged": sum(discordbot.metrikler.gonderim_birlesen.degerler.values()),
+        "reply_p50_ms": round(statistics.median(gecikmeler[discordbot.ONCELIK_YANIT]) * 1000, 1),
+        "board_p50_ms": round(statistics.median(gecikmeler[discordbot.ONCELIK_PANO]) * 1000, 1),
+        "seconds": round(sure, 3),
+        "ok": not sorunlar,
+        "problems": ",".join(sorunlar) or "-",
+    }
+
+def _tablo_yaz(sonuclar, kolonlar):
+    genislikler = [max(len(k), *(len(str(s[k])) for s in sonuclar)) for k in kolonlar]
+    print("  ".join(k.ljust(g) for k, g in zip(kolonlar, genislikler)))
+    for sonuc in sonuclar:
+        print("  ".join(str(sonuc[k]).ljust(g) for k, g in zip(kolonlar, genislikler)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    alt = parser.add_subparsers(dest="komut", required=True)
+
+    storage = alt.add_parser("storage", help="SQLite read/write throughput per storage profile")
+    storage.add_argument("--profiles", nargs="+", default=list(discordbot.SQLITE_PROFILLERI))
+    storage.add_argument("--items", type=int, default=100)
+    storage.add_argument("--players", type=int, default=200)
+    storage.add_argument("--writes", type=int, default=1000)
+    storage.add_argument("--seconds", type=float, default=3.0)
+    storage.add_argument("--readers", type=int, default=4)
+    storage.add_argument("--json", help="also write the results to this file")
+
+    commands = alt.add_parser("commands", help="latency, SQL statements and memory of each slash command")
+    commands.add_argument("--members", type=int, default=500)
+    commands.add_argument("--items", type=int, default=300)
+    commands.add_argument("--iterations", type=int, default=50)
+    commands.add_argument("--storage", choices=list(discordbot.DEPOLAR), default="sqlite")
+    commands.add_argument("--json", help="also write the results to this file")
+
+    stress = alt.add_parser("stress", help="hundreds of concurrent queue edits, then check queue invariants")
+    stress.add_argument("--members", type=int, default=100)
+    stress.add_argument("--items", type=int, default=20)
+    stress.add_argument("--moves", type=int, default=500)
+    stress.add_argument("--storage", choices=list(discordbot.DEPOLAR), default="sqlite")
+    stress.add_argument("--json", help="also write the results to this file")
+
+    loop = alt.add_parser("loop", help="event-loop lag while concurrent commands wait on slow SQL")
+    loop.add_argument("--calls", type=int, default=40)
+    loop.add_argument("--delay", type=float, default=0.02, help="seconds added to every SQL statement")
+    loop.add_argument("--json", help="also write the results to this file")
+
+    ratelimit = alt.add_parser("ratelimit", help="outbound scheduler against a local stub API that answers with 429s")
+    ratelimit.add_argument("--messages", type=int, default=200)
+    ratelimit.add_argument("--limit", type=int, default=5)
+    ratelimit.add_argument("--window", type=float, default=1.0)
+    ratelimit.add_argument("--chaos", type=float, default=0.05, help="share of requests answered 429 regardless")
+    ratelimit.add_argument("--json", help="also write the results to this file")
+
+    args = parser.parse_args(argv)
+
+    if args.komut == "storage":
+        sonuclar = [
+            depolama_olc(profil, args.items, args.players, args.writes, args.seconds, args.readers)
+            for profil in args.profiles
+        ]
+        _tablo_yaz(sonuclar, ["profile", "rows", "writes_per_s", "mixed_reads_per_s", "mixed_writes_per_s"])
+    elif args.komut == "commands":
+        sonuclar = asyncio.run(komutlari_olc(args.members, args.items, args.iterations, args.storage))
+        _tablo_yaz(sonuclar, ["command", "calls", "p50_ms", "p99_ms", "sql_per_call", "peak_kib"])
+    elif args.komut == "stress":
+        sonuclar = [asyncio.run(stres_testi(args.members, args.items, args.moves, args.storage))]
+        _tablo_yaz(sonuclar, ["moves", "seconds", "moves_per_s", "errors", "conflicts", "consistent"])
+    elif args.komut == "loop":
+        sonuclar = asyncio.run(dongu_gecikmesi_olc(args.calls, args.delay))
+        _tablo_yaz(sonuclar, ["mode", "calls", "seconds", "lag_p50_ms", "lag_max_ms", "responsive"])
+    elif args.komut == "ratelimit":
+        sonuclar = [asyncio.run(hiz_siniri_olc(args.messages, args.limit, args.window, args.chaos))]
+        _tablo_yaz(sonuclar, ["messages", "lost", "requests", "429s", "retries", "merged",
+                              "reply_p50_ms", "board_p50_ms", "seconds", "problems"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"command": args.komut, "arguments": vars(args), "results": sonuclar}, f, indent=2)
+
+    if args.komut == "stress" and not sonuclar[0]["consistent"]:
+        return 1
+    if args.komut == "loop" and not sonuclar[0]["responsive"]:
+        return 1
+    if args.komut == "ratelimit" and not sonuclar[0]["ok"]:
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
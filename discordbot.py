@@ -3,42 +3,607 @@ from discord.ext import commands
 import logging
 import os
 import sys
-from sqlalchemy import create_engine, func, Column, Integer, String, ForeignKey
+import tempfile
+from sqlalchemy import create_engine, event, insert, inspect, text, Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
 import random
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import argparse
 import asyncio
+import contextvars
+import csv
+import gzip
+import hashlib
+import html
+import io
+import json
+import math
+import functools
+import time
+import aiohttp
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+import re
+from bisect import bisect_right
+from collections import Counter, OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from discord import app_commands
-from flask import Flask
+from aiohttp import web
 import threading
 
-# Flask app initialization
-app = Flask(__name__)
+# Logging is configured by whoever runs the bot (see __main__), never on import
+logger = logging.getLogger(__name__)
 
-@app.route('/')
-def home():
-    return 'Bot is running!'
+# Startup is timed from here to the first on_ready
+BASLANGIC = time.perf_counter()
+
+# Prometheus metrics, rendered in the text exposition format on /metrics
+class _Metrik:
+    def __init__(self, ad, aciklama, etiketler=()):
+        self.ad = ad
+        self.aciklama = aciklama
+        self.etiketler = etiketler
+        self.kilit = threading.Lock()
+        self.degerler = {}
+
+    @staticmethod
+    def _kacis(deger):
+        """Label values escape backslash, double quote and newline, as the text format requires"""
+        return str(deger).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def _etiket_metni(self, degerler, ek=()):
+        ciftler = list(zip(self.etiketler, degerler)) + list(ek)
+        if not ciftler:
+            return ""
+        return "{" + ",".join(f'{ad}="{self._kacis(deger)}"' for ad, deger in ciftler) + "}"
+
+class Sayac(_Metrik):
+    tur = "counter"
+
+    def arttir(self, *etiketler, miktar=1):
+        with self.kilit:
+            self.degerler[etiketler] = self.degerler.get(etiketler, 0) + miktar
+
+    def satirlar(self):
+        with self.kilit:
+            for etiketler, deger in sorted(self.degerler.items()):
+                yield f"{self.ad}{self._etiket_metni(etiketler)} {deger}"
+
+class Gosterge(_Metrik):
+    tur = "gauge"
+
+    def __init__(self, ad, aciklama, okuyucu):
+        super().__init__(ad, aciklama)
+        self.okuyucu = okuyucu
+
+    def satirlar(self):
+        yield f"{self.ad} {float(self.okuyucu())}"
+
+class Histogram(_Metrik):
+    tur = "histogram"
+    SINIRLAR = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def gozlemle(self, saniye, *etiketler):
+        with self.kilit:
+            kovalar, toplam, sayi = self.degerler.get(etiketler) or ([0] * len(self.SINIRLAR), 0.0, 0)
+            for index, sinir in enumerate(self.SINIRLAR):
+                if saniye <= sinir:
+                    kovalar[index] += 1
+            self.degerler[etiketler] = (kovalar, toplam + saniye, sayi + 1)
+
+    def satirlar(self):
+        with self.kilit:
+            for etiketler, (kovalar, toplam, sayi) in sorted(self.degerler.items()):
+                for sinir, kova in zip(self.SINIRLAR, kovalar):
+                    yield f"{self.ad}_bucket{self._etiket_metni(etiketler, [('le', sinir)])} {kova}"
+                yield f"{self.ad}_bucket{self._etiket_metni(etiketler, [('le', '+Inf')])} {sayi}"
+                yield f"{self.ad}_sum{self._etiket_metni(etiketler)} {toplam}"
+                yield f"{self.ad}_count{self._etiket_metni(etiketler)} {sayi}"
+
+class Metrikler:
+    def __init__(self):
+        self.komut_suresi = Histogram(
+            'lootbot_command_duration_seconds', 'Slash command handling time', ('command',))
+        self.komutlar = Sayac(
+            'lootbot_commands_total', 'Slash commands handled', ('command', 'status'))
+        self.sql_suresi = Histogram(
+            'lootbot_sql_duration_seconds', 'SQL statement execution time', ('statement',))
+        self.sql_ifadeleri = Sayac(
+            'lootbot_sql_statements_total', 'SQL statements executed, by the command that caused them', ('command',))
+        self.discord_suresi = Histogram(
+            'lootbot_discord_request_duration_seconds', 'Discord HTTP API request time', ('method', 'route', 'status'))
+        self.gateway = Gosterge(
+            'lootbot_gateway_latency_seconds', 'Discord gateway heartbeat latency',
+            lambda: bot.latency)
+        self.baslangic_suresi = None
+        self.baslangic = Gosterge(
+            'lootbot_startup_seconds', 'Time from process start to the first ready event',
+            lambda: self.baslangic_suresi if self.baslangic_suresi is not None else math.nan)
+        self.gonderim_kuyrugu = Gosterge(
+            'lootbot_outbound_queue_depth', 'Discord requests waiting in the outbound scheduler',
+            lambda: len(gonderici.bekleyenler))
+        self.gonderim_tekrari = Sayac(
+            'lootbot_outbound_retries_total', 'Discord requests retried after a 429 or server error', ('status',))
+        self.gonderim_birlesen = Sayac(
+            'lootbot_outbound_merged_total', 'Channel messages merged into an earlier pending send')
+        self.hepsi = [self.komut_suresi, self.komutlar, self.sql_suresi, self.sql_ifadeleri,
+                      self.discord_suresi, self.gateway, self.baslangic,
+                      self.gonderim_kuyrugu, self.gonderim_tekrari, self.gonderim_birlesen]
+
+    def prometheus(self):
+        satirlar = []
+        for metrik in self.hepsi:
+            satirlar.append(f"# HELP {metrik.ad} {metrik.aciklama}")
+            satirlar.append(f"# TYPE {metrik.ad} {metrik.tur}")
+            satirlar.extend(metrik.satirlar())
+        return "\n".join(satirlar) + "\n"
+
+metrikler = Metrikler()
+
+# Name of the slash command being handled; copied into DB threads so SQL is attributed to it
+aktif_komut = contextvars.ContextVar('aktif_komut', default='background')
+
+def _discord_izleme():
+    """aiohttp trace hooks timing every Discord HTTP request, with ids and tokens folded out of the route"""
+    izleme = aiohttp.TraceConfig()
+
+    async def basladi(session, context, params):
+        context.baslangic = time.perf_counter()
+
+    async def bitti(session, context, params):
+        durum = params.response.status if hasattr(params, 'response') else 'error'
+        rota = re.sub(r"/\d+", "/{id}", params.url.path)
+        rota = re.sub(r"/[\w-]{40,}", "/{token}", rota)
+        metrikler.discord_suresi.gozlemle(time.perf_counter() - context.baslangic, params.method, rota, durum)
+        if hasattr(params, 'response'):
+            gonderici.basliklari_isle(params.method, params.url.path, durum, params.response.headers)
+
+    izleme.on_request_start.append(basladi)
+    izleme.on_request_end.append(bitti)
+    izleme.on_request_exception.append(bitti)
+    return izleme
+
+# Outbound scheduler: Discord sends wait in one queue ordered by priority, are held back while their
+# rate-limit bucket is empty, and small pending messages to the same channel are merged into one send
+ONCELIK_YANIT, ONCELIK_DUYURU, ONCELIK_PANO = 0, 1, 2
+GONDERIM_DENEMESI = 4
+
+def discord_rotasi(method, yol):
+    """Rate-limit key of a request: ids are folded out except the major parameters Discord buckets by"""
+    yol = re.sub(r"^.*?/api/v\d+", "", yol)
+    yol = re.sub(r"(?<!/channels)(?<!/guilds)(?<!/webhooks)(?<!/interactions)/\d+", "/{id}", yol)
+    return f"{method} {yol}"
+
+class HizKovasi:
+    """One rate-limit bucket, as last reported by Discord's X-RateLimit-* headers"""
+
+    def __init__(self):
+        self.limit = 1
+        self.kalan = 1
+        self.sifirlanma = 0.0  # time.monotonic() at which the bucket refills
+
+    def hazir_zamani(self, simdi):
+        """0 if a request may go now, otherwise the time it may go at"""
+        return 0 if self.kalan > 0 or simdi >= self.sifirlanma else self.sifirlanma
+
+    def harca(self, simdi):
+        if self.kalan <= 0 and simdi >= self.sifirlanma:
+            self.kalan = self.limit
+        self.kalan -= 1
+
+class GonderimIsi:
+    def __init__(self, oncelik, sira, rota, islem, kanal_id=None, metin=None):
+        self.anahtar = (oncelik, sira)
+        self.oncelik = oncelik
+        self.rota = rota
+        self.islem = islem        # coroutine factory making the request
+        self.kanal_id = kanal_id
+        self.metin = metin        # plain channel message that may be merged with its neighbours
+        self.future = asyncio.get_running_loop().create_future()
+
+class Gonderici:
+    """Priority queue of outbound Discord requests, paced by per-bucket token counts"""
+
+    def __init__(self):
+        self.kovalar = {}         # X-RateLimit-Bucket hash -> HizKovasi
+        self.rota_kovalari = {}   # discord_rotasi key -> bucket hash
+        self.global_bekleme = 0.0
+        self.bekleyenler = []
+        self.sayac = 0
+        self.uyandir = None
+        self.gorev = None
+        self.yurutulenler = set()  # keeps in-flight request tasks referenced
+
+    def basliklari_isle(self, method, yol, durum, basliklar):
+        """Updates the buckets from a Discord response; called for every request by the trace hooks"""
+        simdi = time.monotonic()
+        if durum == 429 and basliklar.get('X-RateLimit-Global'):
+            self.global_bekleme = simdi + float(basliklar.get('Retry-After', 1))
+        kova_adi = basliklar.get('X-RateLimit-Bucket')
+        if kova_adi is not None and 'X-RateLimit-Remaining' in basliklar:
+            self.rota_kovalari[discord_rotasi(method, yol)] = kova_adi
+            kova = self.kovalar.setdefault(kova_adi, HizKovasi())
+            kova.limit = int(basliklar.get('X-RateLimit-Limit', kova.limit))
+            kova.kalan = int(basliklar['X-RateLimit-Remaining'])
+            kova.sifirlanma = simdi + float(basliklar.get('X-RateLimit-Reset-After', 0))
+        if self.uyandir is not None:
+            self.uyandir.set()
+
+    def kuyruga_al(self, rota, oncelik, islem, kanal_id=None, metin=None):
+        """Queues a request and returns a future for its result"""
+        if self.gorev is None or self.gorev.done():
+            self.uyandir = asyncio.Event()
+            self.gorev = asyncio.get_running_loop().create_task(self._calis())
+        self.sayac += 1
+        is_ = GonderimIsi(oncelik, self.sayac, rota, islem, kanal_id, metin)
+        self.bekleyenler.append(is_)
+        self.uyandir.set()
+        return is_.future
+
+    async def gonder(self, method, yol, oncelik, islem):
+        return await self.kuyruga_al(discord_rotasi(method, yol), oncelik, islem)
+
+    def duyur(self, kanal_id, metin, oncelik=ONCELIK_DUYURU):
+        """Fire-and-forget channel message; failures are only logged"""
+        future = self.kuyruga_al(discord_rotasi('POST', f"/channels/{kanal_id}/messages"), oncelik, None, kanal_id, metin)
+        future.add_done_callback(_duyuru_bitti)
+
+    def _siradaki(self, simdi):
+        """The highest-priority job whose bucket has room, or else the earliest time one will"""
+        if simdi < self.global_bekleme:
+            return None, self.global_bekleme
+        en_erken = None
+        for is_ in sorted(self.bekleyenler, key=lambda is_: is_.anahtar):
+            kova = self.kovalar.get(self.rota_kovalari.get(is_.rota))
+            zaman = kova.hazir_zamani(simdi) if kova else 0
+            if not zaman:
+                return is_, None
+            en_erken = zaman if en_erken is None else min(en_erken, zaman)
+        return None, en_erken
+
+    def _birlestir(self, is_):
+        """Takes the later pending messages for the same channel and priority that still fit into one message"""
+        isler, uzunluk = [is_], len(is_.metin)
+        for diger in sorted(self.bekleyenler, key=lambda is_: is_.anahtar):
+            if diger.metin is None or diger.kanal_id != is_.kanal_id or diger.oncelik != is_.oncelik:
+                continue
+            if uzunluk + 1 + len(diger.metin) > MESAJ_SINIRI:
+                break
+            self.bekleyenler.remove(diger)
+            isler.append(diger)
+            uzunluk += 1 + len(diger.metin)
+        if len(isler) > 1:
+            metrikler.gonderim_birlesen.arttir(miktar=len(isler) - 1)
+        return isler
+
+    async def _calis(self):
+        while True:
+            self.uyandir.clear()
+            simdi = time.monotonic()
+            is_, bekle = self._siradaki(simdi)
+            if is_ is None:
+                try:
+                    await asyncio.wait_for(self.uyandir.wait(), None if bekle is None else max(bekle - simdi, 0.005))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.bekleyenler.remove(is_)
+            isler = self._birlestir(is_) if is_.metin is not None else [is_]
+            kova = self.kovalar.get(self.rota_kovalari.get(is_.rota))
+            if kova:
+                kova.harca(simdi)
+            gorev = asyncio.get_running_loop().create_task(self._yurut(isler))
+            self.yurutulenler.add(gorev)
+            gorev.add_done_callback(self.yurutulenler.discard)
+
+    async def _yurut(self, isler):
+        """Makes the request, retrying 429s and server errors that got past discord.py's own retries"""
+        is_ = isler[0]
+        islem = is_.islem
+        if is_.metin is not None:
+            metin = "\n".join(diger.metin for diger in isler)
+            islem = lambda: bot.get_partial_messageable(is_.kanal_id).send(metin)
+        for deneme in range(1, GONDERIM_DENEMESI + 1):
+            try:
+                sonuc = await islem()
+                break
+            except discord.HTTPException as e:
+                if deneme == GONDERIM_DENEMESI or not (e.status == 429 or e.status >= 500):
+                    sonuc = e
+                    break
+                metrikler.gonderim_tekrari.arttir(str(e.status))
+                await asyncio.sleep(min(0.25 * 2 ** deneme, 5))
+            except Exception as e:
+                sonuc = e
+                break
+        for diger in isler:
+            if diger.future.done():
+                continue
+            if isinstance(sonuc, BaseException):
+                diger.future.set_exception(sonuc)
+            else:
+                diger.future.set_result(sonuc)
+
+def _duyuru_bitti(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Error sending announcement: {future.exception()}")
+
+gonderici = Gonderici()
+
+async def yanitla(interaction: discord.Interaction, *args, **kwargs):
+    """interaction.response.send_message through the outbound scheduler, ahead of board edits"""
+    return await gonderici.gonder('POST', f"/interactions/{interaction.id}/{interaction.token}/callback", ONCELIK_YANIT,
+                                  lambda: interaction.response.send_message(*args, **kwargs))
+
+async def takip(interaction: discord.Interaction, *args, **kwargs):
+    """interaction.followup.send through the outbound scheduler, ahead of board edits"""
+    return await gonderici.gonder('POST', f"/webhooks/{interaction.application_id}/{interaction.token}", ONCELIK_YANIT,
+                                  lambda: interaction.followup.send(*args, **kwargs))
+
+# Web server, served from the bot's own event loop
+rotalar = web.RouteTableDef()
+
+@rotalar.get('/')
+async def home(request):
+    return web.Response(text='Bot is running!')
+
+@rotalar.get('/healthz')
+async def healthz(request):
+    istemci = request.app['bot']
+    bagli = istemci.is_ready() and not istemci.is_closed()
+    # latency is nan/inf until the first heartbeat is acknowledged
+    gecikme = istemci.latency if bagli and math.isfinite(istemci.latency) else None
+    durum = {
+        'status': 'ok' if bagli else 'closed' if istemci.is_closed() else 'starting',
+        'gateway_connected': bagli,
+        'latency_ms': round(gecikme * 1000, 1) if gecikme is not None else None,
+        'guilds': len(istemci.guilds),
+        'shards': istemci.shard_count,
+        'open_guild_databases': len(loncalar.acik),
+    }
+    return web.json_response(durum, status=200 if bagli else 503)
+
+@rotalar.get('/metrics')
+async def metrics(request):
+    return web.Response(text=metrikler.prometheus(),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+# Read-only queue API. Responses are rendered once per cache version and reused until it changes
+GZIP_ESIGI = 512
+
+class Anlik:
+    """One rendered response: body, its gzip form and a content hash ETag"""
+
+    def __init__(self, govde, icerik_turu):
+        self.govde = govde
+        self.gzip = gzip.compress(govde, 6) if len(govde) >= GZIP_ESIGI else None
+        self.etag = '"' + hashlib.blake2b(govde, digest_size=12).hexdigest() + '"'
+        self.icerik_turu = icerik_turu
+
+def _api_sira(kullanici_idleri):
+    return [
+        {'rank': sira, 'player': onbellek.kullanicilar[k_id], 'discord_id': str(onbellek.discord_idleri[k_id])}
+        for sira, k_id in enumerate(kullanici_idleri, 1)
+    ]
+
+def _api_urun(urun_id):
+    return {'id': urun_id, 'name': onbellek.urunler[urun_id], 'queue': _api_sira(onbellek.siralar[urun_id])}
+
+def _api_oyuncu(kullanici_id):
+    return {
+        'player': onbellek.kullanicilar[kullanici_id],
+        'discord_id': str(onbellek.discord_idleri[kullanici_id]),
+        'positions': [
+            {'item_id': urun_id, 'item': onbellek.urunler[urun_id], 'rank': sira, 'of': toplam}
+            for urun_id, sira, toplam in onbellek.oyuncu_konumlari(kullanici_id)
+        ],
+    }
+
+def _html_sira_tablosu(sira):
+    satirlar = "".join(
+        f"<tr><td>{s['rank']}</td><td>{html.escape(s['player'])}</td></tr>" for s in sira)
+    return f"<table><tr><th>#</th><th>Player</th></tr>{satirlar}</table>"
+
+def _html_sayfa(baslik, govde):
+    return (f"<!doctype html><html><head><meta charset=\"utf-8\"><title>{html.escape(baslik)}</title></head>"
+            f"<body><h1>{html.escape(baslik)}</h1>{govde}</body></html>")
+
+def _html_render(tur, veri):
+    if tur == 'queues':
+        govde = "".join(f"<h2>{html.escape(u['name'])}</h2>{_html_sira_tablosu(u['queue'])}" for u in veri['items'])
+        return _html_sayfa("Item Priority", govde)
+    if tur == 'queue':
+        return _html_sayfa(veri['name'], _html_sira_tablosu(veri['queue']))
+    satirlar = "".join(
+        f"<tr><td>{html.escape(p['item'])}</td><td>{p['rank']} / {p['of']}</td></tr>" for p in veri['positions'])
+    return _html_sayfa(veri['player'], f"<table><tr><th>Item</th><th>Rank</th></tr>{satirlar}</table>")
+
+# Most snapshots kept per guild, least recently used dropped first
+API_ANLIK_SINIRI = int(os.getenv('API_SNAPSHOT_LIMIT', 256))
+
+def _anlik_guncel_mi(tur, anahtar, surum):
+    if tur == 'queue':
+        return onbellek.surumler.get(anahtar) == surum
+    return onbellek.surum == surum
+
+def _api_anlik(tur, anahtar, bicim, surum, uret):
+    """Cached snapshot for the view, rebuilt only when its cache version moved. Callers pass resolved ids only,
+    so unknown names never take a slot"""
+    api_anliklari = lonca().api_anliklari
+    kayit = api_anliklari.get((tur, anahtar, bicim))
+    if kayit is not None and kayit[0] == surum:
+        api_anliklari.move_to_end((tur, anahtar, bicim))
+        return kayit[1]
+    # A rebuild means something changed, so snapshots of deleted or changed data go too
+    for eski in [k for k, (eski_surum, _) in api_anliklari.items() if not _anlik_guncel_mi(k[0], k[1], eski_surum)]:
+        del api_anliklari[eski]
+    veri = uret()
+    if bicim == 'html':
+        anlik = Anlik(_html_render(tur, veri).encode(), 'text/html; charset=utf-8')
+    else:
+        anlik = Anlik(json.dumps(veri, ensure_ascii=False, separators=(',', ':')).encode(),
+                      'application/json; charset=utf-8')
+    api_anliklari[(tur, anahtar, bicim)] = (surum, anlik)
+    while len(api_anliklari) > API_ANLIK_SINIRI:
+        api_anliklari.popitem(last=False)
+    return anlik
+
+def _api_bicimi(request):
+    bicim = request.query.get('format')
+    if bicim in ('json', 'html'):
+        return bicim
+    return 'html' if 'text/html' in request.headers.get('Accept', '') else 'json'
+
+def _api_yanit(request, anlik):
+    basliklar = {'ETag': anlik.etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept, Accept-Encoding'}
+    istenen = request.headers.get('If-None-Match', '')
+    if anlik.etag in (etag.strip() for etag in istenen.split(',')) or istenen.strip() == '*':
+        return web.Response(status=304, headers=basliklar)
+    basliklar['Content-Type'] = anlik.icerik_turu
+    if anlik.gzip is not None and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        basliklar['Content-Encoding'] = 'gzip'
+        return web.Response(body=anlik.gzip, headers=basliklar)
+    return web.Response(body=anlik.govde, headers=basliklar)
+
+@web.middleware
+async def lonca_ara_katmani(request, handler):
+    """Makes the guild in an /api/guilds/{guild_id}/ path the active one; the unprefixed API reads the main database"""
+    if request.path.startswith('/api/'):
+        guild_id = request.match_info.get('guild_id')
+        if guild_id is not None:
+            # Never creates a database for a guild the bot has no data for
+            if not guild_id.isdigit() or not loncalar.var_mi(int(guild_id)):
+                return web.json_response({'error': 'guild not found'}, status=404)
+            guild_id = int(guild_id)
+        aktif_lonca.set(await loncalar.ac(guild_id))
+    return await handler(request)
+
+@rotalar.get('/api/queues')
+@rotalar.get('/api/guilds/{guild_id}/queues')
+async def api_queues(request):
+    anlik = _api_anlik('queues', None, _api_bicimi(request), onbellek.surum,
+                       lambda: {'items': [_api_urun(urun_id) for urun_id in onbellek.urunler]})
+    return _api_yanit(request, anlik)
+
+@rotalar.get('/api/queues/{item}')
+@rotalar.get('/api/guilds/{guild_id}/queues/{item}')
+async def api_queue(request):
+    urun_id = onbellek.urun_bul(request.match_info['item'])
+    if urun_id is None:
+        adaylar = onbellek.isim_indeksi.bul(request.match_info['item'])
+        if len(adaylar) > 1:
+            return web.json_response({'error': 'ambiguous item name',
+                                      'matches': [onbellek.urunler[u_id] for u_id in adaylar]}, status=404)
+        return web.json_response({'error': 'item not found'}, status=404)
+    anlik = _api_anlik('queue', urun_id, _api_bicimi(request), onbellek.surumler[urun_id],
+                       lambda: _api_urun(urun_id))
+    return _api_yanit(request, anlik)
+
+@rotalar.get('/api/players/{discord_id}')
+@rotalar.get('/api/guilds/{guild_id}/players/{discord_id}')
+async def api_player(request):
+    discord_id = request.match_info['discord_id']
+    kullanici_id = onbellek.kullanici_bul(discord_id) if discord_id.isdigit() else None
+    if kullanici_id is None:
+        return web.json_response({'error': 'player not found'}, status=404)
+    anlik = _api_anlik('player', kullanici_id, _api_bicimi(request), onbellek.surum,
+                       lambda: _api_oyuncu(kullanici_id))
+    return _api_yanit(request, anlik)
+
+def web_uygulamasi(istemci):
+    uygulama = web.Application(middlewares=[lonca_ara_katmani])
+    uygulama['bot'] = istemci
+    uygulama.add_routes(rotalar)
+    return uygulama
 
-# Logging settings
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-logger = logging.getLogger(__name__)
 
 # Discord Bot Token
 TOKEN = os.getenv('DISCORD_TOKEN')
-if not TOKEN:
-    print("Hata: DISCORD_TOKEN bulunamadı!")
-    sys.exit(1)
 
-# Admin user IDs (Discord user IDs)
-ADMIN_USER_IDS = [1154754197057703946]  # Discord user IDs here
+# Bot-wide admin user IDs (Discord user IDs), Guild Masters in every guild; comma separated in ADMIN_USER_IDS
+ADMIN_USER_IDS = [int(i) for i in os.getenv('ADMIN_USER_IDS', '1154754197057703946').split(',') if i.strip()]
+
+# Set DEV_GUILD_ID to sync commands to one guild, where updates show up instantly
+DEV_GUILD_ID = int(os.getenv('DEV_GUILD_ID', 0)) or None
+# Sync even if the command tree hash matches the last synced one
+FORCE_COMMAND_SYNC = os.getenv('FORCE_COMMAND_SYNC', '') not in ('', '0')
+
+# Database work runs on a bounded thread pool so a slow SQLite call never blocks the event loop
+DB_WORKERS = int(os.getenv('DB_WORKERS', 4))
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='db')
+
+# SQLite storage profiles, picked with SQLITE_PROFILE; each pragma can also be overridden on its own
+SQLITE_PROFILLERI = {
+    # SQLite defaults: rollback journal, fsync on every commit, readers block while a write commits
+    'safe': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'mmap_size': 0,
+        'cache_size': -2000,
+        'busy_timeout': 5000,
+    },
+    # Readers never wait for the writer, and commits only fsync at WAL checkpoints
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000,
+        'busy_timeout': 5000,
+    },
+}
+
+def sqlite_profili(profil=None):
+    """Pragma settings from SQLITE_PROFILE, with SQLITE_<PRAGMA> environment overrides applied"""
+    profil = profil or os.getenv('SQLITE_PROFILE', 'wal')
+    if profil not in SQLITE_PROFILLERI:
+        raise ValueError(f"Unknown SQLITE_PROFILE '{profil}', expected one of: {', '.join(SQLITE_PROFILLERI)}")
+    ayarlar = dict(SQLITE_PROFILLERI[profil])
+    for pragma in ayarlar:
+        deger = os.getenv(f'SQLITE_{pragma.upper()}')
+        if deger is not None:
+            ayarlar[pragma] = deger
+    return ayarlar
+
+def motor_olustur(yol, pragmalar):
+    """SQLite engine for the given file, with a pool sized for the DB thread pool plus the writer"""
+    motor = create_engine(
+        f'sqlite:///{yol}',
+        pool_size=int(os.getenv('DB_POOL_SIZE', DB_WORKERS + 1)),
+        max_overflow=2,
+    )
 
-# SQLAlchemy setup
+    @event.listens_for(motor, "connect")
+    def _baglandi(dbapi_connection, connection_record):
+        # pysqlite's own transaction handling breaks SAVEPOINTs; the begin hook below emits BEGIN instead
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma, deger in pragmalar.items():
+            cursor.execute(f"PRAGMA {pragma} = {deger}")
+        cursor.close()
+
+    @event.listens_for(motor, "begin")
+    def _basla(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    event.listen(motor, "before_cursor_execute", _sql_basladi)
+    event.listen(motor, "after_cursor_execute", _sql_bitti)
+    return motor
+
+# The start time rides on the statement's execution context, which is dropped with it when the statement fails
+def _sql_basladi(conn, cursor, statement, parameters, context, executemany):
+    context.sql_baslangic = time.perf_counter()
+
+def _sql_bitti(conn, cursor, statement, parameters, context, executemany):
+    sure = time.perf_counter() - context.sql_baslangic
+    metrikler.sql_suresi.gozlemle(sure, statement.split(None, 1)[0].upper())
+    metrikler.sql_ifadeleri.arttir(aktif_komut.get())
+
+# SQLAlchemy setup. The main database holds bot-wide settings, plus the queues of DEFAULT_GUILD_ID (or of
+# the guild that adopted them, see Loncalar); every other guild gets its own file in GUILD_DATA_DIR
+DATABASE_PATH = os.getenv('DATABASE_PATH', 'siralama.db')
+GUILD_DATA_DIR = os.getenv('GUILD_DATA_DIR', os.path.join(os.path.dirname(DATABASE_PATH), 'guilds'))
+DEFAULT_GUILD_ID = int(os.getenv('DEFAULT_GUILD_ID', 0)) or None
 Base = declarative_base()
-engine = create_engine('sqlite:///siralama.db')
-Session = sessionmaker(bind=engine)
 
 # Model definitions
 class Urun(Base):
@@ -50,59 +615,1144 @@ class Kullanici(Base):
     __tablename__ = 'kullanici'
     id = Column(Integer, primary_key=True)
     kullanici_adi = Column(String(100), nullable=False, unique=True)
-    discord_id = Column(String(100), nullable=False, unique=True)
+    discord_id = Column(BigInteger, nullable=False, unique=True)
 
 class Siralama(Base):
     __tablename__ = 'siralama'
+    __table_args__ = (
+        Index('uq_siralama_urun_kullanici', 'urun_id', 'kullanici_id', unique=True),
+        Index('ix_siralama_urun_sira', 'urun_id', 'sira_no'),
+        Index('ix_siralama_kullanici', 'kullanici_id'),
+    )
     id = Column(Integer, primary_key=True)
     urun_id = Column(Integer, ForeignKey('urun.id'), nullable=False)
     kullanici_id = Column(Integer, ForeignKey('kullanici.id'), nullable=False)
+    # Sparse sort key, not the displayed position: positions are computed from the order at read time
     sira_no = Column(Integer, nullable=False)
     urun = relationship('Urun', backref='siralamalar')
     kullanici = relationship('Kullanici', backref='siralamalar')
 
-# Veritabanı tabloları oluştur
-Base.metadata.create_all(engine)
+class Ayar(Base):
+    """Key/value bot state that has to survive restarts"""
+    __tablename__ = 'ayar'
+    anahtar = Column(String(100), primary_key=True)
+    deger = Column(String(500), nullable=False)
+
+class Olay(Base):
+    """Append-only log of queue changes; names are copied in so entries outlive deleted items and players"""
+    __tablename__ = 'olay'
+    __table_args__ = (
+        Index('ix_olay_discord', 'discord_id', 'id'),
+        Index('ix_olay_urun_adi', 'urun_adi', 'id'),
+        Index('ix_olay_tur', 'tur', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+    id = Column(Integer, primary_key=True)
+    zaman = Column(DateTime, nullable=False)
+    tur = Column(String(20), nullable=False)
+    yapan_id = Column(BigInteger)
+    yapan_adi = Column(String(100))
+    urun_id = Column(Integer)
+    urun_adi = Column(String(100))
+    kullanici_id = Column(Integer)
+    kullanici_adi = Column(String(100))
+    discord_id = Column(BigInteger)
+    eski_sira = Column(Integer)
+    yeni_sira = Column(Integer)
+    # JSON payload for events that can't be replayed from the columns alone, e.g. a new item's queue
+    detay = Column(Text)
+
+class SiraAnligi(Base):
+    """Every queue as of olay_id, so history can be rebuilt without replaying the whole log"""
+    __tablename__ = 'sira_anligi'
+    id = Column(Integer, primary_key=True)
+    olay_id = Column(Integer, nullable=False, index=True)
+    zaman = Column(DateTime, nullable=False)
+    veri = Column(Text, nullable=False)  # {"urun_id": [kullanici_id, ...]}
+
+# Gap between neighbouring sira_no keys; inserts take the midpoint until a gap runs out
+SIRA_ARALIGI = 1024
+
+# Schema migrations, applied in order; PRAGMA user_version records the last one a database has seen
+def _goc_sira_anahtarlari(conn):
+    """Spreads the old dense 1..n sira_no values out to sparse keys"""
+    conn.execute(text("UPDATE siralama SET sira_no = sira_no * :aralik"), {"aralik": SIRA_ARALIGI})
+
+def _goc_siralama_indeksleri(conn):
+    """Drops duplicate queue rows, then indexes siralama for queue reads and per-player lookups"""
+    conn.execute(text(
+        "DELETE FROM siralama WHERE id NOT IN "
+        "(SELECT MIN(id) FROM siralama GROUP BY urun_id, kullanici_id)"
+    ))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_siralama_urun_kullanici ON siralama (urun_id, kullanici_id)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_siralama_urun_sira ON siralama (urun_id, sira_no)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_siralama_kullanici ON siralama (kullanici_id)"))
+
+def _goc_discord_id_bigint(conn):
+    """Rebuilds kullanici with an integer discord_id; SQLite can't change a column type in place"""
+    conn.execute(text("DROP TABLE IF EXISTS kullanici_yeni"))
+    conn.execute(text(
+        "CREATE TABLE kullanici_yeni ("
+        "id INTEGER NOT NULL, "
+        "kullanici_adi VARCHAR(100) NOT NULL, "
+        "discord_id BIGINT NOT NULL, "
+        "PRIMARY KEY (id), UNIQUE (kullanici_adi), UNIQUE (discord_id))"
+    ))
+    conn.execute(text(
+        "INSERT INTO kullanici_yeni (id, kullanici_adi, discord_id) "
+        "SELECT id, kullanici_adi, CAST(discord_id AS INTEGER) FROM kullanici"
+    ))
+    conn.execute(text("DROP TABLE kullanici"))
+    conn.execute(text("ALTER TABLE kullanici_yeni RENAME TO kullanici"))
+
+def _goc_olay_gunlugu(conn):
+    """Adds the history tables, starting from a snapshot of the queues as they are now"""
+    Olay.__table__.create(conn, checkfirst=True)
+    SiraAnligi.__table__.create(conn, checkfirst=True)
+    _anlik_al_db(conn, 0)
+
+def _goc_olay_tur_indeksi(conn):
+    """Indexes history by event type, for raffle winners and loot counts"""
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_olay_tur ON olay (tur, id)"))
+
+MIGRATIONS = [
+    (1, _goc_sira_anahtarlari),
+    (2, _goc_siralama_indeksleri),
+    (3, _goc_discord_id_bigint),
+    (4, _goc_olay_gunlugu),
+    (5, _goc_olay_tur_indeksi),
+]
+
+def veritabanini_hazirla(engine):
+    """Creates a fresh database or upgrades an existing one in place"""
+    son_surum = MIGRATIONS[-1][0]
+    with engine.begin() as conn:
+        yeni_veritabani = not inspect(conn).has_table('siralama')
+        if yeni_veritabani:
+            Base.metadata.create_all(conn)
+            conn.execute(text(f"PRAGMA user_version = {son_surum}"))
+            return
+
+    for surum, goc in MIGRATIONS:
+        with engine.begin() as conn:
+            if conn.execute(text("PRAGMA user_version")).scalar() >= surum:
+                continue
+            logger.info(f"Applying database migration {surum}: {goc.__name__}")
+            goc(conn)
+            conn.execute(text(f"PRAGMA user_version = {surum}"))
+
+    # Tables added to the models after a database was created
+    Base.metadata.create_all(engine)
+
+def _session_scope(Session, func, *args):
+    session = Session()
+    try:
+        sonuc = func(session, *args)
+        session.commit()
+        return sonuc
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def _ayar_oku_db(session, anahtar):
+    ayar = session.get(Ayar, anahtar)
+    return ayar.deger if ayar else None
+
+def _ayar_yaz_db(session, anahtar, deger):
+    session.merge(Ayar(anahtar=anahtar, deger=deger))
+
+# A queue snapshot is taken every ANLIK_ARALIGI events and after imports
+ANLIK_ARALIGI = int(os.getenv('HISTORY_SNAPSHOT_EVERY', 1000))
+
+def _anlik_al_db(baglanti, olay_id):
+    """Stores every queue as of olay_id; works on a Session or a Connection"""
+    siralar = {}
+    # Starts from urun so empty queues are kept; players added later are replayed into them too
+    for urun_id, kullanici_id in baglanti.execute(text(
+            "SELECT urun.id, siralama.kullanici_id FROM urun LEFT JOIN siralama ON siralama.urun_id = urun.id "
+            "ORDER BY urun.id, siralama.sira_no")):
+        sira = siralar.setdefault(str(urun_id), [])
+        if kullanici_id is not None:
+            sira.append(kullanici_id)
+    baglanti.execute(insert(SiraAnligi), {
+        'olay_id': olay_id, 'zaman': datetime.now(timezone.utc), 'veri': json.dumps(siralar, separators=(',', ':')),
+    })
+
+def _olaylari_yaz_db(session, olaylar):
+    if not olaylar:
+        return
+    session.execute(insert(Olay), olaylar)
+    son_id = session.execute(text("SELECT MAX(id) FROM olay")).scalar()
+    if (son_id // ANLIK_ARALIGI != (son_id - len(olaylar)) // ANLIK_ARALIGI
+            or any(olay['tur'] == 'import' for olay in olaylar)):
+        _anlik_al_db(session, son_id)
+
+def _olaylarla_yaz(session, func, args, olaylar):
+    """Runs func and logs its events in the same transaction; olaylar may be a function of func's result"""
+    sonuc = func(session, *args)
+    _olaylari_yaz_db(session, olaylar(sonuc) if callable(olaylar) else olaylar)
+    return sonuc
+
+def _siralari_yeniden_kur_db(session, olay_id):
+    """Every queue as it was right after event olay_id: the closest snapshot, then the events since"""
+    anlik = session.query(SiraAnligi).filter(SiraAnligi.olay_id <= olay_id).order_by(
+        SiraAnligi.olay_id.desc(), SiraAnligi.id.desc()
+    ).first()
+    siralar = {int(urun_id): sira for urun_id, sira in json.loads(anlik.veri).items()} if anlik else {}
+    olaylar = session.query(Olay).filter(
+        Olay.id > (anlik.olay_id if anlik else 0), Olay.id <= olay_id
+    ).order_by(Olay.id).yield_per(AKTARIM_PARTISI)
+    return _olaylari_oynat(siralar, olaylar)
+
+def _olaylari_oynat(siralar, olaylar):
+    """Applies events, in id order, to {urun_id: [kullanici_id, ...]} queues"""
+    for olay in olaylar:
+        sira = siralar.get(olay.urun_id)
+        if olay.tur in ('move', 'bind', 'pass') and sira is not None:
+            if olay.kullanici_id in sira:
+                sira.remove(olay.kullanici_id)
+            if olay.tur == 'move':
+                sira.insert(olay.yeni_sira - 1, olay.kullanici_id)
+            elif olay.tur == 'bind':
+                sira.append(olay.kullanici_id)
+        elif olay.tur == 'add_item':
+            siralar[olay.urun_id] = json.loads(olay.detay)
+        elif olay.tur == 'delete_item':
+            siralar.pop(olay.urun_id, None)
+        elif olay.tur == 'add_player':
+            for sira in siralar.values():
+                sira.append(olay.kullanici_id)
+        elif olay.tur == 'kick_player':
+            for sira in siralar.values():
+                if olay.kullanici_id in sira:
+                    sira.remove(olay.kullanici_id)
+    return {urun_id: sira for urun_id, sira in siralar.items() if sira}
+
+def _savepoint_ile(session, func, args):
+    with session.begin_nested():
+        return func(session, *args)
+
+def _toplu_yaz(Session, isler):
+    """Runs queued mutations in one transaction, each under a savepoint so a failure only undoes itself"""
+    session = Session()
+    sonuclar = []
+    try:
+        for func, args, baglam in isler:
+            try:
+                # Each job runs in its caller's context, so its SQL is counted against that command
+                sonuclar.append((True, baglam.run(_savepoint_ile, session, func, args)))
+            except Exception as e:
+                sonuclar.append((False, e))
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        sonuclar = [(False, e)] * len(isler)
+    finally:
+        session.close()
+    return sonuclar
+
+class Yazici:
+    """The single database writer: mutations queue up here and are group-committed in batches"""
+
+    def __init__(self, Session, toplu_sinir=int(os.getenv('DB_WRITE_BATCH', 64))):
+        self.Session = Session
+        self.toplu_sinir = toplu_sinir
+        self.kuyruk = None
+        self.gorev = None
+        self.bekleyen = 0
+
+    async def yaz(self, func, *args, olaylar=None):
+        """Queues func(session, *args) and waits until its batch has committed; olaylar are logged with it"""
+        if olaylar:
+            func, args = _olaylarla_yaz, (func, args, olaylar)
+        if self.gorev is None or self.gorev.done():
+            self.kuyruk = asyncio.Queue()
+            self.gorev = asyncio.create_task(self._calis())
+        future = asyncio.get_running_loop().create_future()
+        self.kuyruk.put_nowait((func, args, contextvars.copy_context(), future))
+        self.bekleyen += 1
+        try:
+            return await future
+        finally:
+            self.bekleyen -= 1
+
+    async def _calis(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            isler = [await self.kuyruk.get()]
+            while len(isler) < self.toplu_sinir and not self.kuyruk.empty():
+                isler.append(self.kuyruk.get_nowait())
+
+            try:
+                sonuclar = await loop.run_in_executor(
+                    db_executor, _toplu_yaz, self.Session, [(func, args, baglam) for func, args, baglam, _ in isler]
+                )
+            except Exception as e:
+                sonuclar = [(False, e)] * len(isler)
+
+            for (_, _, _, future), (basarili, sonuc) in zip(isler, sonuclar):
+                if future.done():
+                    continue
+                if basarili:
+                    future.set_result(sonuc)
+                else:
+                    future.set_exception(sonuc)
+
+class Kilitler:
+    """Per-item locks for queue edits, plus a roster lock for changes that touch every queue"""
+
+    def __init__(self):
+        self.urun_kilitleri = {}
+        self.kadro_kilidi = asyncio.Lock()
+
+    def urun(self, urun_id):
+        return self.urun_kilitleri.setdefault(urun_id, asyncio.Lock())
+
+    @asynccontextmanager
+    async def urunler(self, urun_idleri):
+        # Sorted acquisition, so two callers can never wait on each other
+        alinanlar = []
+        try:
+            for urun_id in sorted(urun_idleri):
+                kilit = self.urun(urun_id)
+                await kilit.acquire()
+                alinanlar.append(kilit)
+            yield
+        finally:
+            for kilit in alinanlar:
+                kilit.release()
+
+    @asynccontextmanager
+    async def tumu(self):
+        async with self.kadro_kilidi, self.urunler(onbellek.urunler):
+            yield
+
+class UrunIndeksi:
+    """Item name index: a prefix trie for completion plus trigrams for substring and fuzzy matches"""
+
+    BENZERLIK_ESIGI = 0.3
+
+    def __init__(self):
+        self.adlar = {}      # urun_id -> normalized name
+        self.trie = {}       # char -> child node; the '' key holds the ids whose name ends there
+        self.trigramlar = {}  # trigram -> {urun_id, ...}
+
+    @staticmethod
+    def _normalize(ad):
+        return " ".join(ad.casefold().split())
+
+    @staticmethod
+    def _trigramlar(ad, dolgulu=True):
+        if dolgulu:
+            ad = f"  {ad} "
+        return {ad[i:i + 3] for i in range(len(ad) - 2)}
+
+    def ekle(self, urun_id, urun_adi):
+        ad = self._normalize(urun_adi)
+        self.adlar[urun_id] = ad
+        node = self.trie
+        for harf in ad:
+            node = node.setdefault(harf, {})
+        node.setdefault('', set()).add(urun_id)
+        for trigram in self._trigramlar(ad):
+            self.trigramlar.setdefault(trigram, set()).add(urun_id)
+
+    def sil(self, urun_id):
+        ad = self.adlar.pop(urun_id)
+        yol = [self.trie]
+        for harf in ad:
+            yol.append(yol[-1][harf])
+        yol[-1][''].discard(urun_id)
+        if not yol[-1]['']:
+            del yol[-1]['']
+        # Prune branches that no longer lead to any name
+        for derinlik in range(len(ad), 0, -1):
+            if yol[derinlik]:
+                break
+            del yol[derinlik - 1][ad[derinlik - 1]]
+        for trigram in self._trigramlar(ad):
+            idler = self.trigramlar[trigram]
+            idler.discard(urun_id)
+            if not idler:
+                del self.trigramlar[trigram]
+
+    def _onek_eslesenler(self, onek):
+        node = self.trie
+        for harf in onek:
+            node = node.get(harf)
+            if node is None:
+                return []
+        idler, yigin = [], [node]
+        while yigin:
+            node = yigin.pop()
+            idler.extend(node.get('', ()))
+            yigin.extend(child for harf, child in node.items() if harf)
+        return idler
+
+    def _icerenler(self, sorgu):
+        if len(sorgu) < 3:
+            adaylar = self.adlar
+        else:
+            parcalar = sorted((self.trigramlar.get(t, set()) for t in self._trigramlar(sorgu, dolgulu=False)), key=len)
+            adaylar = set.intersection(*parcalar) if parcalar else set()
+        return [urun_id for urun_id in adaylar if sorgu in self.adlar[urun_id]]
+
+    def _benzerler(self, sorgu):
+        sorgu_trigramlari = self._trigramlar(sorgu)
+        ortak = {}
+        for trigram in sorgu_trigramlari:
+            for urun_id in self.trigramlar.get(trigram, ()):
+                ortak[urun_id] = ortak.get(urun_id, 0) + 1
+        puanlar = []
+        for urun_id, sayi in ortak.items():
+            benzerlik = sayi / (len(sorgu_trigramlari) + len(self._trigramlar(self.adlar[urun_id])) - sayi)
+            if benzerlik >= self.BENZERLIK_ESIGI:
+                puanlar.append((-benzerlik, len(self.adlar[urun_id]), urun_id))
+        return [urun_id for _, _, urun_id in sorted(puanlar)]
+
+    def _kisadan_uzuna(self, idler):
+        return sorted(idler, key=lambda urun_id: (len(self.adlar[urun_id]), urun_id))
+
+    def bul(self, sorgu):
+        """Ids a command's item name may mean: the exact name, else every prefix match, else every substring match.
+
+        Only one id is an answer; several means the name is ambiguous. Fuzzy matches are left to
+        completion, so a name that does not exist never resolves to a different item."""
+        sorgu = self._normalize(sorgu)
+        if not sorgu:
+            return []
+        tam = self.tam_eslesen(sorgu)
+        if tam is not None:
+            return [tam]
+        return self._kisadan_uzuna(self._onek_eslesenler(sorgu)) or self._kisadan_uzuna(self._icerenler(sorgu))
+
+    def tam_eslesen(self, ad):
+        node = self.trie
+        for harf in self._normalize(ad):
+            node = node.get(harf)
+            if node is None:
+                return None
+        return min(node.get('', ()), default=None)
+
+    def tamamla(self, sorgu, limit=25):
+        """Ids for autocomplete: prefix matches first, then substring and fuzzy ones"""
+        sorgu = self._normalize(sorgu)
+        if not sorgu:
+            return sorted(self.adlar, key=self.adlar.get)[:limit]
+        sonuc = {}
+        for idler in (self._kisadan_uzuna(self._onek_eslesenler(sorgu)),
+                      self._kisadan_uzuna(self._icerenler(sorgu)),
+                      self._benzerler(sorgu)):
+            for urun_id in idler:
+                sonuc.setdefault(urun_id, None)
+                if len(sonuc) >= limit:
+                    return list(sonuc)
+        return list(sonuc)
+
+def _onbellek_yukle_db(session):
+    urunler = session.query(Urun.id, Urun.urun_adi).order_by(Urun.id).all()
+    kullanicilar = session.query(Kullanici.id, Kullanici.kullanici_adi, Kullanici.discord_id).all()
+    siralar = session.query(Siralama.urun_id, Siralama.kullanici_id, Siralama.sira_no).order_by(
+        Siralama.urun_id, Siralama.sira_no
+    ).all()
+    return urunler, kullanicilar, siralar
+
+# Storage backends. A guild's cache and commands only go through its Depo, picked with STORAGE_BACKEND.
+# Writes take olaylar, the history entries logged with them, which may be a function of the write's result
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite')
+
+class Depo(ABC):
+    """Items, roster, queues, settings and history of one guild"""
+
+    kalici = True  # False when the data lives only as long as the process
+
+    def hazirla(self):
+        """Creates or upgrades the storage; called on the database thread pool"""
+
+    def mesgul(self):
+        return False
+
+    async def kapat(self):
+        pass
+
+    # Reads
+    @abstractmethod
+    async def yukle(self):
+        """(urun_id, urun_adi) by id, (kullanici_id, kullanici_adi, discord_id) and
+        (urun_id, kullanici_id, sira_no) ordered by item and key"""
+
+    @abstractmethod
+    async def ayar_oku(self, anahtar):
+        ...
+
+    @abstractmethod
+    async def gecmis(self, discord_id, urun_adi, once_id, limit):
+        """Up to limit + 1 history rows below the once_id cursor, newest first"""
+
+    @abstractmethod
+    async def son_kazananlar(self, sayi):
+        ...
+
+    @abstractmethod
+    async def bind_sayilari(self, gun):
+        ...
+
+    @abstractmethod
+    async def siralari_yeniden_kur(self, olay_id):
+        ...
+
+    @abstractmethod
+    async def disa_aktar(self, dosya, bicim):
+        ...
+
+    # Writes
+    @abstractmethod
+    async def ayar_yaz(self, anahtar, deger):
+        ...
+
+    @abstractmethod
+    async def olaylari_yaz(self, olaylar):
+        ...
+
+    @abstractmethod
+    async def anahtarlari_yaz(self, urun_id, yazilacaklar, olaylar=None):
+        """Sets (kullanici_id, sira_no) keys on one item, adding rows that don't exist yet"""
+
+    @abstractmethod
+    async def siradan_cikar(self, urun_id, kullanici_id, olaylar=None):
+        ...
+
+    @abstractmethod
+    async def oturum_yaz(self, degisiklikler, olaylar=None):
+        """Applies urun_id -> (removed kullanici_ids, (kullanici_id, sira_no) keys) for several items at once"""
+
+    @abstractmethod
+    async def urun_ekle(self, urun_adi, kullanici_idleri, olaylar=None):
+        ...
+
+    @abstractmethod
+    async def urun_sil(self, urun_id, olaylar=None):
+        ...
+
+    @abstractmethod
+    async def oyunculari_ekle(self, oyuncular, olaylar=None):
+        """Adds (discord_id, username) players at the end of every queue; returns their ids"""
+
+    @abstractmethod
+    async def oyunculari_cikar(self, kullanici_idleri, olaylar=None):
+        ...
+
+    @abstractmethod
+    async def kadro_esitle(self, eklenecekler, cikarilacaklar, olaylar=None):
+        """oyunculari_cikar and oyunculari_ekle in one step; returns the new players' ids"""
+
+    @abstractmethod
+    async def ice_aktar(self, dosya, bicim, olaylar=None):
+        """Replaces items, players and queues with an export file, or raises ValueError and changes nothing"""
+
+class SqlDepo(Depo):
+    """A SQLite file: reads on the database thread pool, writes group-committed by a Yazici"""
+
+    def __init__(self, yol):
+        self.yol = yol
+        self.engine = motor_olustur(yol, sqlite_profili())
+        self.Session = sessionmaker(bind=self.engine)
+        self.yazici = Yazici(self.Session)
+
+    def hazirla(self):
+        if os.path.dirname(self.yol):
+            os.makedirs(os.path.dirname(self.yol), exist_ok=True)
+        veritabanini_hazirla(self.engine)
+
+    def mesgul(self):
+        return self.yazici.bekleyen > 0
+
+    async def kapat(self):
+        if self.yazici.gorev is not None:
+            self.yazici.gorev.cancel()
+        await asyncio.get_running_loop().run_in_executor(db_executor, self.engine.dispose)
+
+    async def oku(self, func, *args):
+        """Runs func(session, *args) in one transaction on the database thread pool"""
+        baglam = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            db_executor, functools.partial(baglam.run, _session_scope, self.Session, func, *args))
+
+    async def yukle(self):
+        return await self.oku(_onbellek_yukle_db)
+
+    async def ayar_oku(self, anahtar):
+        return await self.oku(_ayar_oku_db, anahtar)
+
+    async def gecmis(self, discord_id, urun_adi, once_id, limit):
+        return await self.oku(_gecmis_db, discord_id, urun_adi, once_id, limit)
+
+    async def son_kazananlar(self, sayi):
+        return await self.oku(_son_kazananlar_db, sayi)
+
+    async def bind_sayilari(self, gun):
+        return await self.oku(_bind_sayilari_db, gun)
+
+    async def siralari_yeniden_kur(self, olay_id):
+        return await self.oku(_siralari_yeniden_kur_db, olay_id)
+
+    async def disa_aktar(self, dosya, bicim):
+        # One read transaction, so the file is a consistent snapshot
+        return await self.oku(_disa_aktar_db, dosya, bicim)
+
+    async def ayar_yaz(self, anahtar, deger):
+        await self.yazici.yaz(_ayar_yaz_db, anahtar, deger)
+
+    async def olaylari_yaz(self, olaylar):
+        await self.yazici.yaz(_olaylari_yaz_db, olaylar)
+
+    async def anahtarlari_yaz(self, urun_id, yazilacaklar, olaylar=None):
+        await self.yazici.yaz(_anahtarlari_yaz_db, urun_id, yazilacaklar, olaylar=olaylar)
+
+    async def siradan_cikar(self, urun_id, kullanici_id, olaylar=None):
+        await self.yazici.yaz(_pass_db, urun_id, kullanici_id, olaylar=olaylar)
+
+    async def oturum_yaz(self, degisiklikler, olaylar=None):
+        await self.yazici.yaz(_oturum_db, degisiklikler, olaylar=olaylar)
+
+    async def urun_ekle(self, urun_adi, kullanici_idleri, olaylar=None):
+        return await self.yazici.yaz(_additem_db, urun_adi, kullanici_idleri, olaylar=olaylar)
+
+    async def urun_sil(self, urun_id, olaylar=None):
+        await self.yazici.yaz(_deleteitem_db, urun_id, olaylar=olaylar)
+
+    async def oyunculari_ekle(self, oyuncular, olaylar=None):
+        return await self.yazici.yaz(_oyunculari_ekle_db, oyuncular, olaylar=olaylar)
+
+    async def oyunculari_cikar(self, kullanici_idleri, olaylar=None):
+        await self.yazici.yaz(_oyunculari_cikar_db, kullanici_idleri, olaylar=olaylar)
+
+    async def kadro_esitle(self, eklenecekler, cikarilacaklar, olaylar=None):
+        return await self.yazici.yaz(_kadro_esitle_db, eklenecekler, cikarilacaklar, olaylar=olaylar)
+
+    async def ice_aktar(self, dosya, bicim, olaylar=None):
+        return await self.yazici.yaz(_ice_aktar_db, dosya, bicim, olaylar=olaylar)
+
+# A history entry as BellekDepo keeps it, with the Olay columns
+OlayKaydi = namedtuple('OlayKaydi', 'id zaman tur yapan_id yapan_adi urun_id urun_adi kullanici_id '
+                                    'kullanici_adi discord_id eski_sira yeni_sira detay')
+GecmisSatiri = namedtuple('GecmisSatiri', 'id zaman tur yapan_adi urun_adi kullanici_adi eski_sira yeni_sira')
+
+class BellekDepo(Depo):
+    """Plain dicts and tuples in process memory, for tests and benchmarks; nothing touches the disk.
+    Every write checks before it changes anything, so a failed write leaves no trace, like a rollback."""
+
+    kalici = False
+
+    def __init__(self, yol=None):
+        self.urunler = {}       # urun_id -> urun_adi
+        self.kullanicilar = {}  # kullanici_id -> (kullanici_adi, discord_id)
+        self.siralar = {}       # urun_id -> {kullanici_id: sira_no}
+        self.ayarlar = {}
+        self.olaylar = []       # OlayKaydi, olaylar[i].id == i + 1
+        self.anliklar = []      # (olay_id, {urun_id: [kullanici_id, ...]}), by olay_id
+        self.son_urun_id = 0
+        self.son_kullanici_id = 0
+
+    def _sirali(self, urun_id):
+        sira = self.siralar[urun_id]
+        return sorted(sira, key=sira.__getitem__)
+
+    def _gunluge_yaz(self, olaylar, sonuc=None):
+        olaylar = olaylar(sonuc) if callable(olaylar) else olaylar or []
+        for kayit in olaylar:
+            self.olaylar.append(OlayKaydi(id=len(self.olaylar) + 1, **kayit))
+        son_id = len(self.olaylar)
+        if olaylar and (son_id // ANLIK_ARALIGI != (son_id - len(olaylar)) // ANLIK_ARALIGI
+                        or any(kayit['tur'] == 'import' for kayit in olaylar)):
+            self.anliklar.append((son_id, {urun_id: self._sirali(urun_id) for urun_id in self.siralar}))
+        return sonuc
+
+    # Reads
+    async def yukle(self):
+        urunler = sorted(self.urunler.items())
+        kullanicilar = [(k_id, ad, discord_id) for k_id, (ad, discord_id) in self.kullanicilar.items()]
+        siralar = [(urun_id, kullanici_id, self.siralar[urun_id][kullanici_id])
+                   for urun_id, _ in urunler for kullanici_id in self._sirali(urun_id)]
+        return urunler, kullanicilar, siralar
+
+    async def ayar_oku(self, anahtar):
+        return self.ayarlar.get(anahtar)
+
+    async def gecmis(self, discord_id, urun_adi, once_id, limit):
+        satirlar = []
+        for index in range((once_id or len(self.olaylar) + 1) - 2, -1, -1):
+            kayit = self.olaylar[index]
+            if (discord_id is None or kayit.discord_id == discord_id) and (urun_adi is None or kayit.urun_adi == urun_adi):
+                satirlar.append(GecmisSatiri(kayit.id, kayit.zaman, kayit.tur, kayit.yapan_adi, kayit.urun_adi,
+                                             kayit.kullanici_adi, kayit.eski_sira, kayit.yeni_sira))
+                if len(satirlar) > limit:
+                    break
+        return satirlar
+
+    async def son_kazananlar(self, sayi):
+        kazananlar = []
+        for kayit in reversed(self.olaylar):
+            if len(kazananlar) >= sayi:
+                break
+            if kayit.tur == 'raffle':
+                kazananlar.append(kayit.kullanici_id)
+        return set(kazananlar)
+
+    async def bind_sayilari(self, gun):
+        baslangic = datetime.now(timezone.utc) - timedelta(days=gun)
+        sayilar = Counter()
+        for kayit in reversed(self.olaylar):
+            if kayit.zaman < baslangic:
+                break
+            if kayit.tur == 'bind':
+                sayilar[kayit.kullanici_id] += 1
+        return sayilar
+
+    async def siralari_yeniden_kur(self, olay_id):
+        index = bisect_right([anlik_id for anlik_id, _ in self.anliklar], olay_id)
+        anlik_id, siralar = self.anliklar[index - 1] if index else (0, {})
+        siralar = {urun_id: list(sira) for urun_id, sira in siralar.items()}
+        return _olaylari_oynat(siralar, self.olaylar[anlik_id:olay_id])
+
+    def _kayitlar(self):
+        for urun_id, urun_adi in sorted(self.urunler.items()):
+            yield {'type': 'item', 'id': urun_id, 'name': urun_adi}
+        for kullanici_id, (kullanici_adi, discord_id) in sorted(self.kullanicilar.items()):
+            yield {'type': 'player', 'id': kullanici_id, 'name': kullanici_adi, 'discord_id': str(discord_id)}
+        for urun_id in sorted(self.siralar):
+            for sira, kullanici_id in enumerate(self._sirali(urun_id), 1):
+                yield {'type': 'queue', 'item_id': urun_id, 'player_id': kullanici_id, 'rank': sira}
+
+    async def disa_aktar(self, dosya, bicim):
+        return _kayitlari_yaz(self._kayitlar(), dosya, bicim)
+
+    # Writes
+    async def ayar_yaz(self, anahtar, deger):
+        self.ayarlar[anahtar] = deger
+
+    async def olaylari_yaz(self, olaylar):
+        self._gunluge_yaz(olaylar)
+
+    async def anahtarlari_yaz(self, urun_id, yazilacaklar, olaylar=None):
+        self.siralar[urun_id].update(yazilacaklar)
+        self._gunluge_yaz(olaylar)
+
+    async def siradan_cikar(self, urun_id, kullanici_id, olaylar=None):
+        self.siralar[urun_id].pop(kullanici_id, None)
+        self._gunluge_yaz(olaylar)
+
+    async def oturum_yaz(self, degisiklikler, olaylar=None):
+        for urun_id, (silinecekler, yazilacaklar) in degisiklikler.items():
+            sira = self.siralar[urun_id]
+            for kullanici_id in silinecekler:
+                sira.pop(kullanici_id, None)
+            sira.update(yazilacaklar)
+        self._gunluge_yaz(olaylar)
+
+    async def urun_ekle(self, urun_adi, kullanici_idleri, olaylar=None):
+        self.son_urun_id += 1
+        self.urunler[self.son_urun_id] = urun_adi
+        self.siralar[self.son_urun_id] = {k_id: n * SIRA_ARALIGI for n, k_id in enumerate(kullanici_idleri, 1)}
+        return self._gunluge_yaz(olaylar, self.son_urun_id)
+
+    async def urun_sil(self, urun_id, olaylar=None):
+        self.siralar.pop(urun_id, None)
+        self.urunler.pop(urun_id, None)
+        self._gunluge_yaz(olaylar)
+
+    def _oyunculari_ekle(self, oyuncular):
+        adlar = {ad for ad, _ in self.kullanicilar.values()}
+        discord_idleri = {discord_id for _, discord_id in self.kullanicilar.values()}
+        if (len({ad for _, ad in oyuncular} | adlar) < len(adlar) + len(oyuncular)
+                or len({d_id for d_id, _ in oyuncular} | discord_idleri) < len(discord_idleri) + len(oyuncular)):
+            # The UNIQUE constraints of the kullanici table
+            raise ValueError("player name or Discord ID already in the roster")
+        idler = []
+        for discord_id, username in oyuncular:
+            self.son_kullanici_id += 1
+            self.kullanicilar[self.son_kullanici_id] = (username, int(discord_id))
+            idler.append(self.son_kullanici_id)
+        for sira in self.siralar.values():
+            son_anahtar = max(sira.values(), default=0)
+            for n, kullanici_id in enumerate(idler, 1):
+                sira[kullanici_id] = son_anahtar + n * SIRA_ARALIGI
+        return idler
+
+    def _oyunculari_cikar(self, kullanici_idleri):
+        for kullanici_id in kullanici_idleri:
+            self.kullanicilar.pop(kullanici_id, None)
+            for sira in self.siralar.values():
+                sira.pop(kullanici_id, None)
+
+    async def oyunculari_ekle(self, oyuncular, olaylar=None):
+        return self._gunluge_yaz(olaylar, self._oyunculari_ekle(oyuncular))
+
+    async def oyunculari_cikar(self, kullanici_idleri, olaylar=None):
+        self._oyunculari_cikar(kullanici_idleri)
+        self._gunluge_yaz(olaylar)
+
+    async def kadro_esitle(self, eklenecekler, cikarilacaklar, olaylar=None):
+        geri_al = {k_id: self.kullanicilar[k_id] for k_id in cikarilacaklar if k_id in self.kullanicilar}
+        siralar = {urun_id: dict(sira) for urun_id, sira in self.siralar.items()}
+        self._oyunculari_cikar(cikarilacaklar)
+        try:
+            idler = self._oyunculari_ekle(eklenecekler)
+        except ValueError:
+            self.kullanicilar.update(geri_al)
+            self.siralar = siralar
+            raise
+        return self._gunluge_yaz(olaylar, idler)
+
+    async def ice_aktar(self, dosya, bicim, olaylar=None):
+        urunler, kullanicilar, siralar = {}, {}, {}
+        for tur, satir in _ice_aktar_satirlari(dosya, bicim):
+            if tur == 'item':
+                urunler[satir['id']] = satir['urun_adi']
+                siralar[satir['id']] = {}
+            elif tur == 'player':
+                kullanicilar[satir['id']] = (satir['kullanici_adi'], satir['discord_id'])
+            else:
+                siralar[satir['urun_id']][satir['kullanici_id']] = satir['sira_no']
+        self.urunler, self.kullanicilar, self.siralar = urunler, kullanicilar, siralar
+        self.son_urun_id = max(self.son_urun_id, *urunler, 0)
+        self.son_kullanici_id = max(self.son_kullanici_id, *kullanicilar, 0)
+        sayilar = {'item': len(urunler), 'player': len(kullanicilar), 'queue': sum(map(len, siralar.values()))}
+        return self._gunluge_yaz(olaylar, sayilar)
+
+DEPOLAR = {'sqlite': SqlDepo, 'memory': BellekDepo}
+
+def depo_olustur(yol, tur=None):
+    """The STORAGE_BACKEND storage for a guild; yol is its database file, unused in memory"""
+    tur = tur or STORAGE_BACKEND
+    if tur not in DEPOLAR:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{tur}', expected one of: {', '.join(DEPOLAR)}")
+    return DEPOLAR[tur](yol)
+
+class SiraOnbellegi:
+    """Process-wide copy of items, roster and queues, kept current write-through by the admin commands"""
+
+    def __init__(self):
+        self.urunler = {}         # urun_id -> urun_adi, in id order
+        self.kullanicilar = {}    # kullanici_id -> kullanici_adi
+        self.discord_idleri = {}  # kullanici_id -> discord_id
+        self.discord_map = {}     # discord_id -> kullanici_id
+        self.siralar = {}         # urun_id -> [kullanici_id, ...] in rank order
+        self.anahtarlar = {}      # urun_id -> [sira_no, ...] ascending, parallel to siralar
+        self.surumler = {}        # urun_id -> version, bumped whenever that queue changes
+        self.surum = 0            # bumped on every change, for views spanning all items
+        self.oyuncu_urunleri = {} # kullanici_id -> {urun_id, ...} whose queue holds the player
+        self.konumlar = {}        # urun_id -> (version, {kullanici_id: sira}), rebuilt lazily per version
+        self.isim_indeksi = UrunIndeksi()
+        self.dinleyiciler = []    # called after every change
+
+    async def yukle(self):
+        urunler, kullanicilar, siralar = await depo.yukle()
+        self.urunler = {urun_id: urun_adi for urun_id, urun_adi in urunler}
+        self.isim_indeksi = UrunIndeksi()
+        for urun_id, urun_adi in urunler:
+            self.isim_indeksi.ekle(urun_id, urun_adi)
+        self.kullanicilar = {k_id: ad for k_id, ad, _ in kullanicilar}
+        self.discord_idleri = {k_id: d_id for k_id, _, d_id in kullanicilar}
+        self.discord_map = {d_id: k_id for k_id, d_id in self.discord_idleri.items()}
+        self.siralar = {urun_id: [] for urun_id in self.urunler}
+        self.anahtarlar = {urun_id: [] for urun_id in self.urunler}
+        self.oyuncu_urunleri = {kullanici_id: set() for kullanici_id in self.kullanicilar}
+        for urun_id, kullanici_id, sira_no in siralar:
+            self.siralar[urun_id].append(kullanici_id)
+            self.anahtarlar[urun_id].append(sira_no)
+            self.oyuncu_urunleri[kullanici_id].add(urun_id)
+        self.surum += 1
+        # Start past every earlier version, so nothing cached before a reload still looks current
+        self.surumler = {urun_id: self.surum for urun_id in self.urunler}
+        self.konumlar = {}
+        logger.info(f"Queue cache loaded: {len(self.urunler)} items, {len(self.kullanicilar)} players")
+        self._bildir()
+
+    def _degisti(self, urun_id=None):
+        self.surum += 1
+        if urun_id is not None:
+            # Taken from the global counter, so a reused item id never repeats an old version
+            self.surumler[urun_id] = self.surum
+        self._bildir()
+
+    def _bildir(self):
+        for dinleyici in self.dinleyiciler:
+            dinleyici()
+
+    # Lookups
+    def urun_bul(self, item_name):
+        """The item a command names, or None when no item or several items match"""
+        adaylar = self.isim_indeksi.bul(item_name)
+        return adaylar[0] if len(adaylar) == 1 else None
+
+    def urun_bulunamadi(self, item_name):
+        """Why urun_bul found nothing, listing the candidates of an ambiguous name"""
+        adaylar = [f"'{self.urunler[urun_id]}'" for urun_id in self.isim_indeksi.bul(item_name)[:5]]
+        if len(adaylar) < 2:
+            return f"Item '{item_name}' not found!"
+        return f"Item '{item_name}' matches several items, did you mean {', '.join(adaylar[:-1])} or {adaylar[-1]}?"
+
+    def kullanici_bul(self, discord_id):
+        return self.discord_map.get(int(discord_id))
+
+    def konum_haritasi(self, urun_id):
+        """kullanici_id -> 1-based position for the item, cached until its queue changes"""
+        surum = self.surumler[urun_id]
+        kayit = self.konumlar.get(urun_id)
+        if kayit is None or kayit[0] != surum:
+            kayit = (surum, {k_id: sira for sira, k_id in enumerate(self.siralar[urun_id], 1)})
+            self.konumlar[urun_id] = kayit
+        return kayit[1]
+
+    def sira(self, urun_id, kullanici_id):
+        """1-based position of the player in the item's queue, or None"""
+        return self.konum_haritasi(urun_id).get(kullanici_id)
+
+    def oyuncu_konumlari(self, kullanici_id):
+        """(urun_id, sira, queue length) for every queue holding the player, best position first"""
+        konumlar = [
+            (urun_id, self.konum_haritasi(urun_id)[kullanici_id], len(self.siralar[urun_id]))
+            for urun_id in self.oyuncu_urunleri.get(kullanici_id, ())
+        ]
+        konumlar.sort(key=lambda konum: (konum[1], self.urunler[konum[0]].lower()))
+        return konumlar
+
+    def sirali_liste(self, urun_id):
+        return [(sira, self.kullanicilar[k_id]) for sira, k_id in enumerate(self.siralar[urun_id], 1)]
+
+    def son_anahtar(self, urun_id):
+        anahtarlar = self.anahtarlar[urun_id]
+        return anahtarlar[-1] if anahtarlar else 0
+
+    # Key planning; callers write the returned (kullanici_id, sira_no) pairs, then apply them here
+    def tasima_plani(self, urun_id, kullanici_id, yeni_sira):
+        """Keys that put the player at yeni_sira: one key normally, the whole queue when a gap ran out"""
+        sira = self.siralar[urun_id]
+        anahtarlar = self.anahtarlar[urun_id]
+        if kullanici_id in sira:
+            index = sira.index(kullanici_id)
+            sira = sira[:index] + sira[index + 1:]
+            anahtarlar = anahtarlar[:index] + anahtarlar[index + 1:]
+
+        index = yeni_sira - 1
+        onceki = anahtarlar[index - 1] if index > 0 else None
+        sonraki = anahtarlar[index] if index < len(anahtarlar) else None
+        if onceki is None and sonraki is None:
+            return [(kullanici_id, SIRA_ARALIGI)]
+        if sonraki is None:
+            return [(kullanici_id, onceki + SIRA_ARALIGI)]
+        if onceki is None:
+            return [(kullanici_id, sonraki - SIRA_ARALIGI)]
+        if sonraki - onceki > 1:
+            return [(kullanici_id, (onceki + sonraki) // 2)]
+
+        # No room left between the neighbours, respread the whole queue
+        yeni_sira_listesi = sira[:index] + [kullanici_id] + sira[index:]
+        return [(k_id, n * SIRA_ARALIGI) for n, k_id in enumerate(yeni_sira_listesi, 1)]
+
+    def sona_tasima_plani(self, urun_id, kullanici_id):
+        return [(kullanici_id, self.son_anahtar(urun_id) + SIRA_ARALIGI)]
+
+    # Write-through updates, applied after the matching database transaction committed
+    def anahtarlari_uygula(self, urun_id, yazilacaklar):
+        sira = self.siralar[urun_id]
+        anahtarlar = self.anahtarlar[urun_id]
+        for kullanici_id, anahtar in yazilacaklar:
+            if kullanici_id in sira:
+                index = sira.index(kullanici_id)
+                del sira[index]
+                del anahtarlar[index]
+            index = bisect_right(anahtarlar, anahtar)
+            sira.insert(index, kullanici_id)
+            anahtarlar.insert(index, anahtar)
+            self.oyuncu_urunleri[kullanici_id].add(urun_id)
+        self._degisti(urun_id)
+
+    def toplu_uygula(self, urun_id, silinecekler, yazilacaklar):
+        """Removes players and appends (kullanici_id, sira_no) keys past the end of one queue, in one pass"""
+        tasinanlar = {kullanici_id for kullanici_id, _ in yazilacaklar}
+        kalanlar = [(k_id, anahtar) for k_id, anahtar in zip(self.siralar[urun_id], self.anahtarlar[urun_id])
+                    if k_id not in silinecekler and k_id not in tasinanlar]
+        kalanlar += yazilacaklar
+        self.siralar[urun_id] = [k_id for k_id, _ in kalanlar]
+        self.anahtarlar[urun_id] = [anahtar for _, anahtar in kalanlar]
+        for kullanici_id in silinecekler:
+            self.oyuncu_urunleri[kullanici_id].discard(urun_id)
+        self._degisti(urun_id)
+
+    def siradan_cikar(self, urun_id, kullanici_id):
+        index = self.siralar[urun_id].index(kullanici_id)
+        del self.siralar[urun_id][index]
+        del self.anahtarlar[urun_id][index]
+        self.oyuncu_urunleri[kullanici_id].discard(urun_id)
+        self._degisti(urun_id)
+
+    def urun_ekle(self, urun_id, urun_adi, kullanici_idleri):
+        self.urunler[urun_id] = urun_adi
+        self.isim_indeksi.ekle(urun_id, urun_adi)
+        self.siralar[urun_id] = list(kullanici_idleri)
+        self.anahtarlar[urun_id] = [n * SIRA_ARALIGI for n in range(1, len(kullanici_idleri) + 1)]
+        for kullanici_id in kullanici_idleri:
+            self.oyuncu_urunleri[kullanici_id].add(urun_id)
+        self._degisti(urun_id)
+
+    def urun_sil(self, urun_id):
+        del self.urunler[urun_id]
+        self.isim_indeksi.sil(urun_id)
+        for kullanici_id in self.siralar.pop(urun_id):
+            self.oyuncu_urunleri[kullanici_id].discard(urun_id)
+        del self.anahtarlar[urun_id]
+        self.surumler.pop(urun_id, None)
+        self.konumlar.pop(urun_id, None)
+        self._degisti()
+
+    def kullanicilari_ekle(self, yeni_kullanicilar):
+        """Appends (kullanici_id, kullanici_adi, discord_id) players to the end of every queue"""
+        for kullanici_id, kullanici_adi, discord_id in yeni_kullanicilar:
+            self.kullanicilar[kullanici_id] = kullanici_adi
+            self.discord_idleri[kullanici_id] = int(discord_id)
+            self.discord_map[int(discord_id)] = kullanici_id
+            self.oyuncu_urunleri[kullanici_id] = set(self.siralar)
+        for urun_id in self.siralar:
+            for kullanici_id, _, _ in yeni_kullanicilar:
+                self.anahtarlar[urun_id].append(self.son_anahtar(urun_id) + SIRA_ARALIGI)
+                self.siralar[urun_id].append(kullanici_id)
+            self._degisti(urun_id)
+        self._degisti()
+
+    def kullanicilari_sil(self, kullanici_idleri):
+        silinecekler = set(kullanici_idleri)
+        for kullanici_id in silinecekler:
+            del self.kullanicilar[kullanici_id]
+            del self.discord_map[self.discord_idleri.pop(kullanici_id)]
+            del self.oyuncu_urunleri[kullanici_id]
+        for urun_id, sira in self.siralar.items():
+            if silinecekler.isdisjoint(sira):
+                continue
+            kalanlar = [(k_id, anahtar) for k_id, anahtar in zip(sira, self.anahtarlar[urun_id])
+                        if k_id not in silinecekler]
+            self.siralar[urun_id] = [k_id for k_id, _ in kalanlar]
+            self.anahtarlar[urun_id] = [anahtar for _, anahtar in kalanlar]
+            self._degisti(urun_id)
+        self._degisti()
+
+
+class OlcumluAgac(app_commands.CommandTree):
+    """Command tree that starts the latency clock, names the command for SQL attribution and picks its guild"""
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.command is not None:
+            interaction.extras['baslangic'] = time.perf_counter()
+            aktif_komut.set(interaction.command.qualified_name)
+        if await lonca_sec(interaction):
+            return True
+        # Commands that touch no guild data also work in DMs
+        if interaction.command is not None and interaction.command.extras.get('loncasiz'):
+            return True
+        if interaction.type is discord.InteractionType.application_command:
+            await yanitla(interaction, "❌ Loot commands only work in a server.", ephemeral=True)
+        return False
+
+def _komut_bitti(interaction: discord.Interaction, durum):
+    baslangic = interaction.extras.get('baslangic')
+    if baslangic is None or interaction.command is None:
+        return
+    komut = interaction.command.qualified_name
+    metrikler.komut_suresi.gozlemle(time.perf_counter() - baslangic, komut)
+    metrikler.komutlar.arttir(komut, durum)
 
 # Bot ayarları
-class MyBot(commands.Bot):
+class MyBot(commands.AutoShardedBot):
     def __init__(self):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.members = True
-        super().__init__(command_prefix='/', intents=intents)
+        super().__init__(command_prefix='/', intents=intents, tree_cls=OlcumluAgac, http_trace=_discord_izleme())
+        self.web_runner = None
+
+    async def web_baslat(self):
+        self.web_runner = web.AppRunner(web_uygulamasi(self), access_log=None)
+        await self.web_runner.setup()
+        port = int(os.environ.get('PORT', 10000))
+        await web.TCPSite(self.web_runner, '0.0.0.0', port).start()
+        logger.info(f"Web server listening on port {port}")
+
+    def komut_hash(self, guild=None):
+        """Hash of the command payload Discord would receive from tree.sync"""
+        komutlar = sorted((komut.to_dict() for komut in self.tree.get_commands(guild=guild)), key=lambda k: k['name'])
+        veri = json.dumps(komutlar, sort_keys=True, separators=(',', ':')).encode()
+        return hashlib.sha256(veri).hexdigest()
+
+    async def komutlari_esitle(self):
+        """Syncs the command tree only when its payload changed since the last successful sync"""
+        guild = discord.Object(id=DEV_GUILD_ID) if DEV_GUILD_ID else None
+        if guild is not None:
+            # Guild commands update instantly, global ones can take up to an hour
+            self.tree.copy_global_to(guild=guild)
+        hedef = f"guild:{DEV_GUILD_ID}" if guild else "global"
+        anahtar = f"command_hash:{self.application_id}:{hedef}"
+        yeni_hash = self.komut_hash(guild)
+        if not FORCE_COMMAND_SYNC and await depo.ayar_oku(anahtar) == yeni_hash:
+            logger.info(f"Command tree unchanged, skipping {hedef} sync")
+            return False
+        baslangic = time.perf_counter()
+        synced = await self.tree.sync(guild=guild)
+        await depo.ayar_yaz(anahtar, yeni_hash)
+        logger.info(f"Synced {len(synced)} {hedef} commands in {time.perf_counter() - baslangic:.2f}s")
+        return True
 
     async def setup_hook(self):
+        await self.web_baslat()
+        # Guild databases open on their first command; the main one holds the command sync state
+        token = aktif_lonca.set(await loncalar.ac(None))
         try:
-            await self.tree.sync()
-            print("Commands synced successfully!")
+            await self.komutlari_esitle()
         except Exception as e:
-            print(f"Error syncing commands: {e}")
+            logger.error(f"Error syncing commands: {e}")
+        finally:
+            aktif_lonca.reset(token)
+
+    async def close(self):
+        if self.web_runner is not None:
+            await self.web_runner.cleanup()
+            self.web_runner = None
+        await super().close()
+        await loncalar.kapat()
 
 bot = MyBot()
 
 def is_admin():
     async def predicate(interaction: discord.Interaction):
-        return interaction.user.id in ADMIN_USER_IDS
+        return yonetici_mi(interaction)
     return app_commands.check(predicate)
 
 @bot.event
 async def on_ready():
-    logger.info(f'Logged in as {bot.user}!')
-    try:
-        await bot.tree.sync()
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} commands:")
-        for command in bot.tree.get_commands():
-            print(f"- /{command.name}: {command.description}")
-    except Exception as e:
-        print(f"Error syncing commands: {e}")
+    # Fires again on every reconnect; commands were already synced in setup_hook
+    ilk = metrikler.baslangic_suresi is None
+    if ilk:
+        metrikler.baslangic_suresi = time.perf_counter() - BASLANGIC
+        logger.info(f'Logged in as {bot.user}, ready in {metrikler.baslangic_suresi:.2f}s')
+    else:
+        logger.info(f'Reconnected as {bot.user}')
     await bot.change_presence(activity=discord.Game(name="Type /help"))
+    if ilk:
+        # Once per process: rosters catch up with what changed while the bot was offline
+        await kadrolari_esitle()
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    _komut_bitti(interaction, 'ok')
 
-@bot.tree.command(name="help", description="Lists all bot commands")
+@bot.tree.command(name="help", description="Lists all bot commands", extras={'loncasiz': True})
 async def help(interaction: discord.Interaction):
     """Lists all bot commands"""
-    is_user_admin = interaction.user.id in ADMIN_USER_IDS
+    is_user_admin = yonetici_mi(interaction)
 
     base_commands = (
         '⚔️ **BlackHorse Guild Loot System**\n\n'
@@ -111,522 +1761,1906 @@ async def help(interaction: discord.Interaction):
         '📊 **/itemlist** - View all item priority lists\n'
         '🎯 **/itemqueue** - View priority list for specific item\n'
         '👤 **/myloot** - View all your item priorities\n'
+        '📜 **/loothistory** - Who got or passed on what, by member or item\n'
         '🎲 **/roll** - Roll the dice (1-100)\n'
-        '🎉 **/raffle** - Random selection among guildies\n'
+        '🎉 **/raffle** - Random selection among guildies (weights, several winners, voice only)\n'
     )
 
     admin_commands = (
         '\n👑 **Guild Master Commands:**\n'
         '➖➖➖➖➖➖➖➖➖➖➖➖\n'
         '📊 **/moveplayer** - Change player\'s position in queue\n'
+        '👤 **/playerloot** - View any member\'s item priorities\n'
         '❌ **/pass** - Player passes on item\n'
         '✅ **/bind** - Bind item to player (moves to end of queue)\n'
+        '📋 **/lootsession** - Preview and commit many binds and passes at once\n'
         '➕ **/additem** - Add new item to track\n'
         '❌ **/deleteitem** - Delete item\n'
+        '📌 **/setboard** - Set the channel for the live queue board\n'
+        '🛡️ **/guildmaster** - Give or take Guild Master rights in this server\n'
+        '🔄 **/rosterrole** - Keep the roster in sync with a role (no role turns it off)\n'
         '👤 **/addplayer** - Add new guild member\n'
-        '❌ **/kickplayer** - Remove guild member\n\n'
+        '👥 **/addplayers** - Add several members at once (mentions or a role)\n'
+        '❌ **/kickplayer** - Remove guild member\n'
+        '❌ **/kickplayers** - Remove several members at once (mentions or a role)\n'
+        '📦 **/exportdata** - Download items, roster and queues as JSON Lines or CSV\n'
+        '📥 **/importdata** - Replace everything with an exported file\n\n'
         '💡 **Note:** These commands can only be used by Guild Masters and Officers.'
     )
 
     message = base_commands + (admin_commands if is_user_admin else '')
-    await interaction.response.send_message(message)
+    await yanitla(interaction, message)
+
+def _sira_stili(sira_no):
+    if sira_no == 1:
+        return "\u001b[1;33m", "👑"  # Gold
+    if sira_no == 2:
+        return "\u001b[1;37m", "🥈"  # Silver
+    if sira_no == 3:
+        return "\u001b[0;33m", "🥉"  # Bronze
+    return "\u001b[0;37m", "•"       # Normal
+
+def _siralama_satiri(sira_no, kullanici_adi):
+    renk, sembol = _sira_stili(sira_no)
+
+    kisa_ad = kullanici_adi[:15]
+    if len(kullanici_adi) > 15:
+        kisa_ad += "..."
+
+    return f"{renk}   {sembol} {sira_no:2d}. {kisa_ad}\u001b[0m\n"
+
+# Discord rejects messages over 2000 characters; leave room for the page footer
+MESAJ_SINIRI = 1990
+ANSI_BASI = "```ansi\n"
+ANSI_SONU = "```"
+
+def ansi_parcala(satirlar, sinir=MESAJ_SINIRI):
+    """Packs lines into fenced ANSI code blocks of at most sinir characters, in a single pass"""
+    bos_uzunluk = len(ANSI_BASI) + len(ANSI_SONU)
+    parca, uzunluk = [], bos_uzunluk
+    for satir in satirlar:
+        if parca and uzunluk + len(satir) > sinir:
+            yield ANSI_BASI + "".join(parca) + ANSI_SONU
+            parca, uzunluk = [], bos_uzunluk
+        parca.append(satir)
+        uzunluk += len(satir)
+    if parca:
+        yield ANSI_BASI + "".join(parca) + ANSI_SONU
+
+class TembelSayfalar:
+    """Pages pulled from a chunk generator only when first asked for, then kept"""
+
+    def __init__(self, parcalar):
+        self._parcalar = iter(parcalar)
+        self.sayfalar = []
+        self.bitti = False
+
+    def sayfa(self, index):
+        while index >= len(self.sayfalar) and not self.bitti:
+            try:
+                self.sayfalar.append(next(self._parcalar))
+            except StopIteration:
+                self.bitti = True
+        return self.sayfalar[index] if index < len(self.sayfalar) else None
+
+    def sonraki_var(self, index):
+        return self.sayfa(index + 1) is not None
+
+class SayfaGorunumu(discord.ui.View):
+    """Previous/next buttons that render the requested page on demand"""
+
+    def __init__(self, sayfalar: TembelSayfalar, sahip_id: int):
+        super().__init__(timeout=300)
+        self.sayfalar = sayfalar
+        self.sahip_id = sahip_id
+        self.index = 0
+        self._butonlari_guncelle()
+
+    def icerik(self):
+        return f"{self.sayfalar.sayfa(self.index)}\nPage {self.index + 1}"
+
+    def _butonlari_guncelle(self):
+        self.onceki.disabled = self.index == 0
+        self.sonraki.disabled = not self.sayfalar.sonraki_var(self.index)
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        return interaction.user.id == self.sahip_id
+
+    async def _goster(self, interaction: discord.Interaction, index: int):
+        self.index = index
+        self._butonlari_guncelle()
+        await interaction.response.edit_message(content=self.icerik(), view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def onceki(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._goster(interaction, self.index - 1)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def sonraki(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._goster(interaction, self.index + 1)
+
+async def sayfali_gonder(interaction: discord.Interaction, sayfalar: TembelSayfalar):
+    """Sends the first page, with page buttons only when there is more than one"""
+    if not sayfalar.sonraki_var(0):
+        icerik, view = sayfalar.sayfa(0), discord.utils.MISSING
+    else:
+        view = SayfaGorunumu(sayfalar, interaction.user.id)
+        icerik = view.icerik()
+
+    if interaction.response.is_done():
+        await takip(interaction, icerik, view=view)
+    else:
+        await yanitla(interaction, icerik, view=view)
+
+def _siralama_satirlari(kullanici_idleri, adlar):
+    for sira_no, kullanici_id in enumerate(kullanici_idleri, 1):
+        yield _siralama_satiri(sira_no, adlar[kullanici_id])
+
+def _itemlist_satirlari(urunler, adlar):
+    yield "\u001b[1;35m⚔️ BLACKHORSE GUILD - ITEM PRIORITY ⚔️\u001b[0m\n"
+    yield "\u001b[1;35m━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\u001b[0m\n\n"
+    for urun_adi, kullanici_idleri in urunler:
+        yield f"\u001b[1;33m🎯 {urun_adi.upper()}\u001b[0m\n"
+        if not kullanici_idleri:
+            yield "\u001b[0;37m   • No priority list yet!\u001b[0m\n"
+        yield from _siralama_satirlari(kullanici_idleri, adlar)
+        yield "\n"
+
+def _itemqueue_satirlari(urun_adi, kullanici_idleri, adlar):
+    yield f"\u001b[1;35m🎯 {urun_adi.upper()} LOOT PRIORITY LIST\u001b[0m\n"
+    yield "\u001b[1;35m━━━━━━━━━━━━━━━━━━━━━━\u001b[0m\n\n"
+    yield from _siralama_satirlari(kullanici_idleri, adlar)
+
+def _myloot_satirlari(kullanici_adi, konumlar, urun_adlari):
+    yield f"\u001b[1;35m👤 {kullanici_adi.upper()} LOOT PRIORITIES\u001b[0m\n"
+    yield "\u001b[1;35m━━━━━━━━━━━━━━━━━━━━━━\u001b[0m\n\n"
+    for urun_id, sira_no, toplam in konumlar:
+        renk, sembol = _sira_stili(sira_no)
+        yield f"{renk}   {sembol} {sira_no:2d}/{toplam:<3d} {urun_adlari[urun_id]}\u001b[0m\n"
+
+async def _loot_gonder(interaction: discord.Interaction, kullanici_id):
+    kullanici_adi = onbellek.kullanicilar[kullanici_id]
+    konumlar = onbellek.oyuncu_konumlari(kullanici_id)
+    if not konumlar:
+        await yanitla(interaction, f"📝 **{kullanici_adi}** is not in any priority list yet!")
+        return
+    satirlar = _myloot_satirlari(kullanici_adi, konumlar, dict(onbellek.urunler))
+    await sayfali_gonder(interaction, TembelSayfalar(ansi_parcala(satirlar)))
 
 @bot.tree.command(name="itemlist", description="Shows all item priority lists")
 async def itemlist(interaction: discord.Interaction):
     """Shows all item priority lists"""
+    aktif = lonca()
     try:
         await interaction.response.defer()
-        
-        session = Session()
-        products = session.query(Urun).all()
-        if not products:
-            await interaction.followup.send("📦 No items added yet!")
+
+        if not onbellek.urunler:
+            await takip(interaction, "📦 No items added yet!")
             return
 
-        mesaj = "```ansi\n"
-        mesaj += "\u001b[1;35m⚔️ BLACKHORSE GUILD - ITEM PRIORITY ⚔️\u001b[0m\n"
-        mesaj += "\u001b[1;35m━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\u001b[0m\n\n"
-        
-        for product in products:
-            rankings = session.query(Siralama, Kullanici).join(Kullanici).filter(
-                Siralama.urun_id == product.id
-            ).order_by(Siralama.sira_no).all()
+        if aktif.itemlist_cache is None or aktif.itemlist_cache[0] != onbellek.surum:
+            # Pages are rendered lazily, so they read a snapshot rather than the live cache
+            urunler = [(urun_adi, list(onbellek.siralar[urun_id])) for urun_id, urun_adi in onbellek.urunler.items()]
+            satirlar = _itemlist_satirlari(urunler, dict(onbellek.kullanicilar))
+            aktif.itemlist_cache = (onbellek.surum, TembelSayfalar(ansi_parcala(satirlar)))
 
-            mesaj += f"\u001b[1;33m🎯 {product.urun_adi.upper()}\u001b[0m\n"
-            
-            if not rankings:
-                mesaj += "\u001b[0;37m   • No priority list yet!\u001b[0m\n"
-            else:
-                for siralama, kullanici in rankings:
-                    if siralama.sira_no == 1:
-                        renk = "\u001b[1;33m"  # Gold
-                        sembol = "👑"
-                    elif siralama.sira_no == 2:
-                        renk = "\u001b[1;37m"  # Silver
-                        sembol = "🥈"
-                    elif siralama.sira_no == 3:
-                        renk = "\u001b[0;33m"  # Bronze
-                        sembol = "🥉"
-                    else:
-                        renk = "\u001b[0;37m"  # Normal
-                        sembol = "•"
-                    
-                    kullanici_adi = kullanici.kullanici_adi[:15]
-                    if len(kullanici.kullanici_adi) > 15:
-                        kullanici_adi += "..."
-                    
-                    sira_no = f"{siralama.sira_no:2d}"
-                    mesaj += f"{renk}   {sembol} {sira_no}. {kullanici_adi}\u001b[0m\n"
-            
-            mesaj += "\n"
-
-        mesaj += "```"
-        
-        while mesaj:
-            if len(mesaj) <= 1990:
-                await interaction.followup.send(mesaj)
-                break
-            else:
-                son_index = mesaj[:1990].rindex("\n")
-                parcali_mesaj = mesaj[:son_index] + "```"
-                await interaction.followup.send(parcali_mesaj)
-                mesaj = "```ansi\n" + mesaj[son_index+1:]
+        await sayfali_gonder(interaction, aktif.itemlist_cache[1])
 
     except Exception as e:
         if not interaction.response.is_done():
-            await interaction.response.send_message(f"❌ An error occurred: {str(e)}", ephemeral=True)
+            await yanitla(interaction, f"❌ An error occurred: {str(e)}", ephemeral=True)
         else:
-            await interaction.followup.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
-    finally:
-        session.close()
+            await takip(interaction, f"❌ An error occurred: {str(e)}", ephemeral=True)
+
+# Live board: one message per itemlist page in a configured channel, edited in place once changes settle
+PANO_GECIKMESI = float(os.getenv('BOARD_DEBOUNCE', 3))
+# A steady stream of changes still refreshes the board at least this often
+PANO_EN_UZUN_BEKLEME = PANO_GECIKMESI * 4
+
+class Pano:
+    """Board channel messages mirroring every queue; bursts of changes are coalesced into one edit per message"""
+
+    def __init__(self, gecikme=PANO_GECIKMESI):
+        self.gecikme = gecikme
+        self.kanal_id = None
+        self.mesaj_idleri = []
+        self.ozetler = []  # hash of the page last sent to each message, so unchanged pages are skipped
+        self.kirli = False
+        self.son_degisiklik = 0.0
+        self.gorev = None
+        self.kilit = asyncio.Lock()
+
+    async def yukle(self):
+        kanal_id = await depo.ayar_oku('board_channel')
+        mesaj_idleri = await depo.ayar_oku('board_messages')
+        self.kanal_id = int(kanal_id) if kanal_id else None
+        self.mesaj_idleri = json.loads(mesaj_idleri) if mesaj_idleri else []
+        # Stored too, so reopening an idle guild or restarting only edits the pages that really changed
+        ozetler = await depo.ayar_oku('board_hashes')
+        ozetler = json.loads(ozetler) if ozetler else []
+        self.ozetler = ozetler if len(ozetler) == len(self.mesaj_idleri) else [None] * len(self.mesaj_idleri)
+
+    def degisti(self):
+        """Cache listener: schedules a refresh for when changes stop, unless one is pending"""
+        if self.kanal_id is None:
+            return
+        self.kirli = True
+        self.son_degisiklik = time.monotonic()
+        if self.gorev is None or self.gorev.done():
+            self.gorev = asyncio.get_running_loop().create_task(self._ertele())
+
+    async def _ertele(self):
+        while self.kirli:
+            # Wait for a quiet period of gecikme seconds, but not longer than PANO_EN_UZUN_BEKLEME
+            baslangic = time.monotonic()
+            while True:
+                simdi = time.monotonic()
+                bekleme = min(self.son_degisiklik + self.gecikme, baslangic + PANO_EN_UZUN_BEKLEME) - simdi
+                if bekleme <= 0:
+                    break
+                await asyncio.sleep(bekleme)
+            # Changes made while the edits below are in flight trigger one more round
+            self.kirli = False
+            try:
+                await self.guncelle()
+            except Exception as e:
+                logger.error(f"Error updating the board: {e}")
+
+    def sayfalar(self):
+        if not onbellek.urunler:
+            return ["📦 No items added yet!"]
+        urunler = [(urun_adi, onbellek.siralar[urun_id]) for urun_id, urun_adi in onbellek.urunler.items()]
+        return list(ansi_parcala(_itemlist_satirlari(urunler, onbellek.kullanicilar)))
+
+    @staticmethod
+    def _ozet(icerik):
+        return hashlib.sha1(icerik.encode()).hexdigest()[:16]
+
+    async def guncelle(self):
+        """Edits the messages whose page changed, posting or deleting messages when the page count changed"""
+        async with self.kilit:
+            if self.kanal_id is None:
+                return
+            sayfalar = self.sayfalar()
+            if [self._ozet(icerik) for icerik in sayfalar] == self.ozetler:
+                return
+            kanal = bot.get_channel(self.kanal_id) or await bot.fetch_channel(self.kanal_id)
+            idler_degisti = False
+            eski_ozetler = list(self.ozetler)
+
+            for index, icerik in enumerate(sayfalar):
+                ozet = self._ozet(icerik)
+                if index < len(self.mesaj_idleri):
+                    if self.ozetler[index] == ozet:
+                        continue
+                    try:
+                        mesaj_id = self.mesaj_idleri[index]
+                        await gonderici.gonder('PATCH', f"/channels/{self.kanal_id}/messages/{mesaj_id}", ONCELIK_PANO,
+                                               lambda: kanal.get_partial_message(mesaj_id).edit(content=icerik))
+                        self.ozetler[index] = ozet
+                        continue
+                    except discord.NotFound:
+                        pass  # Deleted by hand, post a replacement
+                mesaj = await gonderici.gonder('POST', f"/channels/{self.kanal_id}/messages", ONCELIK_PANO,
+                                               lambda: kanal.send(icerik))
+                try:
+                    await gonderici.gonder('PUT', f"/channels/{self.kanal_id}/pins/{mesaj.id}", ONCELIK_PANO, mesaj.pin)
+                except discord.HTTPException:
+                    pass  # Missing permission or the channel is at the pin limit
+                if index < len(self.mesaj_idleri):
+                    self.mesaj_idleri[index], self.ozetler[index] = mesaj.id, ozet
+                else:
+                    self.mesaj_idleri.append(mesaj.id)
+                    self.ozetler.append(ozet)
+                idler_degisti = True
+
+            for mesaj_id in self.mesaj_idleri[len(sayfalar):]:
+                try:
+                    mesaj = kanal.get_partial_message(mesaj_id)
+                    await gonderici.gonder('DELETE', f"/channels/{self.kanal_id}/messages/{mesaj_id}", ONCELIK_PANO,
+                                           mesaj.delete)
+                except discord.NotFound:
+                    pass
+                idler_degisti = True
+            del self.mesaj_idleri[len(sayfalar):]
+            del self.ozetler[len(sayfalar):]
+
+            if idler_degisti:
+                await depo.ayar_yaz('board_messages', json.dumps(self.mesaj_idleri))
+            if self.ozetler != eski_ozetler:
+                await depo.ayar_yaz('board_hashes', json.dumps(self.ozetler))
+
+    async def kanal_ayarla(self, kanal_id):
+        """Moves the board to another channel (None turns it off), removing the old messages"""
+        async with self.kilit:
+            if self.kanal_id is not None and self.mesaj_idleri:
+                try:
+                    eski_kanal = bot.get_channel(self.kanal_id) or await bot.fetch_channel(self.kanal_id)
+                    for mesaj_id in self.mesaj_idleri:
+                        mesaj = eski_kanal.get_partial_message(mesaj_id)
+                        await gonderici.gonder('DELETE', f"/channels/{self.kanal_id}/messages/{mesaj_id}",
+                                               ONCELIK_PANO, mesaj.delete)
+                except discord.HTTPException:
+                    pass  # Old channel or messages already gone
+            self.kanal_id, self.mesaj_idleri, self.ozetler = kanal_id, [], []
+            await depo.ayar_yaz('board_channel', str(kanal_id) if kanal_id else '')
+            await depo.ayar_yaz('board_messages', '[]')
+            await depo.ayar_yaz('board_hashes', '[]')
+        await self.guncelle()
+
+
+# Roster sync: with a roster role set, holding the role is what puts a member on the roster. Member
+# events are coalesced for KADRO_GECIKMESI seconds and applied as one bulk diff
+KADRO_GECIKMESI = float(os.getenv('ROSTER_SYNC_DEBOUNCE', 2))
+
+class Kadro:
+    """The guild's roster role and the member changes waiting to be applied"""
+
+    def __init__(self, gecikme=KADRO_GECIKMESI):
+        self.gecikme = gecikme
+        self.rol_id = None
+        self.bekleyenler = {}  # discord_id -> display name to add, or None to remove
+        self.gorev = None
+        self.eklenenler = set()  # discord ids the sync added itself; nobody else is ever removed by it
+
+    async def yukle(self):
+        rol_id = await depo.ayar_oku('roster_role')
+        self.rol_id = int(rol_id) if rol_id else None
+        eklenenler = await depo.ayar_oku('roster_added')
+        self.eklenenler = set(json.loads(eklenenler)) if eklenenler else set()
+
+    def rolde_mi(self, member):
+        return not member.bot and any(rol.id == self.rol_id for rol in member.roles)
+
+    def uye_degisti(self, member):
+        """Queues the member's addition or removal, by whether they hold the role, for the next diff"""
+        self._planla(member.id, member.display_name if self.rolde_mi(member) else None)
+
+    def uye_ayrildi(self, discord_id):
+        self._planla(discord_id, None)
+
+    def _planla(self, discord_id, ad):
+        self.bekleyenler[discord_id] = ad
+        if self.gorev is None or self.gorev.done():
+            self.gorev = asyncio.get_running_loop().create_task(self._ertele())
+
+    async def _ertele(self):
+        while self.bekleyenler:
+            await asyncio.sleep(self.gecikme)
+            bekleyenler, self.bekleyenler = self.bekleyenler, {}
+            try:
+                await self.uygula(bekleyenler)
+            except Exception as e:
+                logger.error(f"Error syncing the roster: {e}")
+
+    async def uygula(self, hedef):
+        """Adds the (discord_id -> name) members not on the roster and removes the (discord_id -> None) ones
+        the sync added earlier, in one transaction; returns the added and removed names"""
+        async with kilitler.tumu():
+            # Players added by hand stay, whatever their roles
+            cikarilacaklar = [kullanici_id for kullanici_id in
+                              (onbellek.kullanici_bul(d_id) for d_id, ad in hedef.items()
+                               if ad is None and d_id in self.eklenenler)
+                              if kullanici_id is not None]
+            kullanilan_adlar = set(onbellek.kullanicilar.values()) - {onbellek.kullanicilar[k_id] for k_id in cikarilacaklar}
+            eklenecekler = []
+            for discord_id, ad in hedef.items():
+                if ad is None or onbellek.kullanici_bul(discord_id) is not None:
+                    continue
+                if ad in kullanilan_adlar:
+                    # Names are unique on the roster; tell namesakes apart by their ID instead of skipping them
+                    ad = f"{ad[:80]} #{discord_id % 10000:04d}"
+                eklenecekler.append((discord_id, ad))
+                kullanilan_adlar.add(ad)
+            if not eklenecekler and not cikarilacaklar:
+                return [], []
+
+            cikan_adlar = [onbellek.kullanicilar[kullanici_id] for kullanici_id in cikarilacaklar]
+            kayitlar = [olay(None, 'kick_player', kullanici_id=kullanici_id, yapan_adi='Roster sync')
+                        for kullanici_id in cikarilacaklar]
+            eklenen_kayitlar = [olay(None, 'add_player', kullanici_adi=ad, discord_id=discord_id, yapan_adi='Roster sync')
+                                for discord_id, ad in eklenecekler]
+            kullanici_idleri = await depo.kadro_esitle(eklenecekler, cikarilacaklar, olaylar=lambda idler: kayitlar + [
+                dict(kayit, kullanici_id=kullanici_id) for kayit, kullanici_id in zip(eklenen_kayitlar, idler)
+            ])
+            if cikarilacaklar:
+                onbellek.kullanicilari_sil(cikarilacaklar)
+            if eklenecekler:
+                onbellek.kullanicilari_ekle([
+                    (kullanici_id, ad, discord_id) for kullanici_id, (discord_id, ad) in zip(kullanici_idleri, eklenecekler)
+                ])
+            self.eklenenler.difference_update(d_id for d_id, ad in hedef.items() if ad is None)
+            self.eklenenler.update(discord_id for discord_id, _ in eklenecekler)
+            await depo.ayar_yaz('roster_added', json.dumps(sorted(self.eklenenler)))
+        logger.info(f"Roster sync: {len(eklenecekler)} added, {len(cikarilacaklar)} removed")
+        return [ad for _, ad in eklenecekler], cikan_adlar
+
+    async def unut(self, discord_idleri):
+        """Players kicked by hand; added back by hand, they stay whatever their roles"""
+        if self.eklenenler.intersection(discord_idleri):
+            self.eklenenler.difference_update(discord_idleri)
+            await depo.ayar_yaz('roster_added', json.dumps(sorted(self.eklenenler)))
+
+    async def esitle(self, guild):
+        """Reconciles the whole roster with the role's members in one pass; None if the role is gone.
+
+        Returns the added and removed names, and the names of the players without the role that were
+        kept because they were added by hand."""
+        rol = guild.get_role(self.rol_id) if self.rol_id is not None else None
+        if rol is None:
+            return None
+        hedef = {member.id: member.display_name for member in rol.members if not member.bot}
+        tutulanlar = [onbellek.kullanicilar[kullanici_id] for discord_id, kullanici_id in onbellek.discord_map.items()
+                      if discord_id not in hedef and discord_id not in self.eklenenler]
+        for discord_id in onbellek.discord_map:
+            hedef.setdefault(discord_id, None)
+        eklenenler, cikanlar = await self.uygula(hedef)
+        return eklenenler, cikanlar, tutulanlar
+
+    async def rol_ayarla(self, rol_id, guild_id):
+        await depo.ayar_yaz('roster_role', str(rol_id) if rol_id else '')
+        self.rol_id = rol_id
+        if rol_id is None:
+            # Whoever the sync added is an ordinary roster player from now on
+            self.eklenenler = set()
+            await depo.ayar_yaz('roster_added', '')
+        await loncalar.kadro_kaydet(guild_id, rol_id is not None)
+
+# Guilds. Each has its own database, writer, locks, queue cache and board, opened on first use and
+# closed again after LONCA_BOSTA_SURESI seconds without any, so memory and file handles follow active guilds
+LONCA_BOSTA_SURESI = float(os.getenv('GUILD_IDLE_SECONDS', 900))
+
+# The guild the current command, API request or background task acts on
+aktif_lonca = contextvars.ContextVar('aktif_lonca')
+
+def lonca():
+    return aktif_lonca.get()
+
+class Lonca:
+    """Everything one guild's commands work on"""
+
+    def __init__(self, guild_id, yol, depo=None):
+        self.guild_id = guild_id
+        self.yol = yol
+        self.depo = depo or depo_olustur(yol)
+        self.kilitler = Kilitler()
+        self.onbellek = SiraOnbellegi()
+        self.pano = Pano()
+        self.onbellek.dinleyiciler.append(self.pano.degisti)
+        self.kadro = Kadro()
+        self.yoneticiler = set()  # Guild Masters added with /guildmaster
+        self.itemlist_cache = None
+        self.cekilis_adaylari = None  # (onbellek.surum, [kullanici_id, ...]), the roster as a plain array
+        self.api_anliklari = OrderedDict()  # (kind, key, format) -> (version, Anlik), least recently used first
+        self.son_kullanim = time.monotonic()
+
+    def hazirla(self):
+        """Creates or upgrades the guild's storage"""
+        self.depo.hazirla()
+
+    async def ac(self):
+        """Prepares the database and loads the cache and board; runs with this guild as the active one"""
+        aktif_lonca.set(self)
+        await asyncio.get_running_loop().run_in_executor(db_executor, self.hazirla)
+        await self.onbellek.yukle()
+        yoneticiler = await depo.ayar_oku('admins')
+        self.yoneticiler = set(json.loads(yoneticiler)) if yoneticiler else set()
+        await self.pano.yukle()
+        await self.kadro.yukle()
+        # Catches up with changes made while the guild was closed, e.g. a CLI import; the stored
+        # page hashes keep this from editing anything when nothing changed
+        self.pano.degisti()
+        return self
+
+    def mesgul(self):
+        return (self.depo.mesgul() or self.kilitler.kadro_kilidi.locked()
+                or any(kilit.locked() for kilit in self.kilitler.urun_kilitleri.values())
+                or self.pano.kilit.locked() or any(gorev is not None and not gorev.done()
+                                                   for gorev in (self.pano.gorev, self.kadro.gorev)))
+
+    async def kapat(self):
+        for gorev in (self.pano.gorev, self.kadro.gorev):
+            if gorev is not None:
+                gorev.cancel()
+        await self.depo.kapat()
+
+class Loncalar:
+    """Open guilds by id"""
+
+    def __init__(self):
+        self.acik = {}
+        self.acilislar = {}  # guild id -> task opening it, shared by concurrent first uses
+        self.temizlik = None
+        self.ana_lonca_id = DEFAULT_GUILD_ID  # the guild whose queues live in the main database
+        self.ana_secimi = None  # task settling ana_lonca_id, once per process
+        self.kadro_loncalari = None  # ids of the guilds syncing their roster with a role, kept in the main database
+
+    def _anahtar(self, guild_id):
+        # The main database's guild shares the None entry
+        return None if guild_id is not None and guild_id == self.ana_lonca_id else guild_id
+
+    def yol(self, guild_id):
+        guild_id = self._anahtar(guild_id)
+        return DATABASE_PATH if guild_id is None else os.path.join(GUILD_DATA_DIR, f"{guild_id}.db")
+
+    def var_mi(self, guild_id):
+        """Whether the guild has data, without creating its database"""
+        return self._anahtar(guild_id) in self.acik or os.path.exists(self.yol(guild_id))
+
+    async def ac(self, guild_id):
+        if guild_id is not None:
+            if self.ana_secimi is None:
+                self.ana_secimi = asyncio.get_running_loop().create_task(self._ana_lonca_sec(guild_id))
+            try:
+                await asyncio.shield(self.ana_secimi)
+            except Exception:
+                self.ana_secimi = None  # retried by the next guild opened
+                raise
+        anahtar = self._anahtar(guild_id)
+        acik = self.acik.get(anahtar)
+        if acik is None:
+            acilis = self.acilislar.get(anahtar)
+            if acilis is None:
+                acilis = asyncio.get_running_loop().create_task(self._ac(anahtar, guild_id))
+                self.acilislar[anahtar] = acilis
+            acik = await asyncio.shield(acilis)
+        acik.son_kullanim = time.monotonic()
+        if self.temizlik is None or self.temizlik.done():
+            self.temizlik = asyncio.get_running_loop().create_task(self._temizle())
+        return acik
+
+    async def _ac(self, anahtar, guild_id):
+        try:
+            acik = await Lonca(guild_id, self.yol(guild_id)).ac()
+            self.acik[anahtar] = acik
+            logger.info(f"Opened guild {guild_id or 'main'} database ({len(self.acik)} open)")
+            return acik
+        finally:
+            del self.acilislar[anahtar]
+
+    async def _ana_lonca_sec(self, guild_id):
+        """Finds the guild the main database's queues belong to: DEFAULT_GUILD_ID, the one stored there,
+        or else the first guild opened, when the main database still holds a single-guild deployment's data"""
+        if self.ana_lonca_id is not None:
+            return
+        ana = await self.ac(None)
+        kayitli = await ana.depo.ayar_oku('default_guild')
+        if kayitli:
+            self.ana_lonca_id = int(kayitli)
+        elif ana.onbellek.urunler or ana.onbellek.kullanicilar:
+            if os.path.exists(self.yol(guild_id)):
+                # Never hides a guild's own data behind the main database's
+                logger.warning(f"The main database has queues no guild owns, and guild {guild_id} already has "
+                               f"its own database; set DEFAULT_GUILD_ID to the guild they belong to")
+                return
+            await ana.depo.ayar_yaz('default_guild', str(guild_id))
+            self.ana_lonca_id = guild_id
+            logger.warning(f"Guild {guild_id} adopted the queues in the main database; "
+                           f"set DEFAULT_GUILD_ID to assign them to another guild")
+
+    async def kadro_loncalari_oku(self):
+        """Role-synced guild ids, so member events and the startup sync open only those guilds"""
+        if self.kadro_loncalari is None:
+            ana = await self.ac(None)
+            kayit = await ana.depo.ayar_oku('roster_guilds')
+            self.kadro_loncalari = set(json.loads(kayit)) if kayit else set()
+        return self.kadro_loncalari
+
+    async def kadro_kaydet(self, guild_id, acik):
+        kadro_loncalari = await self.kadro_loncalari_oku()
+        if (guild_id in kadro_loncalari) == acik:
+            return
+        if acik:
+            kadro_loncalari.add(guild_id)
+        else:
+            kadro_loncalari.discard(guild_id)
+        ana = await self.ac(None)
+        await ana.depo.ayar_yaz('roster_guilds', json.dumps(sorted(kadro_loncalari)))
+
+    async def _temizle(self):
+        """Closes guilds that have been idle for LONCA_BOSTA_SURESI"""
+        while self.acik:
+            await asyncio.sleep(max(LONCA_BOSTA_SURESI / 4, 1))
+            simdi = time.monotonic()
+            for anahtar, acik in list(self.acik.items()):
+                # Closing an in-memory guild would throw its data away
+                if acik.depo.kalici and simdi - acik.son_kullanim >= LONCA_BOSTA_SURESI and not acik.mesgul():
+                    del self.acik[anahtar]
+                    await acik.kapat()
+                    logger.info(f"Closed idle guild {acik.guild_id or 'main'} database ({len(self.acik)} open)")
+
+    async def kapat(self):
+        if self.temizlik is not None:
+            self.temizlik.cancel()
+        for acik in list(self.acik.values()):
+            await acik.kapat()
+        self.acik.clear()
+
+loncalar = Loncalar()
+
+class _LoncaVekili:
+    """Forwards to one part of the active guild, so handlers keep writing onbellek.sira(...) and the like"""
+
+    def __init__(self, ad):
+        self._ad = ad
+
+    def __getattr__(self, ad):
+        return getattr(getattr(aktif_lonca.get(), self._ad), ad)
+
+onbellek = _LoncaVekili('onbellek')
+depo = _LoncaVekili('depo')
+kilitler = _LoncaVekili('kilitler')
+pano = _LoncaVekili('pano')
+kadro = _LoncaVekili('kadro')
+
+async def lonca_sec(interaction: discord.Interaction):
+    """Makes the interaction's guild the active one; False outside a server"""
+    if interaction.guild_id is None:
+        return False
+    aktif_lonca.set(await loncalar.ac(interaction.guild_id))
+    return True
+
+def yonetici_idsi_mi(discord_id, guild=None):
+    """Guild Masters: the bot-wide ADMIN_USER_IDS, the server owner and the guild's own /guildmaster list"""
+    acik = aktif_lonca.get(None)  # None in DMs
+    return (discord_id in ADMIN_USER_IDS or (acik is not None and discord_id in acik.yoneticiler)
+            or (guild is not None and guild.owner_id == discord_id))
+
+def yonetici_mi(interaction: discord.Interaction):
+    return yonetici_idsi_mi(interaction.user.id, interaction.guild)
+
+@bot.tree.command(name="setboard", description="Sets the channel for the live queue board, or turns it off (Guild Master only)")
+@app_commands.check(yonetici_mi)
+async def setboard(interaction: discord.Interaction, channel: discord.TextChannel = None):
+    """Sets the channel for the live queue board, or turns it off (Guild Master only)"""
+    try:
+        await interaction.response.defer(ephemeral=True)
+        await pano.kanal_ayarla(channel.id if channel else None)
+        if channel is None:
+            await takip(interaction, "✅ Live queue board turned off.", ephemeral=True)
+        else:
+            await takip(interaction, f"✅ Live queue board is now in {channel.mention}.", ephemeral=True)
+    except Exception as e:
+        await takip(interaction, f"❌ Error setting the board: {str(e)}", ephemeral=True)
+
+@bot.tree.command(name="guildmaster", description="Gives or takes Guild Master rights in this server (Guild Master only)")
+@app_commands.check(yonetici_mi)
+async def guildmaster(interaction: discord.Interaction, member: discord.Member, enabled: bool = True):
+    """Gives or takes Guild Master rights in this server (Guild Master only)"""
+    try:
+        aktif = lonca()
+        yoneticiler = aktif.yoneticiler | {member.id} if enabled else aktif.yoneticiler - {member.id}
+        await depo.ayar_yaz('admins', json.dumps(sorted(yoneticiler)))
+        aktif.yoneticiler = yoneticiler
+        if enabled:
+            mesaj = f"✅ **{member.display_name}** is now a Guild Master in this server."
+        elif yonetici_idsi_mi(member.id, interaction.guild):
+            mesaj = f"ℹ️ **{member.display_name}** stays a Guild Master as the server owner or a bot admin."
+        else:
+            mesaj = f"✅ **{member.display_name}** is no longer a Guild Master in this server."
+        await yanitla(interaction, mesaj, ephemeral=True)
+    except Exception as e:
+        await yanitla(interaction, f"❌ An error occurred: {str(e)}", ephemeral=True)
+
+@bot.tree.command(name="rosterrole", description="Keeps the roster in sync with a role's members, or stops it (Guild Master only)")
+@app_commands.check(yonetici_mi)
+async def rosterrole(interaction: discord.Interaction, role: discord.Role = None):
+    """Keeps the roster in sync with a role's members, or stops it (Guild Master only)"""
+    try:
+        await interaction.response.defer(ephemeral=True)
+        await kadro.rol_ayarla(role.id if role else None, interaction.guild_id)
+        if role is None:
+            await takip(interaction, "✅ Roster sync turned off, the roster is only changed by commands now.", ephemeral=True)
+            return
+        eklenenler, cikanlar, tutulanlar = await kadro.esitle(interaction.guild)
+        await takip(interaction,
+            f"✅ The roster now follows {role.mention}: **{len(eklenenler)}** added, **{len(cikanlar)}** removed."
+            + (f"\nAdded: {', '.join(eklenenler)}" if eklenenler else "")
+            + (f"\nRemoved: {', '.join(cikanlar)}" if cikanlar else "")
+            + (f"\n**{len(tutulanlar)}** players without the role were added by hand and stay on the roster; "
+               f"use /kickplayers to remove them." if tutulanlar else ""),
+            ephemeral=True
+        )
+    except Exception as e:
+        await takip(interaction, f"❌ Error setting the roster role: {str(e)}", ephemeral=True)
+
+async def _kadro_lonca(guild):
+    """Makes the guild the active one if it syncs its roster with a role; opens no other guild"""
+    if guild.id not in await loncalar.kadro_loncalari_oku():
+        return False
+    acik = await loncalar.ac(guild.id)
+    aktif_lonca.set(acik)
+    return acik.kadro.rol_id is not None
+
+async def kadrolari_esitle():
+    """Reconciles every role-synced guild with its cached members, catching up on events missed while offline"""
+    for guild_id in sorted(await loncalar.kadro_loncalari_oku()):
+        guild = bot.get_guild(guild_id)
+        if guild is None:
+            continue
+        try:
+            if await _kadro_lonca(guild) and await kadro.esitle(guild) is None:
+                logger.warning(f"Roster role of guild {guild.id} no longer exists, roster left as it is")
+        except Exception as e:
+            logger.error(f"Error syncing the roster of guild {guild.id}: {e}")
+
+@bot.event
+async def on_member_join(member: discord.Member):
+    if await _kadro_lonca(member.guild) and kadro.rolde_mi(member):
+        kadro.uye_degisti(member)
+
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    # Cheap check first, so unrelated updates never open the guild
+    if before.roles != after.roles and await _kadro_lonca(after.guild):
+        if kadro.rolde_mi(before) != kadro.rolde_mi(after):
+            kadro.uye_degisti(after)
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    if await _kadro_lonca(member.guild) and member.id in kadro.eklenenler:
+        kadro.uye_ayrildi(member.id)
 
 @bot.tree.command(name="itemqueue", description="Shows priority list for specific loot")
 async def itemqueue(interaction: discord.Interaction, item_name: str):
     """Shows priority list for specific loot"""
-    session = Session()
+    urun_id = onbellek.urun_bul(item_name)
+    if urun_id is None:
+        await yanitla(interaction, f"❌ {onbellek.urun_bulunamadi(item_name)}")
+        return
+
+    urun_adi = onbellek.urunler[urun_id]
+    kullanici_idleri = list(onbellek.siralar[urun_id])
+    if not kullanici_idleri:
+        await yanitla(interaction, f"📝 No priority list yet for **{urun_adi}**!")
+        return
+
+    satirlar = _itemqueue_satirlari(urun_adi, kullanici_idleri, dict(onbellek.kullanicilar))
+    await sayfali_gonder(interaction, TembelSayfalar(ansi_parcala(satirlar)))
+
+@bot.tree.command(name="myloot", description="Shows your position in every item priority list")
+async def myloot(interaction: discord.Interaction):
+    """Shows your position in every item priority list"""
+    kullanici_id = onbellek.kullanici_bul(interaction.user.id)
+    if kullanici_id is None:
+        await yanitla(interaction, "❌ You are not in the guild roster!", ephemeral=True)
+        return
+    await _loot_gonder(interaction, kullanici_id)
+
+@bot.tree.command(name="playerloot", description="Shows a member's position in every item priority list (Guild Master only)")
+@app_commands.check(yonetici_mi)
+async def playerloot(interaction: discord.Interaction, member: discord.Member):
+    """Shows a member's position in every item priority list (Guild Master only)"""
+    kullanici_id = onbellek.kullanici_bul(member.id)
+    if kullanici_id is None:
+        await yanitla(interaction, f"❌ Player '{member.display_name}' not found in the guild roster!")
+        return
+    await _loot_gonder(interaction, kullanici_id)
+
+GECMIS_SAYFASI = 15
+OLAY_ETIKETLERI = {
+    'move': "↕️ MOVE", 'pass': "⏭️ PASS", 'bind': "✅ BIND",
+    'add_item': "➕ ITEM", 'delete_item': "❌ ITEM",
+    'add_player': "👤 JOIN", 'kick_player': "🚪 KICK", 'import': "📥 IMPORT", 'raffle': "🎉 RAFFLE",
+}
+
+def _gecmis_db(session, discord_id, urun_adi, once_id, limit):
+    """One page of history, newest first, below the once_id cursor; fetches one extra row to tell if more follow"""
+    sorgu = session.query(
+        Olay.id, Olay.zaman, Olay.tur, Olay.yapan_adi, Olay.urun_adi, Olay.kullanici_adi, Olay.eski_sira, Olay.yeni_sira
+    )
+    if discord_id is not None:
+        sorgu = sorgu.filter(Olay.discord_id == discord_id)
+    if urun_adi is not None:
+        sorgu = sorgu.filter(Olay.urun_adi == urun_adi)
+    if once_id is not None:
+        sorgu = sorgu.filter(Olay.id < once_id)
+    return sorgu.order_by(Olay.id.desc()).limit(limit + 1).all()
+
+def _gecmis_satiri(olay_id, zaman, tur, yapan_adi, urun_adi, kullanici_adi, eski_sira, yeni_sira):
+    konum = ""
+    if eski_sira is not None or yeni_sira is not None:
+        konum = f" {eski_sira or '-'}→{yeni_sira or '-'}"
+    kim = " ".join(ad[:15] for ad in (kullanici_adi, urun_adi) if ad)
+    yapan = f" \u001b[0;37mby {yapan_adi[:15]}\u001b[0m" if yapan_adi else ""
+    return f"\u001b[0;36m#{olay_id}\u001b[0m {zaman:%m-%d %H:%M} {OLAY_ETIKETLERI.get(tur, tur)} {kim}{konum}{yapan}\n"
+
+class GecmisGorunumu(discord.ui.View):
+    """Newer/older buttons over the history log; every page is one keyset query, never an OFFSET scan"""
+
+    def __init__(self, sahip_id: int, discord_id=None, urun_adi=None):
+        super().__init__(timeout=300)
+        self.sahip_id = sahip_id
+        self.discord_id = discord_id
+        self.urun_adi = urun_adi
+        self.imlecler = [None]  # imlecler[i]: the id page i starts below
+        self.index = 0
+
+    async def icerik(self):
+        """Loads the current page and updates the buttons; None when it is empty"""
+        satirlar = await depo.gecmis(self.discord_id, self.urun_adi, self.imlecler[self.index], GECMIS_SAYFASI)
+        daha_var = len(satirlar) > GECMIS_SAYFASI
+        satirlar = satirlar[:GECMIS_SAYFASI]
+        if daha_var and len(self.imlecler) == self.index + 1:
+            self.imlecler.append(satirlar[-1].id)
+        self.onceki.disabled = self.index == 0
+        self.sonraki.disabled = not daha_var
+        if not satirlar:
+            return None
+        govde = "".join(_gecmis_satiri(*satir) for satir in satirlar)
+        return f"{ANSI_BASI}{govde}{ANSI_SONU}\nPage {self.index + 1}"
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        return interaction.user.id == self.sahip_id and await lonca_sec(interaction)
+
+    async def _goster(self, interaction: discord.Interaction, index: int):
+        self.index = index
+        await interaction.response.edit_message(content=await self.icerik(), view=self)
+
+    @discord.ui.button(label="◀ Newer", style=discord.ButtonStyle.secondary)
+    async def onceki(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._goster(interaction, self.index - 1)
+
+    @discord.ui.button(label="Older ▶", style=discord.ButtonStyle.secondary)
+    async def sonraki(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._goster(interaction, self.index + 1)
+
+@bot.tree.command(name="loothistory", description="Shows queue history, newest first, for a member or an item")
+async def loothistory(interaction: discord.Interaction, member: discord.Member = None, item_name: str = None):
+    """Shows queue history, newest first, for a member or an item"""
     try:
-        product = session.query(Urun).filter(Urun.urun_adi.ilike(f"%{item_name}%")).first()
-        if not product:
-            await interaction.response.send_message(f"❌ Loot item '{item_name}' not found!")
-            return
+        await interaction.response.defer()
 
-        rankings = session.query(Siralama, Kullanici).join(Kullanici).filter(
-            Siralama.urun_id == product.id
-        ).order_by(Siralama.sira_no).all()
+        urun_adi = None
+        if item_name is not None:
+            # Deleted items are no longer in the cache, but their history is kept under the name
+            urun_id = onbellek.urun_bul(item_name)
+            urun_adi = onbellek.urunler[urun_id] if urun_id is not None else item_name
 
-        if not rankings:
-            await interaction.response.send_message(f"📝 No priority list yet for **{product.urun_adi}**!")
+        view = GecmisGorunumu(interaction.user.id, member.id if member else None, urun_adi)
+        icerik = await view.icerik()
+        if icerik is None:
+            await takip(interaction, "📜 No history found!")
             return
+        await takip(interaction, icerik, view=view if not view.sonraki.disabled else discord.utils.MISSING)
+    except Exception as e:
+        await takip(interaction, f"❌ An error occurred: {str(e)}", ephemeral=True)
 
-        mesaj = "```ansi\n"
-        mesaj += f"\u001b[1;35m🎯 {product.urun_adi.upper()} LOOT PRIORITY LIST\u001b[0m\n"
-        mesaj += "\u001b[1;35m━━━━━━━━━━━━━━━━━━━━━━\u001b[0m\n\n"
-
-        for siralama, kullanici in rankings:
-            if siralama.sira_no == 1:
-                renk = "\u001b[1;33m"  # Gold
-                sembol = "👑"
-            elif siralama.sira_no == 2:
-                renk = "\u001b[1;37m"  # Silver
-                sembol = "🥈"
-            elif siralama.sira_no == 3:
-                renk = "\u001b[0;33m"  # Bronze
-                sembol = "🥉"
-            else:
-                renk = "\u001b[0;37m"  # Normal
-                sembol = "•"
-            
-            kullanici_adi = kullanici.kullanici_adi[:15]
-            if len(kullanici.kullanici_adi) > 15:
-                kullanici_adi += "..."
-            
-            sira_no = f"{siralama.sira_no:2d}"
-            mesaj += f"{renk}   {sembol} {sira_no}. {kullanici_adi}\u001b[0m\n"
-
-        mesaj += "```"
-        await interaction.response.send_message(mesaj)
-    finally:
-        session.close()
-
-@bot.tree.command(name="roll", description="Roll the dice (1-100)")
+@bot.tree.command(name="roll", description="Roll the dice (1-100)", extras={'loncasiz': True})
 async def roll(interaction: discord.Interaction):
     """Roll the dice (1-100)"""
     roll_result = random.randint(1, 100)
-    await interaction.response.send_message(f"🎲 **{interaction.user.display_name}** rolled: **{roll_result}**!")
+    await yanitla(interaction, f"🎲 **{interaction.user.display_name}** rolled: **{roll_result}**!")
+
+# Raffle engine: a Fenwick tree over integer weights, so each draw and each removal is O(log n)
+class FenwickAgaci:
+    """Prefix sums of non-negative integer weights, with weighted index search"""
+
+    def __init__(self, agirliklar):
+        self.n = len(agirliklar)
+        self.agirliklar = list(agirliklar)
+        self.agac = [0] + self.agirliklar
+        # Linear-time build: push each node's sum to its parent
+        for i in range(1, self.n + 1):
+            ust = i + (i & -i)
+            if ust <= self.n:
+                self.agac[ust] += self.agac[i]
+        self.toplam = sum(self.agirliklar)
+
+    def guncelle(self, index, agirlik):
+        fark = agirlik - self.agirliklar[index]
+        self.agirliklar[index] = agirlik
+        self.toplam += fark
+        i = index + 1
+        while i <= self.n:
+            self.agac[i] += fark
+            i += i & -i
+
+    def bul(self, hedef):
+        """Index whose weight range covers hedef, for 0 <= hedef < toplam"""
+        i, adim = 0, 1 << self.n.bit_length()
+        while adim:
+            sonraki = i + adim
+            if sonraki <= self.n and self.agac[sonraki] <= hedef:
+                i = sonraki
+                hedef -= self.agac[sonraki]
+            adim >>= 1
+        return i
+
+def cekilis(adaylar, agirliklar, kazanan_sayisi, rastgele=random):
+    """Up to kazanan_sayisi distinct winners, each drawn with probability proportional to its weight"""
+    agac = FenwickAgaci(agirliklar)
+    kazananlar = []
+    while len(kazananlar) < kazanan_sayisi and agac.toplam > 0:
+        index = agac.bul(rastgele.randrange(agac.toplam))
+        kazananlar.append(adaylar[index])
+        agac.guncelle(index, 0)
+    return kazananlar
+
+def _cekilis_adaylari():
+    aktif = lonca()
+    if aktif.cekilis_adaylari is None or aktif.cekilis_adaylari[0] != onbellek.surum:
+        aktif.cekilis_adaylari = (onbellek.surum, list(onbellek.kullanicilar))
+    return aktif.cekilis_adaylari[1]
+
+def _son_kazananlar_db(session, sayi):
+    return {kullanici_id for (kullanici_id,) in session.query(Olay.kullanici_id).filter(
+        Olay.tur == 'raffle'
+    ).order_by(Olay.id.desc()).limit(sayi)}
+
+def _bind_sayilari_db(session, gun):
+    baslangic = datetime.now(timezone.utc) - timedelta(days=gun)
+    return Counter(kullanici_id for (kullanici_id,) in session.query(Olay.kullanici_id).filter(
+        Olay.tur == 'bind', Olay.zaman >= baslangic
+    ))
+
+# Loot counted by the fewest_loot weighting
+CEKILIS_GUN_SAYISI = 30
 
 @bot.tree.command(name="raffle", description="Random selection among guildies")
-async def raffle(interaction: discord.Interaction):
+@app_commands.describe(
+    winners="How many different winners to draw",
+    weighting="How likely each member is to win",
+    item_name="Item whose queue is used for queue weighting; only members in it can win",
+    exclude_recent="Skip anyone among this many most recent raffle winners",
+    voice_only="Only members currently in a voice channel",
+)
+@app_commands.choices(weighting=[
+    app_commands.Choice(name="Equal chances", value="equal"),
+    app_commands.Choice(name="Front of the item queue first", value="queue"),
+    app_commands.Choice(name="Fewest items bound in the last 30 days", value="fewest_loot"),
+])
+async def raffle(interaction: discord.Interaction, winners: app_commands.Range[int, 1, 25] = 1,
+                 weighting: str = "equal", item_name: str = None,
+                 exclude_recent: app_commands.Range[int, 0, 100] = 0, voice_only: bool = False):
     """Random selection among guildies"""
-    session = Session()
     try:
-        kullanicilar = session.query(Kullanici).all()
-        if not kullanicilar:
-            await interaction.response.send_message("Not enough users for raffle!")
+        urun_id = None
+        if weighting == "queue" and item_name is None:
+            await yanitla(interaction, "❌ Queue weighting needs an item_name!", ephemeral=True)
+            return
+        if item_name is not None:
+            urun_id = onbellek.urun_bul(item_name)
+            if urun_id is None:
+                await yanitla(interaction, f"❌ {onbellek.urun_bulunamadi(item_name)}", ephemeral=True)
+                return
+
+        if urun_id is not None:
+            adaylar = list(onbellek.siralar[urun_id])
+        else:
+            adaylar = _cekilis_adaylari()
+
+        if voice_only:
+            sesteki = {
+                member.id for kanal in (interaction.guild.voice_channels if interaction.guild else ())
+                for member in kanal.members
+            }
+            adaylar = [k_id for k_id in adaylar if onbellek.discord_idleri[k_id] in sesteki]
+        if exclude_recent:
+            son_kazananlar = await depo.son_kazananlar(exclude_recent)
+            adaylar = [k_id for k_id in adaylar if k_id not in son_kazananlar]
+
+        if weighting == "queue":
+            konumlar = onbellek.konum_haritasi(urun_id)
+            uzunluk = len(onbellek.siralar[urun_id])
+            agirliklar = [uzunluk - konumlar[k_id] + 1 for k_id in adaylar]
+        elif weighting == "fewest_loot":
+            bindler = await depo.bind_sayilari(CEKILIS_GUN_SAYISI)
+            en_cok = max((bindler.get(k_id, 0) for k_id in adaylar), default=0)
+            agirliklar = [en_cok - bindler.get(k_id, 0) + 1 for k_id in adaylar]
+        else:
+            agirliklar = [1] * len(adaylar)
+
+        kazananlar = cekilis(adaylar, agirliklar, winners)
+        if not kazananlar:
+            await yanitla(interaction, "Not enough users for raffle!")
             return
 
-        kazanan = random.choice(kullanicilar)
-        await interaction.response.send_message(f"🎉 Raffle Result: **{kazanan.kullanici_adi}** won!")
-    finally:
-        session.close()
+        await interaction.response.defer()
+        await depo.olaylari_yaz([olay(interaction, 'raffle', urun_id, k_id) for k_id in kazananlar])
+
+        adlar = [onbellek.kullanicilar.get(k_id, '?') for k_id in kazananlar]
+        if len(adlar) == 1:
+            mesaj = f"🎉 Raffle Result: **{adlar[0]}** won!"
+        else:
+            mesaj = "🎉 Raffle Results:\n" + "\n".join(f"{sira}. **{ad}**" for sira, ad in enumerate(adlar, 1))
+        await takip(interaction, f"{mesaj}\n-# {len(adaylar)} members in the draw"[:1990])
+    except Exception as e:
+        if not interaction.response.is_done():
+            await yanitla(interaction, f"❌ An error occurred: {str(e)}", ephemeral=True)
+        else:
+            await takip(interaction, f"❌ An error occurred: {str(e)}", ephemeral=True)
+
+def _anahtarlari_yaz_db(session, urun_id, yazilacaklar):
+    """Writes (kullanici_id, sira_no) keys for one item, inserting rows that don't exist yet"""
+    for kullanici_id, anahtar in yazilacaklar:
+        guncellenen = session.query(Siralama).filter_by(
+            urun_id=urun_id,
+            kullanici_id=kullanici_id
+        ).update({Siralama.sira_no: anahtar})
+        if not guncellenen:
+            session.add(Siralama(urun_id=urun_id, kullanici_id=kullanici_id, sira_no=anahtar))
+
+DEGISTI_MESAJI = "❌ The item or player changed while this command was waiting, please try again!"
+
+def olay(interaction, tur, urun_id=None, kullanici_id=None, eski_sira=None, yeni_sira=None, detay=None, **adlar):
+    """A history entry for Yazici.yaz; names come from the cache unless given in adlar"""
+    kayit = {
+        'zaman': datetime.now(timezone.utc),
+        'tur': tur,
+        'yapan_id': interaction.user.id if interaction else None,
+        'yapan_adi': interaction.user.display_name if interaction else None,
+        'urun_id': urun_id,
+        'urun_adi': onbellek.urunler.get(urun_id),
+        'kullanici_id': kullanici_id,
+        'kullanici_adi': onbellek.kullanicilar.get(kullanici_id),
+        'discord_id': onbellek.discord_idleri.get(kullanici_id),
+        'eski_sira': eski_sira,
+        'yeni_sira': yeni_sira,
+        'detay': json.dumps(detay) if detay is not None else None,
+    }
+    kayit.update(adlar)
+    return kayit
 
 @bot.tree.command(name="moveplayer", description="Change player's position in queue (Guild Master only)")
-@app_commands.check(lambda interaction: interaction.user.id in ADMIN_USER_IDS)
+@app_commands.check(yonetici_mi)
 async def moveplayer(interaction: discord.Interaction, item_name: str, member: discord.Member, new_position: int):
     """Change player's position in queue (Guild Master only)"""
-    session = Session()
     try:
-        urun = session.query(Urun).filter(Urun.urun_adi.ilike(f"%{item_name}%")).first()
-        if not urun:
-            await interaction.response.send_message(f"❌ Item '{item_name}' not found!")
+        urun_id = onbellek.urun_bul(item_name)
+        if urun_id is None:
+            await yanitla(interaction, f"❌ {onbellek.urun_bulunamadi(item_name)}")
             return
 
-        kullanici = session.query(Kullanici).filter(
-            Kullanici.discord_id == str(member.id)
-        ).first()
-        if not kullanici:
-            await interaction.response.send_message(f"❌ Player '{member.display_name}' not found in the guild roster!")
-            return
-
-        mevcut_siralama = session.query(Siralama).filter_by(
-            kullanici_id=kullanici.id,
-            urun_id=urun.id
-        ).first()
-
-        max_sira = session.query(func.count(Siralama.id)).filter(
-            Siralama.urun_id == urun.id
-        ).scalar()
-
-        if new_position < 1 or new_position > max_sira:
-            await interaction.response.send_message(f"❌ Position must be between 1 and {max_sira}!")
+        kullanici_id = onbellek.kullanici_bul(member.id)
+        if kullanici_id is None:
+            await yanitla(interaction, f"❌ Player '{member.display_name}' not found in the guild roster!")
             return
 
-        if mevcut_siralama:
-            eski_sira = mevcut_siralama.sira_no
-            session.delete(mevcut_siralama)
-            
-            session.query(Siralama).filter(
-                Siralama.urun_id == urun.id,
-                Siralama.sira_no > eski_sira
-            ).update({Siralama.sira_no: Siralama.sira_no - 1})
-            
-            session.query(Siralama).filter(
-                Siralama.urun_id == urun.id,
-                Siralama.sira_no >= new_position
-            ).update({Siralama.sira_no: Siralama.sira_no + 1})
-        else:
-            session.query(Siralama).filter(
-                Siralama.urun_id == urun.id,
-                Siralama.sira_no >= new_position
-            ).update({Siralama.sira_no: Siralama.sira_no + 1})
-
-        yeni_siralama = Siralama(
-            kullanici_id=kullanici.id,
-            urun_id=urun.id,
-            sira_no=new_position
-        )
-        session.add(yeni_siralama)
-
-        session.commit()
-        await interaction.response.send_message(f"✅ **{kullanici.kullanici_adi}**'s position for **{urun.urun_adi}** has been updated to {new_position}!")
+        async with kilitler.urun(urun_id):
+            max_sira = len(onbellek.siralar.get(urun_id, ()))
+            if urun_id not in onbellek.urunler or kullanici_id not in onbellek.kullanicilar:
+                mesaj = DEGISTI_MESAJI
+            elif new_position < 1 or new_position > max_sira:
+                mesaj = f"❌ Position must be between 1 and {max_sira}!"
+            else:
+                yazilacaklar = onbellek.tasima_plani(urun_id, kullanici_id, new_position)
+                kayit = olay(interaction, 'move', urun_id, kullanici_id,
+                             onbellek.sira(urun_id, kullanici_id), new_position)
+                await depo.anahtarlari_yaz(urun_id, yazilacaklar, olaylar=[kayit])
+                onbellek.anahtarlari_uygula(urun_id, yazilacaklar)
+                mesaj = f"✅ **{onbellek.kullanicilar[kullanici_id]}**'s position for **{onbellek.urunler[urun_id]}** has been updated to {new_position}!"
+        await yanitla(interaction, mesaj)
     except Exception as e:
-        session.rollback()
-        await interaction.response.send_message(f"❌ Error updating position: {str(e)}")
-    finally:
-        session.close()
+        await yanitla(interaction, f"❌ Error updating position: {str(e)}")
+
+def _pass_db(session, urun_id, kullanici_id):
+    session.query(Siralama).filter_by(
+        kullanici_id=kullanici_id,
+        urun_id=urun_id
+    ).delete()
 
 @bot.tree.command(name="pass", description="Player passes on loot (Guild Master only)")
-@app_commands.check(lambda interaction: interaction.user.id in ADMIN_USER_IDS)
+@app_commands.check(yonetici_mi)
 async def pass_loot(interaction: discord.Interaction, item_name: str, member: discord.Member):
     """Player passes on loot (Guild Master only)"""
-    session = Session()
     try:
-        urun = session.query(Urun).filter(Urun.urun_adi.ilike(f"%{item_name}%")).first()
-        if not urun:
-            await interaction.response.send_message(f"❌ Loot item '{item_name}' not found!")
+        urun_id = onbellek.urun_bul(item_name)
+        if urun_id is None:
+            await yanitla(interaction, f"❌ {onbellek.urun_bulunamadi(item_name)}")
             return
 
-        kullanici = session.query(Kullanici).filter(
-            Kullanici.discord_id == str(member.id)
-        ).first()
-        if not kullanici:
-            await interaction.response.send_message(f"❌ Player '{member.display_name}' not found in the guild roster!")
+        kullanici_id = onbellek.kullanici_bul(member.id)
+        if kullanici_id is None:
+            await yanitla(interaction, f"❌ Player '{member.display_name}' not found in the guild roster!")
             return
 
-        siralama = session.query(Siralama).filter_by(
-            kullanici_id=kullanici.id,
-            urun_id=urun.id
-        ).first()
-
-        if siralama:
-            eski_sira = siralama.sira_no
-            session.delete(siralama)
-            
-            session.query(Siralama).filter(
-                Siralama.urun_id == urun.id,
-                Siralama.sira_no > eski_sira
-            ).update({Siralama.sira_no: Siralama.sira_no - 1})
-            
-            session.commit()
-            await interaction.response.send_message(f"✅ **{kullanici.kullanici_adi}** passed on **{urun.urun_adi}**!")
-        else:
-            await interaction.response.send_message(f"**{kullanici.kullanici_adi}** is not in the priority list for **{urun.urun_adi}**!")
+        async with kilitler.urun(urun_id):
+            if urun_id not in onbellek.urunler or kullanici_id not in onbellek.kullanicilar:
+                mesaj = DEGISTI_MESAJI
+            elif onbellek.sira(urun_id, kullanici_id) is None:
+                mesaj = f"**{onbellek.kullanicilar[kullanici_id]}** is not in the priority list for **{onbellek.urunler[urun_id]}**!"
+            else:
+                kayit = olay(interaction, 'pass', urun_id, kullanici_id, onbellek.sira(urun_id, kullanici_id))
+                await depo.siradan_cikar(urun_id, kullanici_id, olaylar=[kayit])
+                onbellek.siradan_cikar(urun_id, kullanici_id)
+                mesaj = f"✅ **{onbellek.kullanicilar[kullanici_id]}** passed on **{onbellek.urunler[urun_id]}**!"
+        await yanitla(interaction, mesaj)
     except Exception as e:
-        session.rollback()
-        await interaction.response.send_message(f"❌ An error occurred: {str(e)}")
-    finally:
-        session.close()
+        await yanitla(interaction, f"❌ An error occurred: {str(e)}")
+
+def _additem_db(session, item_name, kullanici_idleri):
+    urun = Urun(urun_adi=item_name)
+    session.add(urun)
+    session.flush()
+
+    if kullanici_idleri:
+        session.execute(insert(Siralama), [
+            {"urun_id": urun.id, "kullanici_id": kullanici_id, "sira_no": sira * SIRA_ARALIGI}
+            for sira, kullanici_id in enumerate(kullanici_idleri, 1)
+        ])
+    return urun.id
 
 @bot.tree.command(name="additem", description="Adds a new item to track (Guild Master only)")
-@app_commands.check(lambda interaction: interaction.user.id in ADMIN_USER_IDS)
+@app_commands.check(yonetici_mi)
 async def additem(interaction: discord.Interaction, item_name: str):
     """Adds a new item to track (Guild Master only)"""
-    session = Session()
     try:
-        existing_item = session.query(Urun).filter(
-            Urun.urun_adi.ilike(f"%{item_name}%")
-        ).first()
-        
-        if existing_item:
-            await interaction.response.send_message(
-                f"❌ This item already exists! ({existing_item.urun_adi})",
+        async with kilitler.kadro_kilidi:
+            existing_item = onbellek.isim_indeksi.tam_eslesen(item_name)
+            if existing_item is None:
+                kullanicilar = list(onbellek.discord_idleri.items())
+                admin_kullanicilar = [k_id for k_id, d_id in kullanicilar if yonetici_idsi_mi(d_id, interaction.guild)]
+                normal_kullanicilar = [k_id for k_id, d_id in kullanicilar if not yonetici_idsi_mi(d_id, interaction.guild)]
+                
+                random.shuffle(normal_kullanicilar)
+                siralanmis_kullanicilar = admin_kullanicilar + normal_kullanicilar
+
+                kayit = olay(interaction, 'add_item', urun_adi=item_name, detay=siralanmis_kullanicilar)
+                urun_id = await depo.urun_ekle(item_name, siralanmis_kullanicilar,
+                                               olaylar=lambda urun_id: [dict(kayit, urun_id=urun_id)])
+                onbellek.urun_ekle(urun_id, item_name, siralanmis_kullanicilar)
+
+        if existing_item is not None:
+            await yanitla(interaction, 
+                f"❌ This item already exists! ({onbellek.urunler.get(existing_item, item_name)})",
                 ephemeral=True
             )
             return
-
-        urun = Urun(urun_adi=item_name)
-        session.add(urun)
-        session.commit()
-
-        kullanicilar = session.query(Kullanici).all()
-        admin_kullanicilar = [k for k in kullanicilar if int(k.discord_id) in ADMIN_USER_IDS]
-        normal_kullanicilar = [k for k in kullanicilar if int(k.discord_id) not in ADMIN_USER_IDS]
-        
-        random.shuffle(normal_kullanicilar)
-        siralanmis_kullanicilar = admin_kullanicilar + normal_kullanicilar
-
-        for sira, kullanici in enumerate(siralanmis_kullanicilar, 1):
-            yeni_siralama = Siralama(
-                kullanici_id=kullanici.id,
-                urun_id=urun.id,
-                sira_no=sira
-            )
-            session.add(yeni_siralama)
-
-        session.commit()
         
         siralama_text = f"✅ **{item_name}** has been successfully added!\n\nAutomatic priority list:\n"
-        for sira, kullanici in enumerate(siralanmis_kullanicilar, 1):
-            siralama_text += f"{sira}. {kullanici.kullanici_adi}\n"
+        for sira, kullanici_id in enumerate(siralanmis_kullanicilar, 1):
+            siralama_text += f"{sira}. {onbellek.kullanicilar.get(kullanici_id, '?')}\n"
         
-        await interaction.response.send_message(siralama_text)
+        await yanitla(interaction, siralama_text)
     except Exception as e:
-        session.rollback()
-        await interaction.response.send_message(
+        await yanitla(interaction, 
             f"❌ Error adding item: {str(e)}",
             ephemeral=True
         )
-    finally:
-        session.close()
 
 @bot.tree.command(name="bind", description="Binds an item to a player and moves them to end of queue (Guild Master only)")
-@app_commands.check(lambda interaction: interaction.user.id in ADMIN_USER_IDS)
+@app_commands.check(yonetici_mi)
 async def bind(interaction: discord.Interaction, item_name: str, member: discord.Member):
     """Binds an item to a player and moves them to end of queue (Guild Master only)"""
-    session = Session()
     try:
-        product = session.query(Urun).filter(Urun.urun_adi.ilike(f"%{item_name}%")).first()
-        if not product:
-            await interaction.response.send_message(f"❌ Item '{item_name}' not found!")
-            return
-
-        user = session.query(Kullanici).filter(
-            Kullanici.discord_id == str(member.id)
-        ).first()
-        if not user:
-            await interaction.response.send_message(f"❌ Player '{member.display_name}' not found in the guild roster!")
+        urun_id = onbellek.urun_bul(item_name)
+        if urun_id is None:
+            await yanitla(interaction, f"❌ {onbellek.urun_bulunamadi(item_name)}")
             return
 
-        current_ranking = session.query(Siralama).filter_by(
-            kullanici_id=user.id,
-            urun_id=product.id
-        ).first()
-
-        if not current_ranking:
-            await interaction.response.send_message(f"❌ Player '{member.display_name}' is not in the priority list for '{item_name}'!")
+        kullanici_id = onbellek.kullanici_bul(member.id)
+        if kullanici_id is None:
+            await yanitla(interaction, f"❌ Player '{member.display_name}' not found in the guild roster!")
             return
 
-        max_rank = session.query(func.count(Siralama.id)).filter(
-            Siralama.urun_id == product.id
-        ).scalar()
-
-        old_rank = current_ranking.sira_no
-        
-        session.query(Siralama).filter(
-            Siralama.urun_id == product.id,
-            Siralama.sira_no > old_rank
-        ).update({Siralama.sira_no: Siralama.sira_no - 1})
-
-        current_ranking.sira_no = max_rank
-            
-        session.commit()
-        await interaction.response.send_message(
-            f"✅ **{member.display_name}** has bound **{product.urun_adi}** and moved to the end of the queue!"
-        )
+        async with kilitler.urun(urun_id):
+            if urun_id not in onbellek.urunler or kullanici_id not in onbellek.kullanicilar:
+                mesaj = DEGISTI_MESAJI
+            elif onbellek.sira(urun_id, kullanici_id) is None:
+                mesaj = f"❌ Player '{member.display_name}' is not in the priority list for '{item_name}'!"
+            else:
+                yazilacaklar = onbellek.sona_tasima_plani(urun_id, kullanici_id)
+                kayit = olay(interaction, 'bind', urun_id, kullanici_id,
+                             onbellek.sira(urun_id, kullanici_id), len(onbellek.siralar[urun_id]))
+                await depo.anahtarlari_yaz(urun_id, yazilacaklar, olaylar=[kayit])
+                onbellek.anahtarlari_uygula(urun_id, yazilacaklar)
+                mesaj = f"✅ **{member.display_name}** has bound **{onbellek.urunler[urun_id]}** and moved to the end of the queue!"
+                if pano.kanal_id is not None:
+                    gonderici.duyur(pano.kanal_id, f"🎁 **{member.display_name}** received **{onbellek.urunler[urun_id]}**")
+        await yanitla(interaction, mesaj)
     except Exception as e:
-        session.rollback()
-        await interaction.response.send_message(f"❌ An error occurred: {str(e)}")
-    finally:
-        session.close()
+        await yanitla(interaction, f"❌ An error occurred: {str(e)}")
+
+def _deleteitem_db(session, urun_id):
+    # First delete all rankings associated with this item
+    session.query(Siralama).filter(Siralama.urun_id == urun_id).delete()
+    
+    # Then delete the item itself
+    session.query(Urun).filter(Urun.id == urun_id).delete()
 
 @bot.tree.command(name="deleteitem", description="Deletes an item (Guild Master only)")
-@app_commands.check(lambda interaction: interaction.user.id in ADMIN_USER_IDS)
+@app_commands.check(yonetici_mi)
 async def deleteitem(interaction: discord.Interaction, item_name: str):
     """Deletes an item (Guild Master only)"""
-    session = Session()
     try:
-        urun = session.query(Urun).filter(Urun.urun_adi.ilike(f"%{item_name}%")).first()
-        if not urun:
-            await interaction.response.send_message(f"❌ Item '{item_name}' not found!")
+        urun_id = onbellek.urun_bul(item_name)
+        if urun_id is None:
+            await yanitla(interaction, f"❌ {onbellek.urun_bulunamadi(item_name)}")
             return
 
-        # First delete all rankings associated with this item
-        session.query(Siralama).filter(Siralama.urun_id == urun.id).delete()
-        
-        # Then delete the item itself
-        session.delete(urun)
-        session.commit()
-        await interaction.response.send_message(f"✅ **{urun.urun_adi}** has been successfully deleted!")
+        async with kilitler.kadro_kilidi, kilitler.urun(urun_id):
+            if urun_id not in onbellek.urunler:
+                mesaj = DEGISTI_MESAJI
+            else:
+                urun_adi = onbellek.urunler[urun_id]
+                await depo.urun_sil(urun_id, olaylar=[olay(interaction, 'delete_item', urun_id)])
+                onbellek.urun_sil(urun_id)
+                kilitler.urun_kilitleri.pop(urun_id, None)
+                mesaj = f"✅ **{urun_adi}** has been successfully deleted!"
+        await yanitla(interaction, mesaj)
     except Exception as e:
-        session.rollback()
-        await interaction.response.send_message(f"❌ Error deleting item: {str(e)}")
-    finally:
-        session.close()
+        await yanitla(interaction, f"❌ Error deleting item: {str(e)}")
+
+# Appends to every queue in one statement per player: each item gets its current last key + one gap
+_KUYRUK_SONUNA_EKLE = text(
+    "INSERT INTO siralama (urun_id, kullanici_id, sira_no) "
+    "SELECT urun.id, :kullanici_id, COALESCE(MAX(siralama.sira_no), 0) + :aralik "
+    "FROM urun LEFT JOIN siralama ON siralama.urun_id = urun.id "
+    "GROUP BY urun.id"
+)
+
+def _oyunculari_ekle_db(session, oyuncular):
+    """Adds (discord_id, username) players and appends them to every item queue"""
+    kullanicilar = [Kullanici(kullanici_adi=username, discord_id=discord_id) for discord_id, username in oyuncular]
+    session.add_all(kullanicilar)
+    session.flush()
+
+    session.execute(_KUYRUK_SONUNA_EKLE, [
+        {"kullanici_id": kullanici.id, "aralik": SIRA_ARALIGI} for kullanici in kullanicilar
+    ])
+    return [kullanici.id for kullanici in kullanicilar]
+
+def _oyunculari_cikar_db(session, kullanici_idleri):
+    # Sparse keys keep the remaining queues ordered, so nothing needs renumbering
+    session.query(Siralama).filter(Siralama.kullanici_id.in_(kullanici_idleri)).delete(synchronize_session=False)
+    session.query(Kullanici).filter(Kullanici.id.in_(kullanici_idleri)).delete(synchronize_session=False)
+
+def _kadro_esitle_db(session, eklenecekler, cikarilacaklar):
+    """Removes and adds players in one transaction, returning the new players' ids"""
+    if cikarilacaklar:
+        _oyunculari_cikar_db(session, cikarilacaklar)
+    return _oyunculari_ekle_db(session, eklenecekler) if eklenecekler else []
+
+def _uyeleri_coz(interaction, members, role):
+    """Discord IDs from mentions/IDs in members plus everyone holding role, in order and without repeats"""
+    discord_idleri = [int(d_id) for d_id in re.findall(r"\d{15,20}", members or "")]
+    if role is not None:
+        discord_idleri += [member.id for member in role.members if not member.bot]
+    return list(dict.fromkeys(discord_idleri))
 
 @bot.tree.command(name="addplayer", description="Adds a new guild member (Guild Master only)")
-@app_commands.check(lambda interaction: interaction.user.id in ADMIN_USER_IDS)
+@app_commands.check(yonetici_mi)
 async def addplayer(interaction: discord.Interaction, member: discord.Member, username: str = None):
     """Adds a new guild member (Guild Master only)"""
     if username is None:
         username = member.display_name
 
-    session = Session()
     try:
-        existing_user = session.query(Kullanici).filter(
-            (Kullanici.kullanici_adi == username) | 
-            (Kullanici.discord_id == str(member.id))
-        ).first()
-        
-        if existing_user:
-            await interaction.response.send_message(
-                f"❌ This player is already in the guild! (ID: {existing_user.discord_id}, Name: {existing_user.kullanici_adi})",
-                ephemeral=True
-            )
-            return
-
-        kullanici = Kullanici(
-            kullanici_adi=username,
-            discord_id=str(member.id)
-        )
-        session.add(kullanici)
-        session.commit()
-
-        urunler = session.query(Urun).all()
-        for urun in urunler:
-            son_sira = session.query(func.max(Siralama.sira_no)).filter(
-                Siralama.urun_id == urun.id
-            ).scalar()
+        async with kilitler.tumu():
+            existing_user = onbellek.kullanici_bul(member.id)
+            if existing_user is None:
+                existing_user = next(
+                    (k_id for k_id, ad in onbellek.kullanicilar.items() if ad == username), None
+                )
             
-            yeni_sira = (son_sira or 0) + 1
-            yeni_siralama = Siralama(
-                kullanici_id=kullanici.id,
-                urun_id=urun.id,
-                sira_no=yeni_sira
-            )
-            session.add(yeni_siralama)
-        
-        session.commit()
-        await interaction.response.send_message(
-            f"✅ **{username}** has been successfully added and placed in all item queues!"
-        )
+            if existing_user is not None:
+                mesaj = f"❌ This player is already in the guild! (ID: {onbellek.discord_idleri[existing_user]}, Name: {onbellek.kullanicilar[existing_user]})"
+            else:
+                kayit = olay(interaction, 'add_player', kullanici_adi=username, discord_id=member.id)
+                kullanici_idleri = await depo.oyunculari_ekle([(member.id, username)],
+                                                              olaylar=lambda idler: [dict(kayit, kullanici_id=idler[0])])
+                onbellek.kullanicilari_ekle([(kullanici_idleri[0], username, member.id)])
+                mesaj = f"✅ **{username}** has been successfully added and placed in all item queues!"
+        await yanitla(interaction, mesaj, ephemeral=existing_user is not None)
     except Exception as e:
-        session.rollback()
-        await interaction.response.send_message(
+        await yanitla(interaction, 
             f"❌ Error adding player: {str(e)}",
             ephemeral=True
         )
-    finally:
-        session.close()
+
+@bot.tree.command(name="addplayers", description="Adds several guild members at once (Guild Master only)")
+@app_commands.check(yonetici_mi)
+async def addplayers(interaction: discord.Interaction, members: str = None, role: discord.Role = None):
+    """Adds several guild members at once (Guild Master only)"""
+    try:
+        await interaction.response.defer()
+
+        async with kilitler.tumu():
+            kullanilan_adlar = set(onbellek.kullanicilar.values())
+            oyuncular, atlananlar = [], []
+            for discord_id in _uyeleri_coz(interaction, members, role):
+                member = interaction.guild.get_member(discord_id) if interaction.guild else None
+                if member is None:
+                    atlananlar.append(f"<@{discord_id}> (not in this server)")
+                elif onbellek.kullanici_bul(discord_id) is not None or member.display_name in kullanilan_adlar:
+                    atlananlar.append(f"{member.display_name} (already in the guild)")
+                else:
+                    oyuncular.append((discord_id, member.display_name))
+                    kullanilan_adlar.add(member.display_name)
+
+            if oyuncular:
+                kayitlar = [olay(interaction, 'add_player', kullanici_adi=username, discord_id=discord_id)
+                            for discord_id, username in oyuncular]
+                kullanici_idleri = await depo.oyunculari_ekle(oyuncular, olaylar=lambda idler: [
+                    dict(kayit, kullanici_id=kullanici_id) for kayit, kullanici_id in zip(kayitlar, idler)
+                ])
+                onbellek.kullanicilari_ekle([
+                    (kullanici_id, username, discord_id)
+                    for kullanici_id, (discord_id, username) in zip(kullanici_idleri, oyuncular)
+                ])
+
+        if not oyuncular:
+            await takip(interaction, "❌ No new players to add!" + (f"\nSkipped: {', '.join(atlananlar)}"[:1900] if atlananlar else ""))
+            return
+
+        mesaj = f"✅ Added **{len(oyuncular)}** players to all item queues: {', '.join(ad for _, ad in oyuncular)}"
+        if atlananlar:
+            mesaj += f"\nSkipped: {', '.join(atlananlar)}"
+        await takip(interaction, mesaj[:1990])
+    except Exception as e:
+        await takip(interaction, f"❌ Error adding players: {str(e)}", ephemeral=True)
 
 @bot.tree.command(name="kickplayer", description="Removes a guild member (Guild Master only)")
-@app_commands.check(lambda interaction: interaction.user.id in ADMIN_USER_IDS)
+@app_commands.check(yonetici_mi)
 async def kickplayer(interaction: discord.Interaction, member: discord.Member):
     """Removes a guild member (Guild Master only)"""
-    session = Session()
     try:
-        kullanici = session.query(Kullanici).filter(
-            Kullanici.discord_id == str(member.id)
-        ).first()
-        if not kullanici:
-            await interaction.response.send_message(f"❌ Player '{member.display_name}' not found in the guild roster!")
+        async with kilitler.tumu():
+            kullanici_id = onbellek.kullanici_bul(member.id)
+            if kullanici_id is None:
+                mesaj = f"❌ Player '{member.display_name}' not found in the guild roster!"
+            else:
+                kullanici_adi = onbellek.kullanicilar[kullanici_id]
+                await depo.oyunculari_cikar([kullanici_id],
+                                            olaylar=[olay(interaction, 'kick_player', kullanici_id=kullanici_id)])
+                onbellek.kullanicilari_sil([kullanici_id])
+                await kadro.unut([member.id])
+                mesaj = f"✅ **{kullanici_adi}** has been successfully removed from the guild!"
+        await yanitla(interaction, mesaj)
+    except Exception as e:
+        await yanitla(interaction, f"❌ Error removing player: {str(e)}")
+
+@bot.tree.command(name="kickplayers", description="Removes several guild members at once (Guild Master only)")
+@app_commands.check(yonetici_mi)
+async def kickplayers(interaction: discord.Interaction, members: str = None, role: discord.Role = None):
+    """Removes several guild members at once (Guild Master only)"""
+    try:
+        await interaction.response.defer()
+
+        async with kilitler.tumu():
+            discord_idleri = _uyeleri_coz(interaction, members, role)
+            kullanici_idleri = [
+                kullanici_id for kullanici_id in map(onbellek.kullanici_bul, discord_idleri)
+                if kullanici_id is not None
+            ]
+            if kullanici_idleri:
+                adlar = [onbellek.kullanicilar[kullanici_id] for kullanici_id in kullanici_idleri]
+                await depo.oyunculari_cikar(kullanici_idleri, olaylar=[
+                    olay(interaction, 'kick_player', kullanici_id=kullanici_id) for kullanici_id in kullanici_idleri
+                ])
+                onbellek.kullanicilari_sil(kullanici_idleri)
+                await kadro.unut(discord_idleri)
+
+        if not kullanici_idleri:
+            await takip(interaction, "❌ None of those players are in the guild roster!")
             return
 
-        # First delete all rankings associated with this player
-        session.query(Siralama).filter(Siralama.kullanici_id == kullanici.id).delete()
-        
-        # Then delete the player
-        session.delete(kullanici)
-        session.commit()
+        await takip(interaction, f"✅ Removed **{len(adlar)}** players from the guild: {', '.join(adlar)}"[:1990])
+    except Exception as e:
+        await takip(interaction, f"❌ Error removing players: {str(e)}", ephemeral=True)
+
+# Bulk export/import of items, roster and queues as JSON Lines or CSV. Both directions stream row by
+# row; an import holds only the item and player ids, never the queue rows
+AKTARIM_ALANLARI = ['type', 'id', 'name', 'discord_id', 'item_id', 'player_id', 'rank']
+AKTARIM_PARTISI = 1000
+
+def _disa_aktar_kayitlari(session):
+    """Items, then players, then queue rows with their dense 1-based rank, in queue order"""
+    for urun_id, urun_adi in session.execute(
+            text("SELECT id, urun_adi FROM urun ORDER BY id").execution_options(yield_per=AKTARIM_PARTISI)):
+        yield {'type': 'item', 'id': urun_id, 'name': urun_adi}
+    for kullanici_id, kullanici_adi, discord_id in session.execute(
+            text("SELECT id, kullanici_adi, discord_id FROM kullanici ORDER BY id")
+            .execution_options(yield_per=AKTARIM_PARTISI)):
+        yield {'type': 'player', 'id': kullanici_id, 'name': kullanici_adi, 'discord_id': str(discord_id)}
+    onceki_urun, sira = None, 0
+    for urun_id, kullanici_id in session.execute(
+            text("SELECT urun_id, kullanici_id FROM siralama ORDER BY urun_id, sira_no")
+            .execution_options(yield_per=AKTARIM_PARTISI)):
+        sira = sira + 1 if urun_id == onceki_urun else 1
+        onceki_urun = urun_id
+        yield {'type': 'queue', 'item_id': urun_id, 'player_id': kullanici_id, 'rank': sira}
+
+def _disa_aktar_db(session, dosya, bicim):
+    return _kayitlari_yaz(_disa_aktar_kayitlari(session), dosya, bicim)
+
+def _kayitlari_yaz(kayitlar, dosya, bicim):
+    """Writes every record to the text file object; returns the number of records"""
+    sayi = 0
+    if bicim == 'csv':
+        yazar = csv.DictWriter(dosya, fieldnames=AKTARIM_ALANLARI)
+        yazar.writeheader()
+        for sayi, kayit in enumerate(kayitlar, 1):
+            yazar.writerow(kayit)
+    else:
+        for sayi, kayit in enumerate(kayitlar, 1):
+            dosya.write(json.dumps(kayit, ensure_ascii=False) + "\n")
+    return sayi
+
+def _jsonl_kayitlari(dosya):
+    for no, satir in enumerate(dosya, 1):
+        if not satir.strip():
+            continue
+        try:
+            kayit = json.loads(satir)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {no}: not valid JSON ({e.msg} at column {e.colno})")
+        if not isinstance(kayit, dict):
+            raise ValueError(f"line {no}: expected a JSON object")
+        yield no, kayit
+
+def _ice_aktar_kayitlari(dosya, bicim):
+    """(line number, record) pairs from an export file, with numeric fields converted"""
+    if bicim == 'csv':
+        okuyucu = csv.DictReader(dosya)
+        satirlar = ((okuyucu.line_num, kayit) for kayit in okuyucu)
+    else:
+        satirlar = _jsonl_kayitlari(dosya)
+    for no, kayit in satirlar:
+        try:
+            for alan in ('id', 'discord_id', 'item_id', 'player_id', 'rank'):
+                if kayit.get(alan) not in (None, ''):
+                    kayit[alan] = int(kayit[alan])
+        except (TypeError, ValueError):
+            raise ValueError(f"line {no}: '{alan}' must be a number")
+        yield no, kayit
+
+def _ad_gecerli(ad):
+    return isinstance(ad, str) and bool(UrunIndeksi._normalize(ad))
+
+def _ice_aktar_satirlari(dosya, bicim):
+    """Checked ('item' | 'player' | 'queue', row) pairs from an export file, rows keyed by column; raises
+    ValueError at the first bad record. Queue rows must come after the items and players they use, grouped
+    by item with ranks 1..n in order."""
+    urun_idleri, urun_adlari, kullanici_idleri, kullanici_adlari, discord_idleri = set(), set(), set(), set(), set()
+    biten_urunler, aktif_urun, aktif_oyuncular, beklenen_sira = set(), None, set(), 1
+
+    for no, kayit in _ice_aktar_kayitlari(dosya, bicim):
+        tur = kayit.get('type')
+        if tur == 'item':
+            if not isinstance(kayit.get('id'), int) or kayit['id'] in urun_idleri or not _ad_gecerli(kayit.get('name')):
+                raise ValueError(f"line {no}: item needs a unique numeric id and a name")
+            # Compared like the name index does, or later lookups of both names would be ambiguous
+            ad = UrunIndeksi._normalize(kayit['name'])
+            if ad in urun_adlari:
+                raise ValueError(f"line {no}: item '{kayit['name']}' appears more than once")
+            urun_idleri.add(kayit['id'])
+            urun_adlari.add(ad)
+            yield tur, {'id': kayit['id'], 'urun_adi': kayit['name']}
+        elif tur == 'player':
+            if (not isinstance(kayit.get('id'), int) or kayit['id'] in kullanici_idleri
+                    or not _ad_gecerli(kayit.get('name')) or not isinstance(kayit.get('discord_id'), int)):
+                raise ValueError(f"line {no}: player needs a unique numeric id, a name and a numeric discord_id")
+            ad = UrunIndeksi._normalize(kayit['name'])
+            if ad in kullanici_adlari or kayit['discord_id'] in discord_idleri:
+                raise ValueError(f"line {no}: player '{kayit['name']}' appears more than once")
+            kullanici_idleri.add(kayit['id'])
+            kullanici_adlari.add(ad)
+            discord_idleri.add(kayit['discord_id'])
+            yield tur, {'id': kayit['id'], 'kullanici_adi': kayit['name'], 'discord_id': kayit['discord_id']}
+        elif tur == 'queue':
+            urun_id, kullanici_id = kayit.get('item_id'), kayit.get('player_id')
+            if urun_id not in urun_idleri or kullanici_id not in kullanici_idleri:
+                raise ValueError(f"line {no}: queue row refers to an unknown item or player")
+            if urun_id != aktif_urun:
+                if urun_id in biten_urunler:
+                    raise ValueError(f"line {no}: queue rows of item {urun_id} are not contiguous")
+                biten_urunler.add(aktif_urun)
+                aktif_urun, aktif_oyuncular, beklenen_sira = urun_id, set(), 1
+            if kayit.get('rank') != beklenen_sira:
+                raise ValueError(f"line {no}: expected rank {beklenen_sira} for item {urun_id}, got {kayit.get('rank')}")
+            if kullanici_id in aktif_oyuncular:
+                raise ValueError(f"line {no}: player {kullanici_id} is queued twice for item {urun_id}")
+            aktif_oyuncular.add(kullanici_id)
+            beklenen_sira += 1
+            yield tur, {'urun_id': urun_id, 'kullanici_id': kullanici_id, 'sira_no': kayit['rank'] * SIRA_ARALIGI}
+        else:
+            raise ValueError(f"line {no}: unknown record type '{tur}'")
+
+def _ice_aktar_db(session, dosya, bicim):
+    """Replaces all items, players and queues with the file's contents, or raises ValueError and changes nothing"""
+    session.execute(text("DELETE FROM siralama"))
+    session.execute(text("DELETE FROM kullanici"))
+    session.execute(text("DELETE FROM urun"))
+
+    parti = {'item': [], 'player': [], 'queue': []}
+    sayilar = {'item': 0, 'player': 0, 'queue': 0}
+
+    def bosalt(tur):
+        if parti[tur]:
+            tablo = {'item': Urun, 'player': Kullanici, 'queue': Siralama}[tur]
+            session.execute(insert(tablo), parti[tur])
+            sayilar[tur] += len(parti[tur])
+            parti[tur] = []
+
+    for tur, satir in _ice_aktar_satirlari(dosya, bicim):
+        parti[tur].append(satir)
+        if len(parti[tur]) >= AKTARIM_PARTISI:
+            # Queue rows reference items and players, so those go in first
+            if tur == 'queue':
+                bosalt('item')
+                bosalt('player')
+            bosalt(tur)
+
+    for tur in ('item', 'player', 'queue'):
+        bosalt(tur)
+    return sayilar
+
+def _aktarim_bicimi(dosya_adi):
+    return 'csv' if dosya_adi.lower().endswith('.csv') else 'jsonl'
+
+@bot.tree.command(name="exportdata", description="Exports items, roster and queues as a file (Guild Master only)")
+@app_commands.check(yonetici_mi)
+@app_commands.choices(format=[
+    app_commands.Choice(name="JSON Lines", value="jsonl"),
+    app_commands.Choice(name="CSV", value="csv"),
+])
+async def exportdata(interaction: discord.Interaction, format: str = "jsonl"):
+    """Exports items, roster and queues as a file (Guild Master only)"""
+    try:
+        await interaction.response.defer()
 
-        # After deleting the player, update rankings for all items
-        urunler = session.query(Urun).all()
-        for urun in urunler:
-            # Get all rankings for this item
-            siralamalar = session.query(Siralama).filter(
-                Siralama.urun_id == urun.id
-            ).order_by(Siralama.sira_no).all()
-            
-            # Update rankings to be sequential
-            for index, siralama in enumerate(siralamalar, 1):
-                siralama.sira_no = index
-        
-        session.commit()
-        await interaction.response.send_message(f"✅ **{kullanici.kullanici_adi}** has been successfully removed from the guild!")
+        # Rows are streamed into a temporary file from one read transaction, so the snapshot is consistent.
+        # The file is closed only once takip has uploaded it
+        with tempfile.TemporaryFile() as dosya:
+            metin = io.TextIOWrapper(dosya, encoding='utf-8', newline='')
+            sayi = await depo.disa_aktar(metin, format)
+            metin.flush()
+            metin.detach()
+            dosya.seek(0)
+
+            dosya_adi = f"lootbot-{datetime.now():%Y%m%d-%H%M%S}.{format}"
+            await takip(interaction, f"📦 Exported **{sayi}** records.", file=discord.File(dosya, filename=dosya_adi))
     except Exception as e:
-        session.rollback()
-        await interaction.response.send_message(f"❌ Error removing player: {str(e)}")
-    finally:
-        session.close()
+        await takip(interaction, f"❌ Error exporting data: {str(e)}", ephemeral=True)
+
+@bot.tree.command(name="importdata", description="Replaces items, roster and queues with an exported file (Guild Master only)")
+@app_commands.check(yonetici_mi)
+async def importdata(interaction: discord.Interaction, file: discord.Attachment):
+    """Replaces items, roster and queues with an exported file (Guild Master only)"""
+    try:
+        await interaction.response.defer()
+
+        # Download in chunks instead of Attachment.read(), which would hold the whole file in memory
+        with tempfile.TemporaryFile() as dosya:
+            async with aiohttp.ClientSession() as http:
+                async with http.get(file.url) as yanit:
+                    yanit.raise_for_status()
+                    async for parca in yanit.content.iter_chunked(1 << 16):
+                        dosya.write(parca)
+            dosya.seek(0)
+            metin = io.TextIOWrapper(dosya, encoding='utf-8', newline='')
+
+            async with kilitler.tumu():
+                sayilar = await depo.ice_aktar(metin, _aktarim_bicimi(file.filename),
+                                               olaylar=[olay(interaction, 'import')])
+                await onbellek.yukle()
+            metin.detach()
+
+        await takip(interaction, 
+            f"✅ Imported **{sayilar['item']}** items, **{sayilar['player']}** players "
+            f"and **{sayilar['queue']}** queue entries."
+        )
+    except ValueError as e:
+        await takip(interaction, f"❌ Import failed, nothing was changed: {str(e)}", ephemeral=True)
+    except Exception as e:
+        await takip(interaction, f"❌ Error importing data: {str(e)}", ephemeral=True)
+
+# Loot sessions: a batch of bind/pass entries, previewed as a whole and committed in one transaction
+OTURUM_SATIRI = re.compile(r"^\s*(bind|pass)\s+(.+?)\s+(?:<@!?(\d+)>|(\d{15,20})|@(.+?))\s*$", re.IGNORECASE)
+OTURUM_DOSYA_SINIRI = 1 << 16
+
+def _oturum_coz(metin):
+    """Parses 'bind|pass <item> <member>' lines into (action, urun_id, kullanici_id) entries and error lines"""
+    girdiler, hatalar = [], []
+    urun_onbellegi = {}
+    ad_haritasi = {ad.lower(): k_id for k_id, ad in onbellek.kullanicilar.items()}
+    for satir_no, satir in enumerate(metin.splitlines(), 1):
+        if not satir.strip() or satir.lstrip().startswith('#'):
+            continue
+        eslesme = OTURUM_SATIRI.match(satir)
+        if eslesme is None:
+            hatalar.append(f"Line {satir_no}: expected 'bind|pass <item> <member>'")
+            continue
+        eylem, item_name, bahsetme, discord_id, ad = eslesme.groups()
+        if item_name not in urun_onbellegi:
+            urun_onbellegi[item_name] = onbellek.urun_bul(item_name)
+        urun_id = urun_onbellegi[item_name]
+        if ad is not None:
+            kullanici_id = ad_haritasi.get(ad.lower())
+        else:
+            kullanici_id = onbellek.kullanici_bul(bahsetme or discord_id)
+        if urun_id is None:
+            hatalar.append(f"Line {satir_no}: {onbellek.urun_bulunamadi(item_name)}")
+        elif kullanici_id is None:
+            hatalar.append(f"Line {satir_no}: player '{ad or bahsetme or discord_id}' not found in the guild roster")
+        else:
+            girdiler.append((satir_no, eylem.lower(), urun_id, kullanici_id))
+    return girdiler, hatalar
+
+def _oturum_plani(girdiler):
+    """Plays the entries in order on copies of the affected queues only.
+
+    Returns the steps (action, urun_id, kullanici_id, old rank, new rank), the resulting
+    queues and the entries that could not apply."""
+    kuyruklar, adimlar, hatalar = {}, [], []
+    for satir_no, eylem, urun_id, kullanici_id in girdiler:
+        if urun_id not in kuyruklar:
+            kuyruklar[urun_id] = list(onbellek.siralar[urun_id])
+        sira = kuyruklar[urun_id]
+        if kullanici_id not in sira:
+            hatalar.append(f"Line {satir_no}: {onbellek.kullanicilar[kullanici_id]} is not in the "
+                           f"priority list for {onbellek.urunler[urun_id]} at that point")
+            continue
+        eski = sira.index(kullanici_id) + 1
+        sira.remove(kullanici_id)
+        if eylem == 'bind':
+            sira.append(kullanici_id)
+        adimlar.append((eylem, urun_id, kullanici_id, eski, len(sira) if eylem == 'bind' else None))
+    return adimlar, kuyruklar, hatalar
+
+def _oturum_degisiklikleri(adimlar, kuyruklar):
+    """urun_id -> (removed players, (kullanici_id, sira_no) keys appended past the current end), once per item"""
+    degisiklikler = {}
+    for urun_id, son in kuyruklar.items():
+        silinecekler = set(onbellek.siralar[urun_id]) - set(son)
+        baglananlar = {k_id for eylem, u_id, k_id, _, _ in adimlar if u_id == urun_id and eylem == 'bind'}
+        # Bound players end up in the tail in their final order; everyone in front keeps their key
+        kuyruk = 0
+        while kuyruk < len(son) and son[len(son) - kuyruk - 1] in baglananlar:
+            kuyruk += 1
+        son_anahtar = onbellek.son_anahtar(urun_id)
+        yazilacaklar = [(k_id, son_anahtar + n * SIRA_ARALIGI)
+                        for n, k_id in enumerate(son[len(son) - kuyruk:], 1)]
+        if silinecekler or yazilacaklar:
+            degisiklikler[urun_id] = (silinecekler, yazilacaklar)
+    return degisiklikler
+
+_ANAHTAR_GUNCELLE = text(
+    "UPDATE siralama SET sira_no = :sira_no WHERE urun_id = :urun_id AND kullanici_id = :kullanici_id"
+)
+_SIRADAN_SIL = text(
+    "DELETE FROM siralama WHERE urun_id = :urun_id AND kullanici_id = :kullanici_id"
+)
+
+def _oturum_db(session, degisiklikler):
+    """Writes a whole session as two executemany statements"""
+    silinecekler = [
+        {"urun_id": urun_id, "kullanici_id": kullanici_id}
+        for urun_id, (silinenler, _) in degisiklikler.items() for kullanici_id in silinenler
+    ]
+    yazilacaklar = [
+        {"urun_id": urun_id, "kullanici_id": kullanici_id, "sira_no": anahtar}
+        for urun_id, (_, anahtarlar) in degisiklikler.items() for kullanici_id, anahtar in anahtarlar
+    ]
+    if silinecekler:
+        session.execute(_SIRADAN_SIL, silinecekler)
+    if yazilacaklar:
+        session.execute(_ANAHTAR_GUNCELLE, yazilacaklar)
+
+def _oturum_satirlari(adimlar, kuyruklar, hatalar, notlar, adlar, urun_adlari):
+    yield "\u001b[1;35m📋 LOOT SESSION PREVIEW\u001b[0m\n"
+    yield "\u001b[1;35m━━━━━━━━━━━━━━━━━━━━━━\u001b[0m\n"
+    for uyari in notlar:
+        yield f"\u001b[1;33m⚠️ {uyari}\u001b[0m\n"
+    baglanan = sum(1 for adim in adimlar if adim[0] == 'bind')
+    yield f"\u001b[0;37m{baglanan} binds, {len(adimlar) - baglanan} passes on {len(kuyruklar)} items\u001b[0m\n\n"
+    for hata in hatalar:
+        yield f"\u001b[1;31m❌ {hata}\u001b[0m\n"
+    if hatalar:
+        yield "\n"
+    for urun_id, sira in kuyruklar.items():
+        yield f"\u001b[1;33m🎯 {urun_adlari[urun_id].upper()}\u001b[0m\n"
+        for eylem, u_id, kullanici_id, eski, yeni in adimlar:
+            if u_id == urun_id:
+                etiket = "BIND" if eylem == 'bind' else "PASS"
+                yield f"\u001b[0;36m   {etiket} {adlar[kullanici_id][:15]} {eski}→{yeni or '-'}\u001b[0m\n"
+        if not sira:
+            yield "\u001b[0;37m   • Queue is empty\u001b[0m\n"
+        yield from _siralama_satirlari(sira, adlar)
+        yield "\n"
+
+class OturumGorunumu(SayfaGorunumu):
+    """Preview of a loot session; Commit writes every entry at once if none of its queues moved meanwhile"""
+
+    def __init__(self, sahip_id: int, girdiler, hatalar, notlar=()):
+        adimlar, kuyruklar, plan_hatalari = _oturum_plani(girdiler)
+        self.girdiler = girdiler
+        self.hatalar = hatalar + plan_hatalari
+        self.adimlar = adimlar
+        self.kuyruklar = kuyruklar
+        self.surumler = {urun_id: onbellek.surumler[urun_id] for urun_id in kuyruklar}
+        sayfalar = TembelSayfalar(ansi_parcala(_oturum_satirlari(
+            adimlar, kuyruklar, self.hatalar, notlar, dict(onbellek.kullanicilar), dict(onbellek.urunler))))
+        super().__init__(sayfalar, sahip_id)
+        self.onayla.disabled = bool(self.hatalar) or not adimlar
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        return interaction.user.id == self.sahip_id and await lonca_sec(interaction)
+
+    def _guncel_mi(self):
+        # Roster removals and item deletions bump the versions too
+        return all(urun_id in onbellek.urunler and onbellek.surumler[urun_id] == surum
+                   for urun_id, surum in self.surumler.items())
+
+    @discord.ui.button(label="Commit", style=discord.ButtonStyle.success, row=1)
+    async def onayla(self, interaction: discord.Interaction, button: discord.ui.Button):
+        try:
+            async with kilitler.urunler(self.surumler):
+                guncel = self._guncel_mi()
+                if guncel:
+                    degisiklikler = _oturum_degisiklikleri(self.adimlar, self.kuyruklar)
+                    kayitlar = [olay(interaction, eylem, urun_id, kullanici_id, eski, yeni)
+                                for eylem, urun_id, kullanici_id, eski, yeni in self.adimlar]
+                    await depo.oturum_yaz(degisiklikler, olaylar=kayitlar)
+                    for urun_id, (silinecekler, yazilacaklar) in degisiklikler.items():
+                        onbellek.toplu_uygula(urun_id, silinecekler, yazilacaklar)
+        except Exception as e:
+            await yanitla(interaction, f"❌ Loot session failed, nothing was changed: {str(e)}", ephemeral=True)
+            return
+
+        self.stop()
+        if not guncel:
+            # Replay the same entries on the current queues and ask again
+            girdiler = [girdi for girdi in self.girdiler
+                        if girdi[2] in onbellek.urunler and girdi[3] in onbellek.kullanicilar]
+            notlar = ["The queues changed since the last preview, check it again"]
+            if len(girdiler) < len(self.girdiler):
+                notlar.append("Entries for deleted items or players were dropped")
+            yeni = OturumGorunumu(self.sahip_id, girdiler, [], notlar)
+            await interaction.response.edit_message(content=yeni.icerik(), view=yeni)
+            return
+
+        baglananlar = [(kullanici_id, urun_id) for eylem, urun_id, kullanici_id, _, _ in self.adimlar if eylem == 'bind']
+        if pano.kanal_id is not None:
+            for kullanici_id, urun_id in baglananlar:
+                gonderici.duyur(pano.kanal_id,
+                                f"🎁 **{onbellek.kullanicilar[kullanici_id]}** received **{onbellek.urunler[urun_id]}**")
+        await interaction.response.edit_message(
+            content=f"✅ Loot session committed: **{len(baglananlar)}** binds, "
+                    f"**{len(self.adimlar) - len(baglananlar)}** passes on **{len(self.kuyruklar)}** items.",
+            view=None
+        )
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.danger, row=1)
+    async def iptal(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.stop()
+        await interaction.response.edit_message(content="Loot session discarded, nothing was changed.", view=None)
+
+async def _oturum_onizle(interaction: discord.Interaction, metin: str):
+    girdiler, hatalar = _oturum_coz(metin)
+    if not girdiler and not hatalar:
+        await yanitla(interaction, "❌ The loot session has no entries!", ephemeral=True)
+        return
+    view = OturumGorunumu(interaction.user.id, girdiler, hatalar)
+    await yanitla(interaction, view.icerik(), view=view, ephemeral=True)
+
+class OturumModali(discord.ui.Modal, title="Loot session"):
+    girdiler = discord.ui.TextInput(
+        label="One per line: bind|pass <item> <member>",
+        style=discord.TextStyle.paragraph,
+        placeholder="bind Sword of Fire @Alice\npass Bow of Storms <@123456789012345678>",
+        max_length=4000,
+    )
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        return await lonca_sec(interaction)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            await _oturum_onizle(interaction, self.girdiler.value)
+        except Exception as e:
+            await yanitla(interaction, f"❌ An error occurred: {str(e)}", ephemeral=True)
+
+@bot.tree.command(name="lootsession", description="Previews and commits a batch of binds and passes at once (Guild Master only)")
+@app_commands.check(yonetici_mi)
+async def lootsession(interaction: discord.Interaction, file: discord.Attachment = None):
+    """Previews and commits a batch of binds and passes at once (Guild Master only)"""
+    try:
+        if file is None:
+            await interaction.response.send_modal(OturumModali())
+            return
+        if file.size > OTURUM_DOSYA_SINIRI:
+            await yanitla(interaction, f"❌ Session files are limited to {OTURUM_DOSYA_SINIRI // 1024} KB!", ephemeral=True)
+            return
+        await _oturum_onizle(interaction, (await file.read()).decode('utf-8'))
+    except UnicodeDecodeError:
+        await yanitla(interaction, "❌ The session file must be UTF-8 text!", ephemeral=True)
+    except Exception as e:
+        await yanitla(interaction, f"❌ An error occurred: {str(e)}", ephemeral=True)
+
+async def item_name_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggests item names from the in-memory index, without touching the database"""
+    return [
+        app_commands.Choice(name=onbellek.urunler[urun_id], value=onbellek.urunler[urun_id])
+        for urun_id in onbellek.isim_indeksi.tamamla(current)
+    ]
+
+for _komut in (itemqueue, moveplayer, pass_loot, bind, deleteitem, loothistory, raffle):
+    _komut.autocomplete('item_name')(item_name_autocomplete)
 
 # Error handling
 @bot.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
     error_message = f"❌ An error occurred: {str(error)}"
+    _komut_bitti(interaction, 'denied' if isinstance(error, app_commands.CheckFailure) else 'error')
     
     try:
         if isinstance(error, app_commands.CheckFailure):
             error_message = "❌ You don't have permission to use this command!"
         
         if not interaction.response.is_done():
-            await interaction.response.send_message(error_message, ephemeral=True)
+            await yanitla(interaction, error_message, ephemeral=True)
         else:
             try:
-                await interaction.followup.send(error_message, ephemeral=True)
+                await takip(interaction, error_message, ephemeral=True)
             except discord.errors.HTTPException:
                 pass  # Ignore if we can't send a followup
     except (discord.errors.NotFound, discord.errors.HTTPException):
         pass  # Ignore if interaction has already timed out or can't be responded to
 
-def run_bot():
-    bot.run(TOKEN)
+def disa_aktar(yol, bicim=None):
+    """CLI export; '-' writes to stdout"""
+    bicim = bicim or _aktarim_bicimi(yol)
+    if yol == '-':
+        return _session_scope(lonca().depo.Session, _disa_aktar_db, sys.stdout, bicim)
+    with open(yol, 'w', encoding='utf-8', newline='') as dosya:
+        return _session_scope(lonca().depo.Session, _disa_aktar_db, dosya, bicim)
+
+def ice_aktar(yol, bicim=None):
+    """CLI import, in one transaction; the bot must not be running against the same database"""
+    with open(yol, encoding='utf-8', newline='') as dosya:
+        return _session_scope(lonca().depo.Session, _olaylarla_yaz, _ice_aktar_db,
+                              (dosya, bicim or _aktarim_bicimi(yol)), [olay(None, 'import')])
 
 if __name__ == '__main__':
-    # Create database tables
-    Base.metadata.create_all(engine)
-    
-    # Start the bot in a separate thread
-    bot_thread = threading.Thread(target=run_bot)
-    bot_thread.start()
-    
-    # Start Flask app
-    port = int(os.environ.get('PORT', 10000))
-    app.run(host='0.0.0.0', port=port) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="BlackHorse guild loot bot")
+    alt = parser.add_subparsers(dest='komut')
+    alt.add_parser('run', help="run the bot (default)")
+    p = alt.add_parser('export', help="write items, roster and queues to a file")
+    p.add_argument('path', nargs='?', default='-', help="output file, .jsonl or .csv (default: stdout)")
+    p.add_argument('--format', choices=['jsonl', 'csv'])
+    p.add_argument('--guild', type=int, help="guild id (default: the main database)")
+    p = alt.add_parser('import', help="replace items, roster and queues with an exported file")
+    p.add_argument('path')
+    p.add_argument('--format', choices=['jsonl', 'csv'])
+    p.add_argument('--guild', type=int, help="guild id (default: the main database)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    if args.komut in ('export', 'import'):
+        # Always the guild's SQLite file, whatever STORAGE_BACKEND says; creates or upgrades its tables
+        if loncalar.ana_lonca_id is None and os.path.exists(DATABASE_PATH):
+            ana = SqlDepo(DATABASE_PATH)
+            ana.hazirla()
+            loncalar.ana_lonca_id = int(_session_scope(ana.Session, _ayar_oku_db, 'default_guild') or 0) or None
+            ana.engine.dispose()
+        yol = loncalar.yol(args.guild)
+        aktif_lonca.set(Lonca(args.guild, yol, SqlDepo(yol)))
+        lonca().hazirla()
+
+    if args.komut == 'export':
+        sayi = disa_aktar(args.path, args.format)
+        print(f"Exported {sayi} records", file=sys.stderr)
+    elif args.komut == 'import':
+        try:
+            sayilar = ice_aktar(args.path, args.format)
+        except ValueError as e:
+            sys.exit(f"Import failed, nothing was changed: {e}")
+        print(f"Imported {sayilar['item']} items, {sayilar['player']} players, {sayilar['queue']} queue entries")
+    else:
+        if not TOKEN:
+            print("Hata: DISCORD_TOKEN bulunamadı!")
+            sys.exit(1)
+
+        # Sends the HTTP client somewhere else, e.g. a local stub server for rate-limit tests
+        if os.getenv('DISCORD_API_BASE'):
+            discord.http.Route.BASE = os.getenv('DISCORD_API_BASE').rstrip('/')
+
+        # The web server is started from setup_hook and stops with the bot
+        bot.run(TOKEN)
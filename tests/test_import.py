@@ -0,0 +1,85 @@
+"""Import validation on every storage backend: a bad file raises ValueError and changes nothing.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discordbot  # noqa: E402
+
+GECERLI = [
+    {"type": "item", "id": 1, "name": "Sword of Fire"},
+    {"type": "player", "id": 1, "name": "Bob", "discord_id": 100000000000000001},
+    {"type": "queue", "item_id": 1, "player_id": 1, "rank": 1},
+]
+
+def _jsonl(kayitlar):
+    return "".join(json.dumps(kayit) + "\n" for kayit in kayitlar)
+
+class IceAktarmaTesti(unittest.TestCase):
+    def setUp(self):
+        self.klasor = tempfile.TemporaryDirectory()
+        self.addCleanup(self.klasor.cleanup)
+
+    def _calistir(self, depo_turu, metin, bicim="jsonl"):
+        """Imports the valid file, then metin; returns the error and what the storage holds afterwards"""
+        async def calis():
+            depo = discordbot.depo_olustur(os.path.join(self.klasor.name, f"{depo_turu}.db"), depo_turu)
+            depo.hazirla()
+            try:
+                await depo.ice_aktar(io.StringIO(_jsonl(GECERLI)), "jsonl")
+                hata = None
+                try:
+                    await depo.ice_aktar(io.StringIO(metin), bicim)
+                except ValueError as e:
+                    hata = e
+                return hata, await depo.yukle()
+            finally:
+                await depo.kapat()
+        return asyncio.run(calis())
+
+    def _reddedilmeli(self, metin, bicim="jsonl"):
+        for depo_turu in discordbot.DEPOLAR:
+            with self.subTest(depo=depo_turu):
+                hata, (urunler, kullanicilar, siralar) = self._calistir(depo_turu, metin, bicim)
+                self.assertIsNotNone(hata, "the import was accepted")
+                self.assertTrue(str(hata).startswith("line "), str(hata))
+                self.assertEqual([tuple(u) for u in urunler], [(1, "Sword of Fire")])
+                self.assertEqual([tuple(k) for k in kullanicilar], [(1, "Bob", 100000000000000001)])
+                self.assertEqual([tuple(s)[:2] for s in siralar], [(1, 1)])
+
+    def test_item_null_id(self):
+        self._reddedilmeli(_jsonl([{"type": "item", "id": None, "name": "Bow"},
+                                   {"type": "queue", "item_id": None, "player_id": 1, "rank": 1}]))
+
+    def test_item_missing_id(self):
+        self._reddedilmeli(_jsonl([{"type": "item", "name": "Bow"}]))
+
+    def test_item_empty_id_csv(self):
+        self._reddedilmeli("type,id,name,discord_id,item_id,player_id,rank\r\nitem,,Bow,,,,\r\n", "csv")
+
+    def test_item_name_not_string(self):
+        self._reddedilmeli(_jsonl([{"type": "item", "id": 1, "name": 5}]))
+
+    def test_player_null_ids(self):
+        self._reddedilmeli(_jsonl([{"type": "player", "id": None, "name": "Bob", "discord_id": 1}]))
+        self._reddedilmeli(_jsonl([{"type": "player", "id": 1, "name": "Bob", "discord_id": None}]))
+
+    def test_player_name_not_string(self):
+        self._reddedilmeli(_jsonl([{"type": "player", "id": 1, "name": ["Bob"], "discord_id": 1}]))
+
+    def test_names_compared_like_the_index(self):
+        self._reddedilmeli(_jsonl([{"type": "item", "id": 1, "name": "Sword  of Fire"},
+                                   {"type": "item", "id": 2, "name": "sword of fire"}]))
+        self._reddedilmeli(_jsonl([{"type": "player", "id": 1, "name": "Bob", "discord_id": 1},
+                                   {"type": "player", "id": 2, "name": " bob", "discord_id": 2}]))
+
+if __name__ == "__main__":
+    unittest.main()